@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+import time
+
+# 进度消息的最小发送间隔（秒），即每秒最多 20 次进度更新
+PROGRESS_INTERVAL = 0.05
+
+# 文件大于该字节数且有多个 CPU 核心时，改用多进程分片分析
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+
+class AnalysisWorker:
+    def __init__(self, data_processor, data_persistence_manager, parallel=False, file_cache=None):
+        """
+            初始化后台文件分析工作线程。
+            分析在独立线程中运行，结果和进度通过线程安全队列传回，由界面线程通过 root.after 轮询取出。
+
+            data_processor: 数据处理器实例。
+            data_persistence_manager: 数据持久化管理器实例，用于流式读取记录文件。
+            parallel: 是否对大文件使用多进程分片分析；为 False 时始终单进程分析。
+            file_cache: 可选的磁盘结果缓存（FileResultCache），重新分析内容相同的文件时直接还原结果。
+        """
+        self.data_processor = data_processor
+        self.data_persistence_manager = data_persistence_manager
+        self.parallel = parallel
+        self.file_cache = file_cache
+        self.messages = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, filepath):
+        """
+            在后台线程中开始分析指定文件。
+
+            filepath: 需要分析的记录文件路径。
+        """
+        self._cancel_event.clear()
+        self._thread = threading.Thread(target=self._run, args=(filepath,), daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """请求停止当前分析，工作线程会在当前分块结束后退出"""
+        self._cancel_event.set()
+
+    def _run(self, filepath):
+        """
+            工作线程主体。向队列中发送以下消息：
+            ("progress", 已读取字节数)、("error", 错误信息)、
+            ("done", (results, vehicle_attack_counts, vehicle_summary))、("cancelled", None)、("failed", 异常)。
+        """
+        # 工作线程中才导入，避免拖慢应用启动
+        from columnar_io import is_columnar
+        from binary_records import is_binary_records
+        last_progress = 0.0
+
+        def report_progress(consumed):
+            nonlocal last_progress
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                self.messages.put(("progress", consumed))
+
+        def report_error(message):
+            self.messages.put(("error", message))
+
+        def analyze(on_error):
+            if is_binary_records(filepath):
+                return self.data_processor.analyze_binary_file(filepath, report_progress, self._cancel_event)
+            if is_columnar(filepath):
+                return self.data_processor.analyze_columnar_file(
+                    filepath, report_progress, cancel_event=self._cancel_event, on_error=on_error
+                )
+            if self._use_parallel(filepath):
+                return self.data_processor.analyze_file_parallel(
+                    filepath, progress_callback=report_progress,
+                    cancel_event=self._cancel_event, on_error=on_error
+                )
+            return self.data_processor.analyze_record_stream(
+                self.data_persistence_manager.iter_json_records(filepath),
+                report_progress,
+                cancel_event=self._cancel_event,
+                on_error=on_error
+            )
+
+        try:
+            if self.file_cache is not None:
+                results, attack_counts, _ = self.data_processor.analyze_file_cached(
+                    filepath, self.file_cache, analyze, report_error, self._cancel_event
+                )
+            else:
+                results, attack_counts = analyze(report_error)
+            # 按车辆分组统计也在工作线程中完成，界面线程只负责显示
+            vehicle_summary = self.data_processor.aggregate_by_vehicle(results)
+        except Exception as e:
+            self.messages.put(("failed", e))
+            return
+        if self._cancel_event.is_set():
+            self.messages.put(("cancelled", None))
+        else:
+            self.messages.put(("done", (results, attack_counts, vehicle_summary)))
+
+    def _use_parallel(self, filepath) -> bool:
+        """判断是否对该文件使用多进程分片分析"""
+        return (self.parallel and (os.cpu_count() or 1) > 1
+                and os.path.getsize(filepath) >= PARALLEL_MIN_BYTES)
+
+    def drain(self):
+        """取出队列中当前所有待处理的消息，不会阻塞"""
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
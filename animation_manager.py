@@ -9,16 +9,23 @@ from utils import hex_to_rgb, rgb_to_hex
 
 base_path = Path(__file__).parent
 
+# 云朵和小车图片的基准尺寸（缩放前）
+CLOUD_BASE_HEIGHT = 100
+CAR_BASE_WIDTH = 100
+CAR_BASE_HEIGHT = 70
+
 class AnimationManager:
-    def __init__(self, root, canvas, scale_factor=1.0):
+    def __init__(self, root, canvas, scale_factor=1.0, preloaded_images=None):
         """
             初始化动画管理器。
 
             root: Tkinter根窗口实例。
             canvas: 用于绘制动画的Tkinter画布。
             scale_factor: 界面元素的缩放因子。
+            preloaded_images: preload_images 在后台线程中解码好的图片；为 None 时在创建动画时再加载。
         """
         self.root = root
+        self.preloaded_images = preloaded_images
         # self.canvas 接收 UIManager 提供的画布，用于云朵和粒子效果
         self.canvas = canvas
         self.bg_color = self.root.style.colors.bg
@@ -56,28 +63,41 @@ class AnimationManager:
         if self.canvas:
             self.canvas.bind("<Motion>", self.spawn_particles_on_move)
 
+    @staticmethod
+    def preload_images(scale_factor=1.0, clouds=True, car=True):
+        """
+            解码并缩放动画所需的图片。只使用 PIL，不涉及 Tk 对象，因此可以在后台线程中调用；
+            转换为 ImageTk.PhotoImage 的步骤仍需在界面线程中完成。
+
+            scale_factor: 界面元素的缩放因子。
+            clouds: 是否加载云朵图片。
+            car: 是否加载小车图片。
+            返回: {"clouds": [PIL图片, ...], "car": PIL图片} 形式的字典。
+        """
+        images = {}
+        if clouds:
+            scaled_cloud_height = scaled_dimension(CLOUD_BASE_HEIGHT, scale_factor)
+            images["clouds"] = [
+                Image.open(base_path / "images" / name).resize((int(scaled_cloud_height * 1.2), scaled_cloud_height))
+                for name in ("云朵1.png", "云朵2.png", "云朵3.png")
+            ]
+        if car:
+            images["car"] = Image.open(base_path / "images" / "汽车.png").resize(
+                (scaled_dimension(CAR_BASE_WIDTH, scale_factor), scaled_dimension(CAR_BASE_HEIGHT, scale_factor))
+            )
+        return images
+
     def create_animation_area(self):
         """
         创建并初始化云朵动画。
         云朵将在由 UIManager 提供的 self.canvas 上显示。
         """
         try:
-            # 加载并调整云朵图片大小，使其适应顶部较小的 canvas 区域
-            cloud_base_height = 100  # 假设顶部 canvas 高度约60px，
-            scaled_cloud_height = scaled_dimension(cloud_base_height,self.scale_factor)
+            # 优先使用后台预解码的云朵图片，否则现场加载并调整大小，使其适应顶部较小的 canvas 区域
+            images = self.preloaded_images or self.preload_images(self.scale_factor, car=False)
             self.clouds_data = [
-                {"img": ImageTk.PhotoImage(
-                    Image.open(base_path / "images" / "云朵1.png").resize(
-                        (int(scaled_cloud_height * 1.2), scaled_cloud_height))),
-                    "y_pos": 0, "speed": scaled_dimension(2,self.scale_factor)},
-                {"img": ImageTk.PhotoImage(
-                    Image.open(base_path / "images" / "云朵2.png").resize(
-                        (int(scaled_cloud_height * 1.2), scaled_cloud_height))),
-                    "y_pos": 0, "speed": scaled_dimension(2,self.scale_factor)},
-                {"img": ImageTk.PhotoImage(
-                    Image.open(base_path / "images" / "云朵3.png").resize(
-                        (int(scaled_cloud_height * 1.2), scaled_cloud_height))),
-                    "y_pos": 0, "speed": scaled_dimension(2,self.scale_factor)}
+                {"img": ImageTk.PhotoImage(cloud_img), "y_pos": 0, "speed": scaled_dimension(2,self.scale_factor)}
+                for cloud_img in images["clouds"]
             ]
         except Exception as e:
             messagebox.showerror("图片错误", f"无法加载云朵图片: {str(e)}")
@@ -259,14 +279,10 @@ class AnimationManager:
         # 加载小车图片
         if not hasattr(self, 'car_image') or self.car_image is None:
             try:
-                car_original_width = 100
-                car_original_height = 70
-                self.scaled_car_width = scaled_dimension(car_original_width,self.scale_factor)
-                self.scaled_car_height = scaled_dimension(car_original_height,self.scale_factor)
-                car_img = Image.open(base_path / "images" / "汽车.png").resize(
-                    (self.scaled_car_width, self.scaled_car_height)
-                )
-                self.car_image = ImageTk.PhotoImage(car_img)
+                self.scaled_car_width = scaled_dimension(CAR_BASE_WIDTH,self.scale_factor)
+                self.scaled_car_height = scaled_dimension(CAR_BASE_HEIGHT,self.scale_factor)
+                images = self.preloaded_images or self.preload_images(self.scale_factor, clouds=False)
+                self.car_image = ImageTk.PhotoImage(images["car"])
             except Exception as e:
                 messagebox.showerror("图片错误", f"无法加载小车图片: {str(e)}")
                 return
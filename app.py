@@ -1,25 +1,57 @@
-import time
+import os
+import sys
+import queue
+import argparse
+import multiprocessing
 import threading
-from ttkbootstrap import Window
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from startup_profiler import profiler
+from metrics import metrics
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="恶意车辆识别系统")
+    parser.add_argument("--fast-start", action="store_true", help="模型加载完成后立即显示主窗口，不等待图片和音效")
+    parser.add_argument("--profile-startup", action="store_true", help="启动完成后输出各模块导入和各启动阶段的耗时")
+    parser.add_argument("--metrics-port", type=int,
+                        help="启用热路径耗时指标，并在本机该端口提供 Prometheus 文本格式的 /metrics 端点")
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+# 作为程序入口运行时，在导入其余模块之前解析命令行：启动耗时分析需要记录各模块的导入耗时，
+# 指标采集需要在导入被计时的模块之前启用。被其他模块导入时不读取命令行参数
+launch_args = parse_args() if __name__ == "__main__" else None
+if launch_args is not None:
+    if launch_args.profile_startup:
+        profiler.enable()
+    if launch_args.metrics_port is not None:
+        metrics.enable()
+
 from tkinter import messagebox
-from loading_screen import LoadingScreen
-from ui_manager import UIManager
-from data_processor import DataProcessor
-from model_handler import ModelHandler
-from animation_manager import AnimationManager
+# pygame、pandas、PIL、numpy 以及界面和模型相关模块均延迟到后台线程或首次使用时导入
+Window = profiler.import_module("ttkbootstrap").Window
+LoadingScreen = profiler.import_module("loading_screen").LoadingScreen
 from data_persistence_manager import DataPersistenceManager
+from analysis_worker import AnalysisWorker
 from utils import center_window
 
-try:
-    import pygame
-    pygame.mixer.init()
-except ImportError:
-    messagebox.showwarning("警告", "Pygame 未安装。音效将禁用。")
-    pygame = None
-except Exception as e:
-    messagebox.showwarning("警告", f"Pygame 混音器初始化失败: {e}。音效将禁用。")
-    pygame = None
+
+def load_pygame():
+    """
+        导入 pygame 并初始化混音器，可在后台线程中调用。
+
+        返回: (pygame 模块或 None, 需要提示给用户的警告信息或 None)。
+    """
+    try:
+        pygame = profiler.import_module("pygame")
+        pygame.mixer.init()
+        return pygame, None
+    except ImportError:
+        return None, "Pygame 未安装。音效将禁用。"
+    except Exception as e:
+        return None, f"Pygame 混音器初始化失败: {e}。音效将禁用。"
 
 base_path = Path(__file__).parent
 
@@ -33,14 +65,31 @@ DESIGN_WINDOW_HEIGHT_ON_SCREEN = 1200
 RELATIVE_WINDOW_WIDTH_RATIO = DESIGN_WINDOW_WIDTH_ON_SCREEN / DESIGN_SCREEN_WIDTH
 RELATIVE_WINDOW_HEIGHT_RATIO = DESIGN_WINDOW_HEIGHT_ON_SCREEN / DESIGN_SCREEN_HEIGHT
 
+# 加载屏幕上各项加载任务所占的进度权重（合计100）
+MODEL_LOAD_WEIGHT = 60
+IMAGE_LOAD_WEIGHT = 25
+SOUND_LOAD_WEIGHT = 15
+
+# 界面线程轮询后台分析结果的间隔（毫秒）
+ANALYSIS_POLL_INTERVAL_MS = 50
+
+# 界面线程检查后台线程警告信息的间隔（毫秒）
+WARNING_POLL_INTERVAL_MS = 500
+
+# 文件分析结果的磁盘缓存目录
+RESULT_CACHE_DIR = "result_cache"
+
 class VehicleSecurityApp:
-    def __init__(self):
+    def __init__(self, fast_start=False):
         """
             初始化车辆安全应用程序。
             设置主窗口，计算并调整窗口大小以适应不同屏幕分辨率，
             初始化加载屏幕并启动后台加载线程。
+
+            fast_start: 快速启动模式，模型加载完成后立即显示主窗口，不等待图片和音效。
         """
-        self.root = Window(title="恶意车辆识别系统 | Copyright © 2025", themename="morph")
+        with profiler.phase("窗口创建"):
+            self.root = Window(title="恶意车辆识别系统 | Copyright © 2025", themename="morph")
         center_window(self.root, 1800, 1200)
         # 获取当前屏幕的逻辑像素尺寸
         screen_width = self.root.winfo_screenwidth()
@@ -62,76 +111,235 @@ class VehicleSecurityApp:
         # 计算全局缩放因子，用于调整内部控件和字体大小
         # 以设计窗口的宽度作为基准来计算缩放因子
         self.global_scale_factor = self.root.winfo_width() / DESIGN_WINDOW_WIDTH_ON_SCREEN
+        self.fast_start = fast_start
         self.loading_complete = False
         self.loading_error = None
-        # 传递缩放因子给加载屏幕
-        self.loading_screen = LoadingScreen(self.root)
-        self.loading_screen.create_loading_screen()
-        threading.Thread(target=self.background_loading, daemon=True).start()
-        self.monitor_loading()
+        self.model_ready = False
+        self.preloaded_images = None
+        self.preloaded_sounds = None
+        self.pygame = None
+        self.pygame_warning = None
+        # 后台线程报告的警告信息，由界面线程在主窗口显示后逐条提示
+        self.warnings = queue.Queue()
+        # 后台加载线程会写入以下属性，必须在启动线程之前完成初始化
         self.model = None
         self.metadata = None
         self.ui_manager = None
         self.data_processor = None
         self.data_persistence_manager = DataPersistenceManager()
         self.animation_manager = None
+        self.analysis_worker = None
+        self.model_watcher = None
+        self.online_learner = None
+        self.online_update_thread = None
+        # 增量更新与全局模型热替换互斥，避免旧版本的增量模型覆盖刚发布的全局模型
+        self.online_lock = threading.Lock()
+        # 传递缩放因子给加载屏幕
+        self.loading_screen = LoadingScreen(self.root)
+        self.loading_screen.create_loading_screen()
+        profiler.mark("加载窗口可见")
+        threading.Thread(target=self.background_loading, daemon=True).start()
+        self.monitor_loading()
 
     def background_loading(self):
         """
-            在后台线程中执行资源加载任务。
-            包括模拟UI初始化、模型加载、数据处理器准备、动画系统配置。
-            更新加载屏幕的进度，并在加载过程中处理可能发生的错误。
+            在后台线程中并发执行真实的资源加载任务。
+            模型与元数据加载、动画图片解码和音效预加载同时进行，
+            每完成一项就按其权重推进加载屏幕的进度。模型加载失败时记录错误，图片和音效加载失败时退回按需加载。
         """
-        try:
-            steps = [
-                ("初始化UI...", 20),
-                ("加载模型...", 45),
-                ("准备数据处理器...", 75),
-                ("配置动画系统...", 90),
-                ("完成...", 100)
-            ]
-            for desc, progress in steps:
-                time.sleep(0.7)
+        tasks = [
+            ("model", "模型加载完成", MODEL_LOAD_WEIGHT, self.load_model_resources),
+            ("images", "动画图片解码完成", IMAGE_LOAD_WEIGHT, self.decode_images),
+            ("sounds", "音效预加载完成", SOUND_LOAD_WEIGHT, self.preload_sounds),
+        ]
+        progress = 0
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = {executor.submit(func): (name, desc, weight) for name, desc, weight, func in tasks}
+            for future in as_completed(futures):
+                name, desc, weight = futures[future]
+                progress += weight
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if name == "model":
+                        self.loading_error = e
+                    continue
+                if name == "model":
+                    self.model, self.metadata, self.data_processor = result
+                    self.model_ready = True
+                    global_sha256 = self.metadata.get("model_sha256")
+                    try:
+                        self.restore_online_model()
+                    except Exception as e:
+                        self.report_warning(f"无法恢复增量学习的模型版本，继续使用全局模型: {e}")
+                    try:
+                        self.start_model_watcher(global_sha256)
+                    except Exception as e:
+                        # 模型已可用，监视失败只影响热更新，不应让加载屏幕一直等待
+                        self.report_warning(f"无法监视模型目录，新发布的模型需要重启后才能生效: {e}")
+                elif name == "images":
+                    self.preloaded_images = result
+                else:
+                    self.pygame, self.pygame_warning, self.preloaded_sounds = result
                 self.loading_screen.update_progress(progress, desc)
-            self.model, self.metadata = ModelHandler.load_model(base_path)
-            self.data_processor = DataProcessor(self.model, self.metadata)
-            self.loading_complete = True
+        self.loading_complete = True
+
+    def load_model_resources(self):
+        """加载模型和元数据并创建数据处理器，返回 (模型, 元数据, 数据处理器)"""
+        with profiler.phase("模型加载"):
+            ModelHandler = profiler.import_module("model_handler").ModelHandler
+            DataProcessor = profiler.import_module("data_processor").DataProcessor
+            model, metadata = ModelHandler.load_model(base_path)
+            return model, metadata, DataProcessor(model, metadata)
+
+    def restore_online_model(self):
+        """
+            创建增量学习器。此前已生成过基于当前全局模型的增量版本时换用最新的版本，
+            重启后不会退回到全局模型、丢失已学到的标签。
+        """
+        LinearModelEngine = profiler.import_module("model_handler").LinearModelEngine
+        if not isinstance(self.model, LinearModelEngine):
+            return  # 只有逻辑回归模型支持增量学习
+        with self.online_lock:
+            OnlineLearner = profiler.import_module("online_learning").OnlineLearner
+            self.online_learner = OnlineLearner(base_path, self.data_persistence_manager.store)
+            if self.online_learner.online_version:
+                self.on_model_published(*self.online_learner.current())
+
+    def start_model_watcher(self, current_sha256):
+        """
+            监视 saved_models 目录，联邦聚合方发布新一轮全局模型时在后台加载并热替换，无需重启应用。
+
+            current_sha256: 当前全局模型的摘要，内容相同的文件不会重复加载。
+        """
+        ModelWatcher = profiler.import_module("model_handler").ModelWatcher
+        self.model_watcher = ModelWatcher(base_path, self.on_global_model_published, on_error=self.report_warning,
+                                          current_sha256=current_sha256)
+        self.model_watcher.start()
+
+    def on_model_published(self, model, metadata):
+        """在监视线程中调用：原子替换数据处理器使用的模型，正在进行的分析继续完成当前分块"""
+        self.data_processor.swap_model(model, metadata)
+        self.model, self.metadata = model, metadata
+
+    def on_global_model_published(self, model, metadata):
+        """
+            在监视线程中调用：联邦聚合方发布了新的全局模型。增量学习器从新的全局模型重新开始，
+            之后的增量更新不会把旧的参数换回来。
+        """
+        with self.online_lock:
+            learner = self.online_learner
+            if learner is not None and metadata.get("model_sha256") != learner.base_sha256:
+                try:
+                    learner.rebase(model, metadata)
+                except Exception as e:
+                    # 新模型不支持增量学习时丢弃学习器，下一次标注时按新模型重新创建
+                    self.report_warning(f"增量学习器无法基于新模型继续: {e}")
+                    self.online_learner = None
+            self.on_model_published(model, metadata)
+
+    def schedule_online_update(self):
+        """人工标注记录后在后台线程中增量更新模型；上一次更新尚未完成时，新标签留到下一次更新"""
+        if self.online_update_thread is not None and self.online_update_thread.is_alive():
+            return
+        self.online_update_thread = threading.Thread(target=self.run_online_update, daemon=True)
+        self.online_update_thread.start()
+
+    def run_online_update(self):
+        """攒够一个小批量的新标签后更新模型，并把新版本热替换到数据处理器中"""
+        try:
+            with self.online_lock:
+                if self.online_learner is None:
+                    OnlineLearner = profiler.import_module("online_learning").OnlineLearner
+                    self.online_learner = OnlineLearner(base_path, self.data_persistence_manager.store)
+                report = self.online_learner.update(min_labels=self.online_learner.batch_size)
+                if report is not None:
+                    self.on_model_published(*self.online_learner.current())
         except Exception as e:
-            self.loading_error = e
-            self.loading_complete = True
+            self.report_warning(f"增量更新模型失败: {e}")
+
+    def report_warning(self, message: str):
+        """可在任意线程中调用：把警告信息交给界面线程，以警告对话框提示"""
+        self.warnings.put(message)
+
+    def poll_warnings(self):
+        """在界面线程中定期显示后台线程报告的警告信息"""
+        while True:
+            try:
+                message = self.warnings.get_nowait()
+            except queue.Empty:
+                break
+            messagebox.showwarning("警告", message)
+        self.root.after(WARNING_POLL_INTERVAL_MS, self.poll_warnings)
+
+    def decode_images(self):
+        """在后台解码并缩放动画图片"""
+        with profiler.phase("图片解码"):
+            AnimationManager = profiler.import_module("animation_manager").AnimationManager
+            return AnimationManager.preload_images(self.global_scale_factor)
+
+    def preload_sounds(self):
+        """在后台初始化 pygame 并预加载音效，返回 (pygame 模块, 警告信息, 音效字典)"""
+        with profiler.phase("音效预加载"):
+            pygame, warning = load_pygame()
+            UIManager = profiler.import_module("ui_manager").UIManager
+            return pygame, warning, UIManager.preload_sounds(pygame)
 
     def monitor_loading(self):
         """
             监控后台加载线程的完成状态。
-            如果加载完成，则销毁加载屏幕并显示主窗口；
+            如果加载完成（快速启动模式下只需模型加载完成），则销毁加载屏幕并显示主窗口；
             如果加载过程中发生错误，则显示错误信息并关闭应用程序；
             否则，继续每隔100毫秒检查加载状态。
         """
-        if self.loading_complete:
-            if self.loading_error:
-                messagebox.showerror("错误", f"初始化失败: {str(self.loading_error)}")
-                self.root.destroy()
-            else:
-                self.loading_screen.destroy_loading_screen()
-                self.root.deiconify()
-                self.initialize_ui()
+        if self.loading_error:
+            messagebox.showerror("错误", f"初始化失败: {str(self.loading_error)}")
+            self.root.destroy()
+        elif self.loading_complete or (self.fast_start and self.model_ready):
+            self.loading_screen.destroy_loading_screen()
+            self.root.deiconify()
+            profiler.mark("主窗口可见")
+            self.initialize_ui()
         else:
             self.root.after(100, self.monitor_loading)
 
     def initialize_ui(self):
         """
             初始化用户界面组件。
-            创建UIManager实例以构建主界面，并创建AnimationManager实例以管理动画效果。
+            创建UIManager实例以构建主界面；动画在图片和音效加载完成后由 start_animations 创建。
         """
-        self.ui_manager = UIManager(self.root, self, pygame,self.global_scale_factor)
-        self.ui_manager.create_widgets()
-        self.animation_manager = AnimationManager(self.root, self.ui_manager.get_canvas(),self.global_scale_factor)
-        self.animation_manager.create_car_animation()
-        self.animation_manager.create_animation_area()
+        with profiler.phase("控件构建"):
+            UIManager = profiler.import_module("ui_manager").UIManager
+            self.ui_manager = UIManager(self.root, self, self.pygame, self.global_scale_factor, self.preloaded_sounds)
+            self.ui_manager.create_widgets()
+        self.poll_warnings()
+        self.start_animations()
+
+    def start_animations(self):
+        """
+            创建AnimationManager实例以管理动画效果。
+            快速启动模式下主窗口可能先于图片和音效加载完成而显示，此时每隔100毫秒重试一次。
+        """
+        if not self.loading_complete:
+            self.root.after(100, self.start_animations)
+            return
+        if self.pygame_warning:
+            messagebox.showwarning("警告", self.pygame_warning)
+        self.ui_manager.pygame = self.pygame
+        self.ui_manager.sounds.update(self.preloaded_sounds or {})
+        with profiler.phase("动画创建"):
+            AnimationManager = profiler.import_module("animation_manager").AnimationManager
+            self.animation_manager = AnimationManager(self.root, self.ui_manager.get_canvas(),
+                                                      self.global_scale_factor, self.preloaded_images)
+            self.animation_manager.create_car_animation()
+            self.animation_manager.create_animation_area()
+        profiler.mark("启动完成")
+        if profiler.enabled:
+            profiler.report(sys.stderr)
 
     def browse_file(self):
         """
-            打开文件浏览对话框，允许用户选择JSON文件。
+            打开文件浏览对话框，允许用户选择记录文件。
             如果用户选择了文件，则更新UI管理器中的文件路径。
         """
         filepath = self.ui_manager.browse_file_dialog()
@@ -140,29 +348,59 @@ class VehicleSecurityApp:
 
     def analyze_file(self):
         """
-            分析选定的JSON文件中的车辆数据。
+            分析选定的记录文件中的车辆数据。
             首先检查文件路径是否已选择，然后显示进度条。
-            加载JSON数据，对每条记录进行分析，并更新进度。
-            分析完成后，显示分析结果，或在发生错误时显示错误信息。
+            在后台线程中以流式方式分块读取并分析数据，界面线程通过 poll_analysis 获取进度和结果，
+            进度按已读取的字节数更新。
         """
         filepath = self.ui_manager.get_file_path()
         if not filepath:
-            messagebox.showwarning("警告", "请先选择要分析的JSON文件")
+            messagebox.showwarning("警告", "请先选择要分析的记录文件")
+            return
+        if self.analysis_worker is not None and self.analysis_worker.is_running():
+            messagebox.showwarning("警告", "文件分析正在进行中，请等待完成或先取消")
             return
         self.ui_manager.clear_previous_results()
         self.ui_manager.show_progress()
         try:
-            records = self.data_persistence_manager.load_json_data(filepath) # 新代码
-            total = len(records)
-            self.ui_manager.set_progress_maximum(total)
-            results, attack_counts = self.data_processor.analyze_file_data(
-                records,
-                lambda idx: self.ui_manager.update_progress_value(idx)
-            )
-            self.ui_manager.hide_progress()
-            self.ui_manager.show_analysis_result(results, attack_counts, filepath)
-        except Exception as e:
+            # 记录总数无法预先得知，因此以文件字节数作为进度条最大值
+            self.ui_manager.set_progress_maximum(max(os.path.getsize(filepath), 1))
+        except OSError as e:
             self.ui_manager.handle_analysis_error(f"文件分析失败: {str(e)}")
+            return
+        FileResultCache = profiler.import_module("result_cache").FileResultCache
+        self.analysis_worker = AnalysisWorker(self.data_processor, self.data_persistence_manager, True,
+                                              FileResultCache(base_path / RESULT_CACHE_DIR))
+        self.analysis_worker.start(filepath)
+        self.poll_analysis()
+
+    def poll_analysis(self):
+        """
+            在界面线程中轮询后台分析线程的消息队列。
+            更新进度条、提示错误，并在分析结束后显示结果。
+        """
+        for kind, payload in self.analysis_worker.drain():
+            if kind == "progress":
+                self.ui_manager.update_progress_value(payload)
+            elif kind == "error":
+                messagebox.showerror("错误", payload)
+            elif kind == "done":
+                results, attack_counts, vehicle_summary = payload
+                self.ui_manager.hide_progress()
+                self.ui_manager.show_analysis_result(results, attack_counts, vehicle_summary)
+                return
+            elif kind == "cancelled":
+                self.ui_manager.handle_analysis_error("⚠️ 文件分析已取消")
+                return
+            elif kind == "failed":
+                self.ui_manager.handle_analysis_error(f"文件分析失败: {str(payload)}")
+                return
+        self.root.after(ANALYSIS_POLL_INTERVAL_MS, self.poll_analysis)
+
+    def cancel_analysis(self):
+        """请求取消正在进行的文件分析"""
+        if self.analysis_worker is not None and self.analysis_worker.is_running():
+            self.analysis_worker.cancel()
 
     def analyze_manual(self, record):
         """
@@ -179,5 +417,9 @@ class VehicleSecurityApp:
             messagebox.showerror("错误", f"手动分析时发生未知错误: {e}")
 
 if __name__ == "__main__":
-    app = VehicleSecurityApp()
+    # 打包为可执行文件后，多进程分析的工作进程需要 freeze_support 才能正常启动
+    multiprocessing.freeze_support()
+    if launch_args.metrics_port is not None:
+        metrics.serve(launch_args.metrics_port)
+    app = VehicleSecurityApp(fast_start=launch_args.fast_start)
     app.root.mainloop()
\ No newline at end of file
@@ -0,0 +1,307 @@
+import sys
+import time
+import asyncio
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from federated_training import (FederatedTrainer, _init_client_worker, _train_client,
+                                add_training_arguments, evaluate, load_records, trainer_from_args)
+
+base_path = Path(__file__).parent
+
+# 模拟客户端延迟的分布
+LATENCY_DISTRIBUTIONS = ("constant", "exponential", "lognormal", "pareto")
+
+DEFAULT_BUFFER_SIZE = 4
+DEFAULT_STALENESS_EXPONENT = 0.5
+DEFAULT_LATENCY_MEAN = 0.02
+DEFAULT_STRAGGLER_RATIO = 0.1
+DEFAULT_STRAGGLER_FACTOR = 20.0
+DEFAULT_TIME_BUDGET = 30.0
+
+
+class LatencyModel:
+    def __init__(self, distribution="lognormal", mean=DEFAULT_LATENCY_MEAN, sigma=1.0,
+                 straggler_ratio=DEFAULT_STRAGGLER_RATIO, straggler_factor=DEFAULT_STRAGGLER_FACTOR,
+                 num_clients=0, seed=0):
+        """
+            模拟客户端每次本地训练加上传更新所需的时间（秒），叠加在真实的本地训练耗时之上。
+
+            distribution: 延迟分布，"constant"、"exponential"、"lognormal" 或 "pareto"（重尾）。
+            mean: 普通客户端的平均延迟（秒）。
+            sigma: lognormal 分布的对数标准差；pareto 分布时为形状参数的倒数。
+            straggler_ratio: 掉队客户端所占比例，掉队客户端固定不变。
+            straggler_factor: 掉队客户端的延迟倍数。
+            num_clients: 客户端数。
+            seed: 随机种子。
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"不支持的延迟分布: {distribution}（支持 {', '.join(LATENCY_DISTRIBUTIONS)}）")
+        self.distribution = distribution
+        self.mean = mean
+        self.sigma = sigma
+        self.rng = np.random.default_rng(seed)
+        self.factors = np.where(self.rng.random(num_clients) < straggler_ratio, straggler_factor, 1.0)
+
+    def sample(self, client: int) -> float:
+        if self.distribution == "constant":
+            latency = self.mean
+        elif self.distribution == "exponential":
+            latency = self.rng.exponential(self.mean)
+        elif self.distribution == "lognormal":
+            latency = self.rng.lognormal(np.log(self.mean) - self.sigma ** 2 / 2, self.sigma)
+        else:
+            shape = 1.0 + 1.0 / self.sigma
+            latency = (self.rng.pareto(shape) + 1.0) * self.mean * (shape - 1.0) / shape
+        return float(latency * self.factors[client])
+
+
+class AsyncAggregationServer:
+    def __init__(self, trainer: FederatedTrainer, buffer_size=DEFAULT_BUFFER_SIZE,
+                 staleness_exponent=DEFAULT_STALENESS_EXPONENT, server_learning_rate=1.0, max_staleness=None):
+        """
+            FedBuff/FedAsync 式异步聚合服务器。客户端随时上传基于某个全局版本训练得到的更新，
+            服务器缓存先到达的 buffer_size 个更新后立即聚合并发布新版本，不等待掉队的客户端。
+            每个更新按陈旧度 τ（当前版本减去客户端开始训练时的版本）乘以 (1 + τ)^(-staleness_exponent)。
+            buffer_size 为 1 时即 FedAsync。
+
+            trainer: 提供客户端数据、编码器、聚合器和全局参数的 FederatedTrainer。
+            buffer_size: 每次聚合所需的更新数 K。
+            staleness_exponent: 陈旧度衰减指数。
+            server_learning_rate: 服务器学习率。
+            max_staleness: 陈旧度超过该值的更新直接丢弃；None 表示不丢弃。
+        """
+        self.trainer = trainer
+        self.buffer_size = buffer_size
+        self.staleness_exponent = staleness_exponent
+        self.server_learning_rate = server_learning_rate
+        self.max_staleness = max_staleness
+        self.version = 0
+        self.buffer = []
+        self.dropped = 0
+        self.last_staleness = 0.0
+
+    def staleness_weight(self, staleness: int) -> float:
+        return (1.0 + staleness) ** -self.staleness_exponent
+
+    def receive(self, update: np.ndarray, sample_count: int, base_version: int) -> bool:
+        """
+            接收一个客户端更新。
+
+            返回: 本次接收触发了聚合并产生新版本时返回 True。
+        """
+        staleness = self.version - base_version
+        if self.max_staleness is not None and staleness > self.max_staleness:
+            self.dropped += 1
+            return False
+        self.buffer.append((update * self.staleness_weight(staleness), sample_count, staleness))
+        if len(self.buffer) < self.buffer_size:
+            return False
+        updates = np.stack([update for update, _, _ in self.buffer])
+        sample_counts = np.array([count for _, count, _ in self.buffer])
+        self.trainer.weights = self.trainer.weights + self.server_learning_rate * self.trainer.aggregator.aggregate(
+            updates, sample_counts)
+        self.last_staleness = float(np.mean([staleness for _, _, staleness in self.buffer]))
+        self.buffer = []
+        self.version += 1
+        return True
+
+
+async def _client_update(loop, executor, trainer: FederatedTrainer, client: int, latency: LatencyModel, seed: int,
+                         global_weights: np.ndarray, base_version: int):
+    """
+        模拟一个客户端完成一次本地训练并上传：真实的本地训练在进程池中进行，同时叠加模拟的延迟。
+        global_weights 和 base_version 必须在调度该任务时取得，保证两者对应同一个全局版本。
+
+        返回: (客户端编号, 参数更新, 训练样本数, 开始训练时的全局版本)。
+    """
+    delay = asyncio.sleep(latency.sample(client))
+    training = loop.run_in_executor(executor, _train_client, client, global_weights, trainer.options, seed,
+                                    trainer.client_codecs[client])
+    _, (_, payload, count, _, _, codec) = await asyncio.gather(delay, training)
+    trainer.client_codecs[client] = codec
+    return client, codec.decode(payload, global_weights) - global_weights, count, base_version
+
+
+def _record(trainer: FederatedTrainer, started: float, version: int, **extra) -> Dict:
+    loss, accuracy = evaluate(trainer.weights, *trainer.holdout)
+    report = {"version": version, "elapsed": time.perf_counter() - started, "holdout_loss": loss,
+              "holdout_accuracy": accuracy}
+    report.update(extra)
+    trainer.history.append(report)
+    return report
+
+
+async def run_async(trainer: FederatedTrainer, latency: LatencyModel, buffer_size=DEFAULT_BUFFER_SIZE,
+                    staleness_exponent=DEFAULT_STALENESS_EXPONENT, server_learning_rate=1.0, max_staleness=None,
+                    target_accuracy=None, time_budget=DEFAULT_TIME_BUDGET, max_versions=None, publish=None,
+                    publish_every=1, on_version=None) -> List[Dict]:
+    """
+        异步联邦训练。每个客户端独立地循环“取当前全局参数 → 本地训练 → 上传更新”，
+        由 AsyncAggregationServer 按缓冲区大小和陈旧度聚合。
+
+        trainer: 提供数据和全局参数的 FederatedTrainer，训练结果写回 trainer.weights。
+        latency: 客户端延迟模型。
+        target_accuracy: 留出集准确率达到该值时停止。
+        time_budget: 最长训练时间（秒）。
+        max_versions: 最多产生的全局版本数。
+        publish: 发布新版本时的回调，参数为 (版本号, 标准化空间参数向量)，在单独的发布线程中按版本顺序调用，
+                 不阻塞聚合；发布排队期间已有更新的版本等待发布时，较旧的版本直接跳过。
+        publish_every: 每多少个版本发布一次。
+        on_version: 每产生一个新版本时以统计字典调用。
+        其余参数见 AsyncAggregationServer。
+        返回: 每个全局版本的统计字典列表，包含 version、elapsed、holdout_loss、holdout_accuracy 和 mean_staleness。
+    """
+    loop = asyncio.get_running_loop()
+    server = AsyncAggregationServer(trainer, buffer_size, staleness_exponent, server_learning_rate, max_staleness)
+    clients = [client for client, size in enumerate(trainer.client_sizes()) if size]
+    started = time.perf_counter()
+    _record(trainer, started, 0, mean_staleness=0.0)
+    publishing = []
+    # 所有发布在同一个线程中依次进行，写模型文件的发布不会并发，也不会用旧版本覆盖新版本
+    publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="publish") if publish else None
+    versions = {"scheduled": 0, "published": 0}
+
+    def publish_latest(version, weights):
+        if version < versions["scheduled"] or version <= versions["published"]:
+            return
+        publish(version, weights)
+        versions["published"] = version
+
+    with ProcessPoolExecutor(max_workers=trainer.workers, initializer=_init_client_worker,
+                             initargs=(trainer.client_data,)) as executor:
+        rounds = {client: 0 for client in clients}
+
+        def schedule(client):
+            return asyncio.ensure_future(_client_update(
+                loop, executor, trainer, client, latency, trainer.seed * 1000003 + rounds[client] * 1009 + client,
+                trainer.weights, server.version))
+
+        pending = {schedule(client) for client in clients}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                finished = False
+                for task in done:
+                    client, update, count, base_version = task.result()
+                    if server.receive(update, count, base_version):
+                        report = _record(trainer, started, server.version, mean_staleness=server.last_staleness)
+                        if on_version:
+                            on_version(report)
+                        if publish and server.version % publish_every == 0:
+                            versions["scheduled"] = server.version
+                            publishing.append(loop.run_in_executor(publisher, publish_latest, server.version,
+                                                                   trainer.weights))
+                        finished = ((target_accuracy is not None and report["holdout_accuracy"] >= target_accuracy)
+                                    or (max_versions is not None and server.version >= max_versions))
+                    # 客户端立即基于最新的全局参数开始下一次训练
+                    rounds[client] += 1
+                    pending.add(schedule(client))
+                if finished or time.perf_counter() - started >= time_budget:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    if publisher is not None:
+        try:
+            await asyncio.gather(*publishing)
+        finally:
+            publisher.shutdown()
+    return trainer.history
+
+
+async def run_sync(trainer: FederatedTrainer, latency: LatencyModel, target_accuracy=None,
+                   time_budget=DEFAULT_TIME_BUDGET, max_versions=None, publish=None, on_version=None) -> List[Dict]:
+    """
+        同步联邦训练（FedAvg）作为对照：每轮等待所有客户端（包括掉队者）上传后才聚合。
+        参数和返回值同 run_async。
+    """
+    loop = asyncio.get_running_loop()
+    clients = [client for client, size in enumerate(trainer.client_sizes()) if size]
+    started = time.perf_counter()
+    _record(trainer, started, 0, mean_staleness=0.0)
+    version = 0
+    with ProcessPoolExecutor(max_workers=trainer.workers, initializer=_init_client_worker,
+                             initargs=(trainer.client_data,)) as executor:
+        while time.perf_counter() - started < time_budget:
+            outcomes = await asyncio.gather(*(_client_update(
+                loop, executor, trainer, client, latency, trainer.seed * 1000003 + (version + 1) * 1009 + client,
+                trainer.weights, version) for client in clients))
+            updates = np.stack([update for _, update, _, _ in outcomes])
+            sample_counts = np.array([count for _, _, count, _ in outcomes])
+            trainer.weights = trainer.weights + trainer.aggregator.aggregate(updates, sample_counts)
+            version += 1
+            report = _record(trainer, started, version, mean_staleness=0.0)
+            if on_version:
+                on_version(report)
+            if publish:
+                await loop.run_in_executor(None, publish, version, trainer.weights)
+            if ((target_accuracy is not None and report["holdout_accuracy"] >= target_accuracy)
+                    or (max_versions is not None and version >= max_versions)):
+                break
+    return trainer.history
+
+
+def time_to_accuracy(history: List[Dict], target_accuracy: float) -> Optional[float]:
+    """返回留出集准确率首次达到目标值时的耗时（秒），未达到时返回 None"""
+    for report in history:
+        if report["holdout_accuracy"] >= target_accuracy:
+            return report["elapsed"]
+    return None
+
+
+def add_async_arguments(parser: argparse.ArgumentParser):
+    """添加异步聚合和客户端延迟相关的命令行参数"""
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE, help="每次聚合所需的更新数 K")
+    parser.add_argument("--staleness-exponent", type=float, default=DEFAULT_STALENESS_EXPONENT,
+                        help="陈旧度衰减指数")
+    parser.add_argument("--max-staleness", type=int, help="丢弃陈旧度超过该值的更新")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="客户端延迟分布")
+    parser.add_argument("--latency-mean", type=float, default=DEFAULT_LATENCY_MEAN, help="普通客户端平均延迟（秒）")
+    parser.add_argument("--latency-sigma", type=float, default=1.0, help="lognormal/pareto 延迟分布的离散程度")
+    parser.add_argument("--straggler-ratio", type=float, default=DEFAULT_STRAGGLER_RATIO, help="掉队客户端比例")
+    parser.add_argument("--straggler-factor", type=float, default=DEFAULT_STRAGGLER_FACTOR, help="掉队客户端延迟倍数")
+    parser.add_argument("--target-accuracy", type=float, help="留出集准确率达到该值时停止")
+    parser.add_argument("--time-budget", type=float, default=DEFAULT_TIME_BUDGET, help="最长训练时间（秒）")
+
+
+def latency_from_args(args) -> LatencyModel:
+    return LatencyModel(args.latency, args.latency_mean, args.latency_sigma, args.straggler_ratio,
+                        args.straggler_factor, args.clients, args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="异步联邦训练（FedBuff/FedAsync）：不等待掉队客户端，持续发布新的全局模型")
+    add_training_arguments(parser)
+    add_async_arguments(parser)
+    parser.add_argument("--max-versions", type=int, default=50, help="最多产生的全局版本数")
+    parser.add_argument("--publish-every", type=int, default=5, help="每多少个版本发布一次全局模型")
+    parser.add_argument("--out", default=str(base_path), help="输出基础路径，模型写入其中的 saved_models 目录")
+    args = parser.parse_args(argv)
+
+    trainer = trainer_from_args(load_records(args), args)
+    out = Path(args.out)
+
+    def publish(version, weights):
+        trainer.save(out, f"fedbuff-{version}", weights)
+
+    def print_version(report):
+        print(f"版本 {report['version']}: 耗时 {report['elapsed']:.2f} 秒，平均陈旧度 {report['mean_staleness']:.2f}，"
+              f"留出集准确率 {report['holdout_accuracy'] * 100:.2f}%", file=sys.stderr, flush=True)
+
+    history = asyncio.run(run_async(
+        trainer, latency_from_args(args), args.buffer_size, args.staleness_exponent,
+        max_staleness=args.max_staleness, target_accuracy=args.target_accuracy, time_budget=args.time_budget,
+        max_versions=args.max_versions, publish=publish, publish_every=args.publish_every,
+        on_version=print_version))
+    trainer.save(out, f"fedbuff-{history[-1]['version']}")
+    print(f"已写出全局模型版本 {history[-1]['version']}: {out / 'saved_models'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
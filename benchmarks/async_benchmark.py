@@ -0,0 +1,58 @@
+import sys
+import json
+import asyncio
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from async_federated import add_async_arguments, latency_from_args, run_async, run_sync, time_to_accuracy  # noqa: E402
+from federated_training import add_training_arguments, load_records, trainer_from_args  # noqa: E402
+
+# 参与比较的聚合方式
+MODES = ("sync", "fedbuff", "fedasync")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="异步聚合性能测试：比较同步 FedAvg、FedBuff 和 FedAsync 达到目标准确率的耗时")
+    add_training_arguments(parser)
+    add_async_arguments(parser)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="参与比较的聚合方式")
+    parser.add_argument("--json", help="把结果以 JSON 格式写入该文件")
+    parser.set_defaults(target_accuracy=0.99, time_budget=20.0)
+    args = parser.parse_args(argv)
+
+    trainer = trainer_from_args(load_records(args), args)
+    results = []
+    for mode in args.modes:
+        trainer.reset()
+        latency = latency_from_args(args)
+        if mode == "sync":
+            history = asyncio.run(run_sync(trainer, latency, args.target_accuracy, args.time_budget))
+        else:
+            history = asyncio.run(run_async(
+                trainer, latency, args.buffer_size if mode == "fedbuff" else 1, args.staleness_exponent,
+                max_staleness=args.max_staleness, target_accuracy=args.target_accuracy,
+                time_budget=args.time_budget))
+        results.append({
+            "mode": mode,
+            "seconds_to_target": time_to_accuracy(history, args.target_accuracy),
+            "versions": history[-1]["version"],
+            "elapsed": history[-1]["elapsed"],
+            "holdout_accuracy": history[-1]["holdout_accuracy"],
+            "mean_staleness": sum(report["mean_staleness"] for report in history[1:]) / max(len(history) - 1, 1)
+        })
+
+    print(f"目标准确率 {args.target_accuracy * 100:.2f}%")
+    print(f"{'方式':<10}{'达到目标(秒)':>14}{'版本数':>8}{'总耗时(秒)':>12}{'准确率':>10}{'平均陈旧度':>12}")
+    for result in results:
+        seconds = result["seconds_to_target"]
+        print(f"{result['mode']:<10}{'未达到' if seconds is None else f'{seconds:.2f}':>14}{result['versions']:>8}"
+              f"{result['elapsed']:>12.2f}{result['holdout_accuracy'] * 100:>9.2f}%{result['mean_staleness']:>12.2f}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from federated_training import add_training_arguments, load_records, trainer_from_args  # noqa: E402
+from update_codecs import CODECS  # noqa: E402
+
+
+def run_codec(records, args, codec: str):
+    """用指定编码方式进行联邦训练，返回该编码方式的统计结果"""
+    codec_options = {"ratio": args.topk_ratio} if codec == "topk" else None
+    trainer = trainer_from_args(records, args, codec=codec, codec_options=codec_options)
+    history = trainer.train(args.rounds)
+    updates = sum(report["clients"] for report in history)
+    return {
+        "codec": codec,
+        "bytes_per_round": sum(report["bytes"] for report in history) / len(history),
+        "encode_us_per_update": sum(report["encode_seconds"] for report in history) / updates * 1e6,
+        "decode_us_per_update": sum(report["decode_seconds"] for report in history) / updates * 1e6,
+        "holdout_loss": history[-1]["holdout_loss"],
+        "holdout_accuracy": history[-1]["holdout_accuracy"]
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="联邦训练参数更新编码方式的性能测试：每轮上传字节数、编解码耗时和留出集准确率")
+    add_training_arguments(parser)
+    parser.add_argument("--rounds", type=int, default=5, help="每种编码方式的联邦训练轮数")
+    parser.add_argument("--codecs", nargs="+", choices=list(CODECS), default=list(CODECS), help="参与测试的编码方式")
+    parser.add_argument("--topk-ratio", type=float, default=0.1, help="topk 编码发送的参数比例")
+    parser.add_argument("--json", help="把结果以 JSON 格式写入该文件")
+    args = parser.parse_args(argv)
+
+    records = load_records(args)
+    results = [run_codec(records, args, codec) for codec in args.codecs]
+    baseline = next((result for result in results if result["codec"] == "float64"), results[0])
+
+    print(f"{'编码':<10}{'字节/轮':>12}{'压缩比':>10}{'编码(微秒)':>12}{'解码(微秒)':>12}{'准确率':>10}{'准确率变化':>12}")
+    for result in results:
+        result["compression_ratio"] = baseline["bytes_per_round"] / result["bytes_per_round"]
+        result["accuracy_delta"] = result["holdout_accuracy"] - baseline["holdout_accuracy"]
+        print(f"{result['codec']:<10}{result['bytes_per_round']:>12.0f}{result['compression_ratio']:>10.2f}"
+              f"{result['encode_us_per_update']:>12.1f}{result['decode_us_per_update']:>12.1f}"
+              f"{result['holdout_accuracy'] * 100:>9.2f}%{result['accuracy_delta'] * 100:>+11.2f}%")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import subprocess
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_persistence_manager import DataPersistenceManager  # noqa: E402
+from data_processor import DEFAULT_CHUNK_SIZE, DataProcessor  # noqa: E402
+from model_handler import ModelHandler  # noqa: E402
+from stream_detector import DEFAULT_BATCH_SIZE, StreamingDetector  # noqa: E402
+from synthetic_traces import iter_synthetic_records, write_records  # noqa: E402
+
+repo_path = Path(__file__).resolve().parent.parent
+
+PATHS = ("single", "batch", "stream", "file", "persist")
+
+# 逐条计时的路径（single、persist）最多测量的记录数，其余路径处理全部记录
+DEFAULT_MAX_SAMPLES = 20000
+
+# 与基准结果比较时，吞吐量下降或 p99 延迟上升超过该比例视为性能回退
+DEFAULT_THRESHOLD = 0.15
+
+SIZE_SUFFIXES = {"k": 1000, "m": 1000000}
+
+
+def parse_size(text: str) -> int:
+    """解析记录数，支持 1k、100k、10M 这样的写法"""
+    suffix = text[-1:].lower()
+    if suffix in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[suffix])
+    return int(text)
+
+
+def summarize(path: str, size: int, records: int, seconds: float, latencies_ns, latency_unit: str):
+    """把一条路径的计时结果整理为结果字典，延迟以微秒为单位"""
+    latencies = np.asarray(latencies_ns, dtype=np.float64) / 1000.0
+    return {
+        "path": path,
+        "size": size,
+        "records": records,
+        "seconds": seconds,
+        "records_per_second": records / seconds if seconds > 0 else 0.0,
+        "latency_unit": latency_unit,
+        "p50_us": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p99_us": float(np.percentile(latencies, 99)) if len(latencies) else 0.0
+    }
+
+
+def trace_records(size: int, args):
+    return iter_synthetic_records(size, vehicles=args.vehicles, attacker_ratio=args.attacker_ratio,
+                                  attack_rate=args.attack_rate, seed=args.seed)
+
+
+def trace_blocks(size: int, args, block_size: int):
+    """按 block_size 条一组产出合成记录，内存占用与总记录数无关"""
+    block = []
+    for record in trace_records(size, args):
+        block.append(record)
+        if len(block) >= block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def trace_file(size: int, args) -> Path:
+    """生成（或复用已生成的）JSON Lines 合成轨迹文件"""
+    work_dir = Path(args.work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    path = work_dir / f"trace-{size}-{args.vehicles}-{args.attacker_ratio}-{args.attack_rate}-{args.seed}.jsonl"
+    if not path.exists():
+        temp_path = path.with_name(path.name + ".tmp")
+        write_records(temp_path, trace_records(size, args))
+        os.replace(temp_path, path)
+    return path
+
+
+def bench_single(processor: DataProcessor, size: int, args):
+    """单条记录路径：analyze_manual_data，逐条计时"""
+    latencies = []
+    for block in trace_blocks(min(size, args.max_samples), args, DEFAULT_CHUNK_SIZE):
+        for record in block:
+            begin = time.perf_counter_ns()
+            processor.analyze_manual_data(record)
+            latencies.append(time.perf_counter_ns() - begin)
+    return summarize("single", size, len(latencies), sum(latencies) / 1e9, latencies, "record")
+
+
+def bench_batch(processor: DataProcessor, size: int, args):
+    """批量路径：analyze_file_data，按分块计时，不含记录生成时间"""
+    latencies = []
+    records = 0
+    for block in trace_blocks(size, args, DEFAULT_CHUNK_SIZE):
+        begin = time.perf_counter_ns()
+        processor.analyze_file_data(block)
+        latencies.append(time.perf_counter_ns() - begin)
+        records += len(block)
+    return summarize("batch", size, records, sum(latencies) / 1e9, latencies, "chunk")
+
+
+def bench_stream(processor: DataProcessor, size: int, args):
+    """实时流路径：StreamingDetector.process_batch，按微批次计时"""
+    detector = StreamingDetector(processor)
+    latencies = []
+    records = 0
+    for block in trace_blocks(size, args, args.stream_batch):
+        begin = time.perf_counter_ns()
+        detector.process_batch(block)
+        latencies.append(time.perf_counter_ns() - begin)
+        records += len(block)
+    return summarize("stream", size, records, sum(latencies) / 1e9, latencies, "micro_batch")
+
+
+def bench_file(processor: DataProcessor, size: int, args):
+    """文件路径：从 JSON Lines 文件流式读取、解析并分析，端到端计时，延迟为相邻分块完成的间隔"""
+    path = trace_file(size, args)
+    marks = []
+    started = time.perf_counter_ns()
+    results, _ = processor.analyze_record_stream(DataPersistenceManager.iter_json_records(path),
+                                                 progress_callback=lambda consumed: marks.append(
+                                                     time.perf_counter_ns()),
+                                                 on_error=lambda message: None)
+    seconds = (time.perf_counter_ns() - started) / 1e9
+    latencies = np.diff([started] + marks)
+    return summarize("file", size, len(results), seconds, latencies, "chunk")
+
+
+def bench_persist(processor: DataProcessor, size: int, args):
+    """持久化路径：DataPersistenceManager.save_record 逐条追加到临时记录存储，逐条计时"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manager = DataPersistenceManager(data_file=Path(temp_dir) / "bench.db",
+                                         legacy_file=Path(temp_dir) / "missing.json")
+        latencies = []
+        for block in trace_blocks(min(size, args.max_samples), args, DEFAULT_CHUNK_SIZE):
+            for record in block:
+                begin = time.perf_counter_ns()
+                manager.save_record(record)
+                latencies.append(time.perf_counter_ns() - begin)
+        manager.store.close()
+    return summarize("persist", size, len(latencies), sum(latencies) / 1e9, latencies, "record")
+
+
+BENCHMARKS = {
+    "single": bench_single,
+    "batch": bench_batch,
+    "stream": bench_stream,
+    "file": bench_file,
+    "persist": bench_persist
+}
+
+
+def environment() -> dict:
+    """记录运行环境，便于比较不同机器或不同提交的结果"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_path, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def compare(results, baseline, threshold: float):
+    """
+        与基准结果逐项比较。
+
+        results: 本次结果列表。
+        baseline: 基准结果列表。
+        threshold: 允许的相对变化比例。
+        返回: 性能回退说明的列表，为空表示没有回退。
+    """
+    previous = {(entry["path"], entry["size"]): entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        old = previous.get((entry["path"], entry["size"]))
+        if old is None:
+            continue
+        if entry["records_per_second"] < old["records_per_second"] * (1.0 - threshold):
+            regressions.append(f"{entry['path']}@{entry['size']}: 吞吐量 {old['records_per_second']:.0f} -> "
+                               f"{entry['records_per_second']:.0f} 条/秒")
+        if entry["p99_us"] > old["p99_us"] * (1.0 + threshold):
+            regressions.append(f"{entry['path']}@{entry['size']}: p99 延迟 {old['p99_us']:.1f} -> "
+                               f"{entry['p99_us']:.1f} 微秒/{entry['latency_unit']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="检测流程性能测试：单条、批量、实时流、文件和持久化路径的吞吐量与 p50/p99 延迟")
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"],
+                        help="合成轨迹的记录数，支持 1k、100k、10M 这样的写法")
+    parser.add_argument("--paths", nargs="+", choices=PATHS, default=list(PATHS), help="参与测试的路径")
+    parser.add_argument("--vehicles", type=int, default=100, help="车辆数")
+    parser.add_argument("--attacker-ratio", type=float, default=0.1, help="攻击车辆所占比例")
+    parser.add_argument("--attack-rate", type=float, default=0.5, help="攻击车辆每条消息被伪造的概率")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--max-samples", type=int, default=DEFAULT_MAX_SAMPLES,
+                        help="single 和 persist 路径最多逐条测量的记录数")
+    parser.add_argument("--stream-batch", type=int, default=DEFAULT_BATCH_SIZE, help="stream 路径的微批次大小")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试的运行次数，结果取吞吐量居中的一次")
+    parser.add_argument("--work-dir", default=str(Path(tempfile.gettempdir()) / "vehicle_benchmark"),
+                        help="file 路径生成的合成轨迹文件的保存目录，相同参数的文件会被复用")
+    parser.add_argument("--json", help="把结果以 JSON 格式写入该文件")
+    parser.add_argument("--compare", help="与该 JSON 基准结果比较，出现性能回退时以退出码 1 结束")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="判定性能回退的相对变化比例")
+    args = parser.parse_args(argv)
+
+    model, metadata = ModelHandler.load_model(repo_path)
+    results = []
+    print(f"{'路径':<10}{'记录数':>12}{'条/秒':>14}{'p50(微秒)':>12}{'p99(微秒)':>12}  延迟单位")
+    for size in map(parse_size, args.sizes):
+        for path in args.paths:
+            # 每次运行使用新的数据处理器，结果缓存不会跨运行命中；取吞吐量居中的一次以减小抖动
+            runs = sorted((BENCHMARKS[path](DataProcessor(model, metadata), size, args) for _ in range(args.repeat)),
+                          key=lambda run: run["records_per_second"])
+            entry = runs[len(runs) // 2]
+            results.append(entry)
+            print(f"{path:<10}{entry['records']:>12}{entry['records_per_second']:>14.0f}"
+                  f"{entry['p50_us']:>12.1f}{entry['p99_us']:>12.1f}  {entry['latency_unit']}")
+
+    report = {"environment": environment(), "model_version": metadata.get("model_version"), "results": results}
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline["results"], args.threshold)
+        for message in regressions:
+            print(f"性能回退: {message}", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"与基准 {args.compare} 相比没有超过 {args.threshold:.0%} 的性能回退", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
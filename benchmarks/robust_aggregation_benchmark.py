@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import tempfile
+import argparse
+import numpy as np
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from federated_training import (AGGREGATORS, add_training_arguments, load_records, make_aggregator,  # noqa: E402
+                                trainer_from_args)
+from model_handler import ModelHandler  # noqa: E402
+
+# 模拟的投毒方式：符号翻转并放大、替换为高斯噪声、在翻转标签的数据上训练
+ATTACKS = ("sign_flip", "gaussian", "label_flip")
+
+
+class PoisoningAggregator:
+    def __init__(self, inner, malicious_rows: int, attack: str, scale=10.0, seed=0):
+        """
+            在交给被测聚合器之前，把前 malicious_rows 个客户端的更新替换为恶意更新。
+
+            inner: 被测聚合器。
+            malicious_rows: 恶意客户端数。
+            attack: "sign_flip"、"gaussian" 或 "label_flip"（label_flip 在训练数据上进行，此处不修改更新）。
+            scale: 恶意更新的放大倍数。
+        """
+        self.inner = inner
+        self.malicious_rows = malicious_rows
+        self.attack = attack
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+
+    def aggregate(self, updates, sample_counts):
+        updates = updates.copy()
+        rows = slice(0, self.malicious_rows)
+        if self.attack == "sign_flip":
+            updates[rows] *= -self.scale
+        elif self.attack == "gaussian":
+            spread = float(np.abs(updates).mean()) * self.scale
+            updates[rows] = self.rng.normal(0.0, spread, size=updates[rows].shape)
+        return self.inner.aggregate(updates, sample_counts)
+
+
+def time_aggregators(names, client_counts, dim: int, repeats: int, num_malicious_ratio: float):
+    """测量各聚合器在不同客户端数下聚合一轮更新的耗时（毫秒，取多次中的最小值）"""
+    rng = np.random.default_rng(0)
+    timings = []
+    for count in client_counts:
+        updates = rng.normal(0.0, 1.0, size=(count, dim))
+        sample_counts = rng.integers(100, 1000, size=count)
+        for name in names:
+            aggregator = make_aggregator(name, count, num_malicious=int(count * num_malicious_ratio))
+            best = float("inf")
+            for _ in range(repeats):
+                started = time.perf_counter()
+                aggregator.aggregate(updates, sample_counts)
+                best = min(best, time.perf_counter() - started)
+            timings.append({"aggregator": name, "clients": count, "dim": dim, "milliseconds": best * 1000})
+    return timings
+
+
+def published_accuracy(trainer) -> float:
+    """把当前全局模型发布到临时目录，再通过 ModelHandler.load_model 读回并在留出集上计算准确率"""
+    X, y = trainer.holdout
+    with tempfile.TemporaryDirectory() as directory:
+        trainer.save(Path(directory))
+        engine, _ = ModelHandler.load_model(Path(directory))
+        predictions = engine.predict(X * trainer.scale + trainer.mean)
+    return float(np.mean(predictions == y))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="鲁棒聚合性能测试：聚合耗时随客户端数的变化，以及投毒攻击下全局模型的检测准确率")
+    add_training_arguments(parser)
+    parser.set_defaults(clients=20, synthetic=50000, trim_ratio=0.25)
+    parser.add_argument("--rounds", type=int, default=5, help="投毒测试中每种聚合方式的联邦训练轮数")
+    parser.add_argument("--aggregators", nargs="+", choices=list(AGGREGATORS), default=list(AGGREGATORS),
+                        help="参与测试的聚合方式")
+    parser.add_argument("--client-counts", nargs="+", type=int, default=[10, 100, 1000, 5000],
+                        help="聚合耗时测试的客户端数")
+    parser.add_argument("--dim", type=int, default=36, help="聚合耗时测试的参数维度")
+    parser.add_argument("--repeats", type=int, default=5, help="聚合耗时测试的重复次数")
+    parser.add_argument("--attacks", nargs="+", choices=ATTACKS, default=list(ATTACKS), help="模拟的投毒方式")
+    parser.add_argument("--malicious-ratio", type=float, default=0.2, help="恶意客户端比例")
+    parser.add_argument("--attack-scale", type=float, default=10.0, help="恶意更新的放大倍数")
+    parser.add_argument("--json", help="把结果以 JSON 格式写入该文件")
+    args = parser.parse_args(argv)
+
+    timings = time_aggregators(args.aggregators, args.client_counts, args.dim, args.repeats, args.malicious_ratio)
+    print(f"聚合一轮的耗时（毫秒，参数维度 {args.dim}）")
+    print(f"{'聚合方式':<14}" + "".join(f"{count:>12}" for count in args.client_counts))
+    for name in args.aggregators:
+        row = [timing["milliseconds"] for timing in timings if timing["aggregator"] == name]
+        print(f"{name:<14}" + "".join(f"{milliseconds:>12.3f}" for milliseconds in row))
+
+    trainer = trainer_from_args(load_records(args), args)
+    clients = [client for client, size in enumerate(trainer.client_sizes()) if size]
+    malicious = int(round(len(clients) * args.malicious_ratio))
+    clean_data = list(trainer.client_data)
+    accuracies = []
+    for attack in ("none",) + tuple(args.attacks):
+        trainer.client_data = list(clean_data)
+        if attack == "label_flip":
+            for client in clients[:malicious]:
+                X, y = clean_data[client]
+                trainer.client_data[client] = (X, 1.0 - y)
+        for name in args.aggregators:
+            trainer.reset()
+            inner = make_aggregator(name, len(clients), args.trim_ratio, args.num_malicious or malicious,
+                                    args.clip_norm)
+            trainer.aggregator = inner if attack == "none" else PoisoningAggregator(
+                inner, malicious, attack, args.attack_scale, args.seed)
+            trainer.train(args.rounds)
+            accuracies.append({"attack": attack, "aggregator": name, "malicious_clients": 0 if attack == "none"
+                               else malicious, "holdout_accuracy": published_accuracy(trainer)})
+    trainer.client_data = clean_data
+
+    print(f"\n投毒攻击下的留出集检测准确率（客户端 {len(clients)} 个，其中恶意 {malicious} 个，训练 {args.rounds} 轮）")
+    attacks = ("none",) + tuple(args.attacks)
+    print(f"{'聚合方式':<14}" + "".join(f"{attack:>12}" for attack in attacks))
+    for name in args.aggregators:
+        row = [result["holdout_accuracy"] for result in accuracies if result["aggregator"] == name]
+        print(f"{name:<14}" + "".join(f"{accuracy * 100:>11.2f}%" for accuracy in row))
+    if args.json:
+        Path(args.json).write_text(json.dumps({"timings": timings, "accuracies": accuracies}, ensure_ascii=False,
+                                              indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import struct
+import argparse
+import datetime
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from data_processor import DEFAULT_CHUNK_SIZE, DataProcessor, vehicle_id_of
+from model_handler import atomic_write
+
+# 二进制记录文件：64 字节文件头（魔数、格式版本），随后是定长记录数组，
+# 文件末尾为 JSON 尾部信息、8 字节尾部长度和结尾魔数
+RECORDS_SUFFIX = ".vrec"
+RECORDS_MAGIC = b"VRECS001"
+RECORDS_END_MAGIC = b"VRECEND1"
+RECORDS_VERSION = 2
+DATA_OFFSET = 64
+
+# 每次映射并打分的记录数
+DEFAULT_SLICE_ROWS = 65536
+
+# hazardAttack 缺失时写入的值
+UNKNOWN_LABEL = -1
+
+
+def record_dtype(feature_count: int) -> np.dtype:
+    """
+        二进制记录的结构化类型（小端、按字段自然对齐）。
+
+        send_time / rcv_time / saved_time: sendTime、rcvTime 和 savedTimestamp 对应的 Unix 时间戳（秒），
+            缺失或无法识别时为 NaN。
+        features: 按模型特征列顺序排列的 float32 特征，与 DataProcessor.records_to_matrix 的结果相同。
+        vehicle: 车辆ID在尾部车辆表中的编号。
+        hazard_attack: hazardAttack 标签，缺失时为 -1。
+    """
+    return np.dtype([
+        ("send_time", "<f8"),
+        ("rcv_time", "<f8"),
+        ("saved_time", "<f8"),
+        ("features", "<f4", (feature_count,)),
+        ("vehicle", "<i4"),
+        ("hazard_attack", "i1")
+    ], align=True)
+
+
+def is_binary_records(path) -> bool:
+    return Path(path).suffix.lower() == RECORDS_SUFFIX
+
+
+def _timestamp(value) -> float:
+    """把数值或 ISO 8601 字符串（例如 generate_complete_record 写入的时间）转换为 Unix 时间戳，无法识别时为 NaN"""
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass  # 也可能是数字字符串
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def export_records(records: Iterable[Dict], out_path, processor: DataProcessor, on_error=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE) -> int:
+    """
+        把记录流一次性解析并转换为定长二进制记录文件，之后用新模型重新打分时无需再解析 JSON。
+        特征按 processor 当前模型的特征列提取；提取失败的记录不写入文件。
+        先写入名称唯一的临时文件再原子替换，同时导出到同一路径的多个进程互不干扰。
+
+        records: 记录字典的可迭代对象。
+        out_path: 输出文件路径（.vrec）。
+        processor: 提供特征提取计划的数据处理器。
+        on_error: 单条记录提取失败时的回调，参数为错误信息字符串。
+        chunk_size: 每次转换的记录数。
+        返回: 写入的记录数。
+    """
+    out_path = Path(out_path)
+    state = processor.state
+    feature_columns = list(state.metadata["feature_columns"])
+    dtype = record_dtype(len(feature_columns))
+    vehicle_codes = {}
+    written = 0
+    start = 0
+
+    def write_chunk(f, chunk: List[Dict]):
+        nonlocal written
+        matrix, kept = processor.records_to_matrix(
+            chunk, lambda row, e: on_error and on_error(f'处理记录 {start + row + 1} 时发生错误: {e}'), state)
+        rows = np.zeros(len(kept), dtype=dtype)
+        rows["features"] = matrix
+        kept_records = [chunk[row] for row in kept.tolist()]
+        rows["send_time"] = [_timestamp(record.get("sendTime")) for record in kept_records]
+        rows["rcv_time"] = [_timestamp(record.get("rcvTime")) for record in kept_records]
+        rows["saved_time"] = [_timestamp(record.get("savedTimestamp")) for record in kept_records]
+        rows["vehicle"] = [vehicle_codes.setdefault(vehicle_id_of(record), len(vehicle_codes))
+                           for record in kept_records]
+        rows["hazard_attack"] = [UNKNOWN_LABEL if record.get("hazardAttack") is None
+                                 else int(bool(record["hazardAttack"])) for record in kept_records]
+        f.write(rows.tobytes())
+        written += len(rows)
+
+    def write(f):
+        nonlocal start
+        f.write((RECORDS_MAGIC + struct.pack("<I", RECORDS_VERSION)).ljust(DATA_OFFSET, b"\0"))
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                write_chunk(f, chunk)
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            write_chunk(f, chunk)
+        footer = json.dumps({
+            "count": written,
+            "dtype": dtype.descr,
+            "feature_columns": feature_columns,
+            "vehicle_ids": list(vehicle_codes)
+        }, ensure_ascii=False).encode("utf-8")
+        f.write(footer + struct.pack("<Q", len(footer)) + RECORDS_END_MAGIC)
+
+    atomic_write(out_path, write)
+    return written
+
+
+class BinaryRecordFile:
+    def __init__(self, path):
+        """
+            以 numpy.memmap 只读映射二进制记录文件，记录不会被整体读入内存。
+
+            path: 由 export_records 生成的 .vrec 文件路径。
+        """
+        self.path = Path(path)
+        size = os.path.getsize(self.path)
+        trailer_size = 8 + len(RECORDS_END_MAGIC)
+        with open(self.path, "rb") as f:
+            head = f.read(DATA_OFFSET)
+            if size < DATA_OFFSET + trailer_size or head[:len(RECORDS_MAGIC)] != RECORDS_MAGIC:
+                raise ValueError(f"不是有效的二进制记录文件: {self.path}")
+            if struct.unpack("<I", head[len(RECORDS_MAGIC):len(RECORDS_MAGIC) + 4])[0] != RECORDS_VERSION:
+                raise ValueError(f"不支持的二进制记录文件版本，请重新导出: {self.path}")
+            f.seek(size - trailer_size)
+            trailer = f.read(trailer_size)
+            if trailer[8:] != RECORDS_END_MAGIC:
+                raise ValueError(f"二进制记录文件不完整: {self.path}")
+            footer_size = struct.unpack("<Q", trailer[:8])[0]
+            f.seek(size - trailer_size - footer_size)
+            footer = json.loads(f.read(footer_size).decode("utf-8"))
+
+        self.feature_columns = footer["feature_columns"]
+        self.vehicle_ids = footer["vehicle_ids"]
+        self.dtype = record_dtype(len(self.feature_columns))
+        self.count = footer["count"]
+        if DATA_OFFSET + self.count * self.dtype.itemsize + footer_size + trailer_size != size:
+            raise ValueError(f"二进制记录文件大小与记录数不符: {self.path}")
+        # 空文件无法映射，用空数组代替
+        self.records = (np.memmap(self.path, dtype=self.dtype, mode="r", offset=DATA_OFFSET, shape=(self.count,))
+                        if self.count else np.zeros(0, dtype=self.dtype))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def check_features(self, feature_columns: List[str]):
+        """文件的特征列必须与模型一致，否则需要重新导出"""
+        if list(feature_columns) != self.feature_columns:
+            raise ValueError(f"二进制记录文件的特征列与当前模型不一致，请重新导出: {self.path}")
+
+    def iter_slices(self, slice_rows=DEFAULT_SLICE_ROWS) -> Iterator[np.ndarray]:
+        """按 slice_rows 条一组产出记录数组的视图，不复制数据"""
+        for start in range(0, self.count, slice_rows):
+            yield self.records[start:start + slice_rows]
+
+
+def score_file(processor: DataProcessor, binary_file: BinaryRecordFile, slice_rows=DEFAULT_SLICE_ROWS,
+               progress_callback=None, cancel_event=None):
+    """
+        用 processor 当前的模型对二进制记录文件重新打分，特征切片直接交给推理引擎，不构造逐条记录的字典。
+
+        processor: 数据处理器。
+        binary_file: 已打开的二进制记录文件。
+        slice_rows: 每次打分的记录数。
+        progress_callback: 每打分完一个切片后以已打分记录数调用。
+        cancel_event: 可选的 threading.Event，被设置后在当前切片结束时停止。
+        返回: (预测类别数组, 攻击概率数组, 车辆编号数组, 车辆ID表, 模型状态)，只包含已打分的记录。
+    """
+    state = processor.state
+    binary_file.check_features(state.metadata["feature_columns"])
+    predictions = np.empty(len(binary_file), dtype=np.asarray(state.model.classes_).dtype)
+    attack_probs = np.empty(len(binary_file), dtype=np.float64)
+    scored = 0
+    for rows in binary_file.iter_slices(slice_rows):
+        predictions[scored:scored + len(rows)], attack_probs[scored:scored + len(rows)] = processor.score_matrix(
+            rows["features"], state)
+        scored += len(rows)
+        if progress_callback:
+            progress_callback(scored)
+        if cancel_event is not None and cancel_event.is_set():
+            break
+    vehicles = np.asarray(binary_file.records["vehicle"][:scored])
+    return predictions[:scored], attack_probs[:scored], vehicles, binary_file.vehicle_ids, state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把 JSON 记录文件转换为可内存映射的定长二进制记录文件")
+    parser.add_argument("input", help="JSON 数组或 JSON Lines 格式的记录文件")
+    parser.add_argument("out", help=f"输出文件（{RECORDS_SUFFIX}）")
+    args = parser.parse_args(argv)
+
+    from model_handler import ModelHandler
+    from data_persistence_manager import DataPersistenceManager
+    model, metadata = ModelHandler.load_model(Path(__file__).parent)
+    written = export_records((record for record, _ in DataPersistenceManager.iter_json_records(args.input)),
+                             args.out, DataProcessor(model, metadata),
+                             on_error=lambda message: print(f"错误: {message}", file=sys.stderr))
+    print(f"已导出 {written} 条记录: {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import sys
+import csv
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+base_path = Path(__file__).parent
+
+
+def report_error(message: str):
+    """命令行模式下的错误提示：输出到标准错误"""
+    print(f"错误: {message}", file=sys.stderr)
+
+
+def write_table(columns: Dict[str, list], path: Path):
+    """
+        按文件扩展名把结果表写入 .parquet、.arrow、.feather、.csv、.json 或 .jsonl 文件。
+        CSV 和 JSON 直接用标准库写出，不需要导入 pandas。
+
+        columns: 列名到等长列表的字典。
+        path: 输出文件路径。
+    """
+    from columnar_io import is_columnar
+    suffix = path.suffix.lower()
+    if is_columnar(path):
+        import columnar_io
+        try:
+            columnar_io.write_table(columns, path)
+        except ImportError as e:
+            raise SystemExit(str(e))
+    elif suffix == ".csv":
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(columns)
+            writer.writerows(zip(*columns.values()))
+    elif suffix in (".json", ".jsonl"):
+        rows = [dict(zip(columns, row)) for row in zip(*columns.values())]
+        with open(path, "w", encoding="utf-8") as f:
+            if suffix == ".jsonl":
+                f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+            else:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+    else:
+        raise SystemExit(f"不支持的输出格式: {path.suffix}（支持 .parquet、.arrow、.feather、.csv、.json、.jsonl）")
+
+
+def vehicles_path_for(out: Path) -> Path:
+    """默认的按车辆汇总输出路径，例如 results.parquet -> results.vehicles.parquet"""
+    return out.with_name(f"{out.stem}.vehicles{out.suffix}")
+
+
+def result_columns(results: List[Dict]) -> Dict[str, list]:
+    """把逐条结果字典整理为结果列"""
+    records = {column: [r[column] for r in results]
+               for column in ("prediction", "attack_prob", "is_attack", "model_version", "model_sha256")}
+    # 车辆ID可能同时包含数字和字符串，统一转换为字符串以便写出列式格式
+    return {"vehicle_id": [str(r["vehicle_id"]) for r in results], **records}
+
+
+def binary_result_columns(data_processor, path):
+    """
+        对二进制记录文件重新打分，直接由结果数组得到结果列和按车辆汇总结果，不构造逐条结果字典。
+
+        返回: (结果列字典, DataProcessor.summarize_vehicle_codes 的汇总结果)。
+    """
+    import numpy as np
+    predictions, attack_probs, vehicles, vehicle_table, state = data_processor.score_binary_file(path)
+    vehicle_names = np.array([str(vehicle_id) for vehicle_id in vehicle_table], dtype=object)
+    records = {
+        "vehicle_id": vehicle_names[vehicles].tolist(),
+        "prediction": predictions.tolist(),
+        "attack_prob": attack_probs.tolist(),
+        "is_attack": (predictions != 0).tolist(),
+        "model_version": [state.version] * len(predictions),
+        "model_sha256": [state.sha256] * len(predictions)
+    }
+    return records, data_processor.summarize_vehicle_codes(vehicles, predictions == 1, vehicle_table)
+
+
+def analyze_command(args):
+    """批量分析一个记录文件，写出逐条结果和按车辆汇总结果"""
+    from metrics import metrics
+    # 指标采集需要在导入被计时的模块之前启用
+    if args.metrics_port is not None or args.metrics_out:
+        metrics.enable()
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    from model_handler import ModelHandler
+    from data_processor import DataProcessor
+    from data_persistence_manager import DataPersistenceManager
+    from columnar_io import is_columnar
+    from binary_records import is_binary_records
+
+    started = time.perf_counter()
+    model, metadata = ModelHandler.load_model(base_path)
+    data_processor = DataProcessor(model, metadata)
+    loaded = time.perf_counter()
+
+    def analyze(on_error):
+        if is_columnar(args.input):
+            return data_processor.analyze_columnar_file(args.input, on_error=on_error)
+        if args.workers and args.workers > 1:
+            return data_processor.analyze_file_parallel(args.input, workers=args.workers,
+                                                        on_error=on_error)
+        return data_processor.analyze_record_stream(DataPersistenceManager.iter_json_records(args.input),
+                                                    on_error=on_error)
+
+    cache_hit = False
+    if is_binary_records(args.input):
+        # 二进制记录文件重新打分与读取结果缓存一样快，不使用结果缓存
+        records, vehicle_summary = binary_result_columns(data_processor, args.input)
+    else:
+        if args.cache_dir:
+            from result_cache import FileResultCache
+            results, _, cache_hit = data_processor.analyze_file_cached(args.input, FileResultCache(args.cache_dir),
+                                                                       analyze, report_error)
+        else:
+            results, _ = analyze(report_error)
+        records, vehicle_summary = result_columns(results), data_processor.summarize_by_vehicle(results)
+    analyzed = time.perf_counter()
+
+    vehicles = {column: values.tolist() for column, values in vehicle_summary.items()}
+    vehicles["vehicle_id"] = [str(vehicle_id) for vehicle_id in vehicles["vehicle_id"]]
+
+    out = Path(args.out)
+    write_table(records, out)
+    write_table(vehicles, Path(args.vehicles_out) if args.vehicles_out else vehicles_path_for(out))
+
+    attacks = int(vehicle_summary["attacks"].sum())
+    print(f"已分析 {len(records['prediction'])} 条记录，检测到攻击 {attacks} 次，涉及车辆 {len(vehicles['vehicle_id'])} 辆；"
+          f"模型加载 {loaded - started:.2f} 秒，分析 {analyzed - loaded:.2f} 秒"
+          f"{'（命中结果缓存）' if cache_hit else ''}", file=sys.stderr)
+    if args.metrics_out:
+        Path(args.metrics_out).write_text(json.dumps(metrics.snapshot(), ensure_ascii=False, indent=2),
+                                          encoding="utf-8")
+    return 0
+
+
+def stream_command(args, extra_args):
+    """实时流检测模式，参数原样转交给 stream_detector"""
+    import stream_detector
+    return stream_detector.main(extra_args)
+
+
+def train_command(args, extra_args):
+    """单机联邦训练，参数原样转交给 federated_training"""
+    import federated_training
+    return federated_training.main(extra_args)
+
+
+def online_update_command(args, extra_args):
+    """用人工标注的新记录增量更新模型，参数原样转交给 online_learning"""
+    import online_learning
+    return online_learning.main(extra_args)
+
+
+def convert_model_command(args):
+    """把 saved_models 中的 pkl 模型转换为紧凑模型文件，之后启动无需导入 scikit-learn"""
+    from model_handler import ModelHandler
+    try:
+        artifact_path = ModelHandler.convert_model(base_path)
+    except (FileNotFoundError, ValueError) as e:
+        report_error(str(e))
+        return 1
+    print(f"已写出紧凑模型文件: {artifact_path}", file=sys.stderr)
+    return 0
+
+
+def convert_records_command(args):
+    """把 JSON 数组或 JSON Lines 记录文件转换为 Parquet、Arrow IPC 或 Feather 列式文件"""
+    import columnar_io
+    from data_persistence_manager import DataPersistenceManager
+    if not columnar_io.is_columnar(args.out):
+        report_error(f"不支持的输出格式: {Path(args.out).suffix}（支持 .parquet、.arrow、.feather）")
+        return 1
+    started = time.perf_counter()
+    records = (record for record, _ in DataPersistenceManager.iter_json_records(args.input))
+    try:
+        written = columnar_io.convert_records(records, args.out, args.batch_rows or columnar_io.DEFAULT_BATCH_ROWS)
+    except (ImportError, ValueError) as e:
+        report_error(str(e))
+        return 1
+    print(f"已转换 {written} 条记录: {args.out}，耗时 {time.perf_counter() - started:.2f} 秒", file=sys.stderr)
+    return 0
+
+
+def export_records_command(args):
+    """把 JSON 记录文件一次性解析为定长二进制记录文件，之后可用 analyze 命令直接映射并重新打分"""
+    import binary_records
+    return binary_records.main([args.input, args.out])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="恶意车辆识别系统命令行入口（无需图形界面）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    analyze_parser = subparsers.add_parser("analyze", help="批量分析记录文件")
+    analyze_parser.add_argument("input", help="JSON 数组、JSON Lines、Parquet、Arrow IPC、Feather 或二进制记录（.vrec）文件")
+    analyze_parser.add_argument("--out", required=True,
+                                help="逐条结果输出文件（.parquet、.arrow、.feather、.csv、.json 或 .jsonl）")
+    analyze_parser.add_argument("--vehicles-out",
+                                help="按车辆汇总结果输出文件，默认为在 --out 文件名后加 .vehicles")
+    analyze_parser.add_argument("--workers", type=int, default=1, help="并行分析的工作进程数")
+    analyze_parser.add_argument("--cache-dir",
+                                help="结果缓存目录；同一模型重新分析内容相同的文件时直接读取缓存的结果")
+    analyze_parser.add_argument("--metrics-port", type=int,
+                                help="启用热路径耗时指标，并在本机该端口提供 Prometheus 文本格式的 /metrics 端点")
+    analyze_parser.add_argument("--metrics-out", help="分析结束后把热路径耗时指标快照以 JSON 格式写入该文件")
+    analyze_parser.set_defaults(func=analyze_command)
+
+    records_parser = subparsers.add_parser("convert-records", help="把 JSON 记录文件转换为列式文件")
+    records_parser.add_argument("input", help="JSON 数组或 JSON Lines 格式的记录文件")
+    records_parser.add_argument("out", help="输出文件（.parquet、.arrow 或 .feather）")
+    records_parser.add_argument("--batch-rows", type=int, help="每个批次的行数，默认为 65536")
+    records_parser.set_defaults(func=convert_records_command)
+
+    export_parser = subparsers.add_parser("export-records", help="把 JSON 记录文件转换为可内存映射的二进制记录文件")
+    export_parser.add_argument("input", help="JSON 数组或 JSON Lines 格式的记录文件")
+    export_parser.add_argument("out", help="输出文件（.vrec）")
+    export_parser.set_defaults(func=export_records_command)
+
+    convert_parser = subparsers.add_parser("convert-model", help="把 pkl 模型转换为紧凑模型文件")
+    convert_parser.set_defaults(func=convert_model_command)
+
+    stream_parser = subparsers.add_parser("stream", add_help=False,
+                                          help="实时流检测模式（参数同 stream_detector.py）")
+    stream_parser.set_defaults(func=stream_command)
+
+    train_parser = subparsers.add_parser("train", add_help=False,
+                                         help="单机联邦训练全局模型（参数同 federated_training.py）")
+    train_parser.set_defaults(func=train_command)
+
+    online_parser = subparsers.add_parser("online-update", add_help=False,
+                                          help="用人工标注的新记录增量更新模型（参数同 online_learning.py）")
+    online_parser.set_defaults(func=online_update_command)
+
+    args, extra_args = parser.parse_known_args(argv)
+    if args.func in (stream_command, train_command, online_update_command):
+        return args.func(args, extra_args)
+    if extra_args:
+        parser.error(f"无法识别的参数: {' '.join(extra_args)}")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from data_processor import VECTOR_FIELD_PREFIXES
+from model_handler import atomic_write
+
+# 列式文件扩展名：Parquet，以及 Arrow IPC 文件格式（Feather v2 与其相同）
+PARQUET_SUFFIXES = frozenset({".parquet"})
+ARROW_SUFFIXES = frozenset({".arrow", ".feather", ".ipc"})
+COLUMNAR_SUFFIXES = PARQUET_SUFFIXES | ARROW_SUFFIXES
+
+# 读取和转换时每个批次包含的行数
+DEFAULT_BATCH_ROWS = 65536
+
+# 转换为列式文件时写成定长列表列的向量字段
+VECTOR_FIELDS = tuple(prefix.rstrip('_') for prefix in VECTOR_FIELD_PREFIXES)
+
+
+def is_columnar(path) -> bool:
+    """按扩展名判断是否为 Parquet 或 Arrow IPC/Feather 文件"""
+    return Path(path).suffix.lower() in COLUMNAR_SUFFIXES
+
+
+def _require_pyarrow():
+    """导入 pyarrow；未安装时给出明确的提示"""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(f"读写 Parquet/Arrow/Feather 文件需要安装 pyarrow: {e}") from e
+    return pyarrow
+
+
+def iter_record_batches(path, columns=None, batch_rows=DEFAULT_BATCH_ROWS) -> Iterator[Tuple["pa.RecordBatch", int]]:
+    """
+        按批次读取列式文件，只读取需要的列。
+        Arrow IPC/Feather 文件以内存映射方式打开，批次直接引用映射的内存，不发生复制。
+
+        path: Parquet、Arrow IPC 或 Feather 文件路径。
+        columns: 需要读取的列名；文件中不存在的列会被忽略，None 表示全部列。
+        batch_rows: 每个批次的最大行数。
+        返回: 逐批产出 (RecordBatch, 文件总行数) 的迭代器。
+    """
+    pa = _require_pyarrow()
+    if Path(path).suffix.lower() in PARQUET_SUFFIXES:
+        parquet_file = pa.parquet.ParquetFile(path)
+        names = parquet_file.schema_arrow.names
+        selected = None if columns is None else [name for name in names if name in set(columns)]
+        total_rows = parquet_file.metadata.num_rows
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=selected):
+            yield batch, total_rows
+        return
+
+    with pa.memory_map(str(path), "r") as source:
+        reader = pa.ipc.open_file(source)
+        names = reader.schema.names
+        selected = None if columns is None else [name for name in names if name in set(columns)]
+        total_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            if selected is not None:
+                batch = batch.select(selected)
+            for offset in range(0, batch.num_rows, batch_rows):
+                yield batch.slice(offset, batch_rows), total_rows
+
+
+def _python_floats(values: List) -> np.ndarray:
+    """逐个转换为浮点数，无法转换的值取 0.0，与 DataProcessor.extract_features 一致"""
+    result = np.zeros(len(values), dtype=np.float64)
+    for row, value in enumerate(values):
+        try:
+            result[row] = float(value)
+        except (ValueError, TypeError):
+            pass
+    return result
+
+
+def _to_float_array(array) -> np.ndarray:
+    """把一列 Arrow 标量转换为 float64 数组，空值取 0.0"""
+    pa = _require_pyarrow()
+    if pa.types.is_integer(array.type) or pa.types.is_floating(array.type) or pa.types.is_boolean(array.type):
+        return pa.compute.fill_null(array.cast(pa.float64()), 0.0).to_numpy(zero_copy_only=False)
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        return _python_floats(array.to_pylist())
+    return np.zeros(len(array), dtype=np.float64)
+
+
+def _list_element(column, index: int) -> np.ndarray:
+    """取列表列每一行的第 index 个元素；列表为空值或长度不足时取 0.0"""
+    pa = _require_pyarrow()
+    if pa.types.is_fixed_size_list(column.type):
+        if index >= column.type.list_size:
+            return np.zeros(len(column), dtype=np.float64)
+        return _to_float_array(pa.compute.list_element(column, index))
+    # 变长列表：按偏移量直接定位元素，长度不足的行保持 0.0
+    offsets = column.offsets.to_numpy()
+    lengths = np.diff(offsets)
+    valid = lengths > index
+    if column.null_count:
+        valid &= column.is_valid().to_numpy(zero_copy_only=False)
+    result = np.zeros(len(column), dtype=np.float64)
+    if valid.any():
+        result[valid] = _to_float_array(column.values.take(pa.array(offsets[:-1][valid] + index)))
+    return result
+
+
+def batch_to_matrix(batch, feature_plan) -> np.ndarray:
+    """
+        按特征提取计划把一个 RecordBatch 直接转换为 float32 特征矩阵，不经过逐条记录的 Python 字典。
+        定长列表列按下标取出整列元素；缺失的列、类型不符或无法转换的值取 0.0，
+        结果与对每条记录调用 DataProcessor.extract_features 相同。
+
+        batch: pyarrow.RecordBatch。
+        feature_plan: DataProcessor 的特征提取计划。
+        返回: 形状为 (行数, 特征数) 的 float32 矩阵。
+    """
+    pa = _require_pyarrow()
+    matrix = np.zeros((batch.num_rows, len(feature_plan)), dtype=np.float32)
+    names = set(batch.schema.names)
+    for position, (source, index) in enumerate(feature_plan):
+        if source is None or source not in names:
+            continue
+        column = batch.column(source)
+        is_list = (pa.types.is_fixed_size_list(column.type) or pa.types.is_list(column.type)
+                   or pa.types.is_large_list(column.type))
+        if index is None and not is_list:
+            matrix[:, position] = _to_float_array(column)
+        elif index is not None and is_list:
+            matrix[:, position] = _list_element(column, index)
+    return matrix
+
+
+def batch_vehicle_ids(batch) -> List:
+    """按 data_processor.vehicle_id_of 的规则返回每行的车辆ID"""
+    names = batch.schema.names
+    vehicle_ids = batch.column("vehicleId").to_pylist() if "vehicleId" in names else [None] * batch.num_rows
+    if any(vehicle_id is None for vehicle_id in vehicle_ids):
+        senders = batch.column("sender").to_pylist() if "sender" in names else [None] * batch.num_rows
+        vehicle_ids = [vehicle_id if vehicle_id is not None else (sender if sender is not None else "未知车辆")
+                       for vehicle_id, sender in zip(vehicle_ids, senders)]
+    return vehicle_ids
+
+
+def iter_feature_batches(path, feature_plan, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+        按批次读取列式文件并转换为特征矩阵，只读取特征和车辆ID所需的列。
+
+        返回: 逐批产出 (特征矩阵, 车辆ID列表, 已读取行数, 文件总行数) 的迭代器。
+    """
+    columns = {source for source, _ in feature_plan if source is not None} | {"vehicleId", "sender"}
+    rows_read = 0
+    for batch, total_rows in iter_record_batches(path, columns, batch_rows):
+        rows_read += batch.num_rows
+        yield batch_to_matrix(batch, feature_plan), batch_vehicle_ids(batch), rows_read, total_rows
+
+
+def _vector_column(pa, values: List, width: int):
+    """把一批向量字段值转换为 float64 定长列表列；不是列表的值为空值，长度不足的部分补 0.0"""
+    try:
+        # 常见情况：所有值都是长度相同的数值列表，由 NumPy 一次性转换
+        flat = np.asarray(values, dtype=np.float64)
+        if flat.shape == (len(values), width):
+            return pa.FixedSizeListArray.from_arrays(pa.array(flat.ravel()), width)
+    except (ValueError, TypeError):
+        pass
+    flat = np.zeros((len(values), width), dtype=np.float64)
+    mask = np.zeros(len(values), dtype=bool)
+    for row, value in enumerate(values):
+        if isinstance(value, list):
+            flat[row] = _python_floats((value + [0.0] * width)[:width])
+        else:
+            mask[row] = True
+    return pa.FixedSizeListArray.from_arrays(pa.array(flat.ravel()), width,
+                                             mask=pa.array(mask) if mask.any() else None)
+
+
+def _records_to_batch(pa, records: List[Dict], schema=None, widths=None):
+    """把一批记录字典转换为 RecordBatch；给出 schema 时按其列和类型转换"""
+    if schema is None:
+        names = list(dict.fromkeys(key for record in records for key in record))
+    else:
+        names = schema.names
+    arrays = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        if name in widths:
+            arrays.append(_vector_column(pa, values, widths[name]))
+        elif schema is None:
+            try:
+                arrays.append(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(f"字段 {name} 的值类型不一致，无法写成一列: {e}") from e
+        else:
+            try:
+                arrays.append(pa.array(values, type=schema.field(name).type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(f"字段 {name} 的类型与第一批记录不一致: {e}") from e
+    return pa.RecordBatch.from_arrays(arrays, names=names) if schema is None else \
+        pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def convert_records(records: Iterable[Dict], out_path, batch_rows=DEFAULT_BATCH_ROWS) -> int:
+    """
+        把记录流转换为 Parquet、Arrow IPC 或 Feather 文件。
+        pos、spd 等向量字段写成定长 float64 列表列，长度取第一批记录中的最大长度；
+        其余字段的列和类型由第一批记录推断。
+        先写入名称唯一的临时文件再原子替换，转换失败时不留下不完整的文件。
+
+        records: 记录字典的可迭代对象，例如 DataPersistenceManager.iter_json_records 产出的记录。
+        out_path: 输出文件路径，按扩展名选择格式。
+        batch_rows: 每个批次的行数。
+        返回: 写出的记录数。
+    """
+    pa = _require_pyarrow()
+    out_path = Path(out_path)
+    writer = None
+    schema = None
+    widths = None
+    written = 0
+    batch = []
+
+    def flush(f):
+        nonlocal writer, schema, widths, written
+        if widths is None:
+            widths = {}
+            for name in VECTOR_FIELDS:
+                lengths = [len(record[name]) for record in batch if isinstance(record.get(name), list)]
+                if lengths:
+                    widths[name] = max(lengths)
+        record_batch = _records_to_batch(pa, batch, schema, widths)
+        if writer is None:
+            schema = record_batch.schema
+            if out_path.suffix.lower() in PARQUET_SUFFIXES:
+                writer = pa.parquet.ParquetWriter(f, schema)
+            else:
+                writer = pa.ipc.new_file(f, schema)
+        writer.write_batch(record_batch)
+        written += len(batch)
+        batch.clear()
+
+    def write(f):
+        try:
+            for record in records:
+                batch.append(record)
+                if len(batch) >= batch_rows:
+                    flush(f)
+            if batch or writer is None:
+                if not batch:
+                    raise ValueError("没有可转换的记录")
+                flush(f)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    atomic_write(out_path, write)
+    return written
+
+
+def write_table(columns: Dict[str, list], path):
+    """
+        把结果表写入 Parquet、Arrow IPC 或 Feather 文件，用于逐条结果和按车辆汇总结果。
+
+        columns: 列名到等长列表的字典。
+        path: 输出文件路径，按扩展名选择格式。
+    """
+    pa = _require_pyarrow()
+    table = pa.Table.from_pydict(columns)
+    path = Path(path)
+    if path.suffix.lower() in PARQUET_SUFFIXES:
+        pa.parquet.write_table(table, str(path))
+    else:
+        with pa.ipc.new_file(str(path), table.schema) as writer:
+            writer.write_table(table)
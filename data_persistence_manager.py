@@ -1,41 +1,76 @@
+import os
+import codecs
 import random
 import json
 import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Tuple
+from record_store import DEFAULT_PAGE_SIZE, RecordStore, migrate_json_records
+from metrics import metrics
+
+# 流式读取时每次从磁盘读取的字节数
+STREAM_READ_SIZE = 1 << 20
+
+# 单条记录允许的最大字符数；解析失败且未完成的记录超过该长度时视为格式错误，缓冲区不会无限增长
+MAX_RECORD_SIZE = 16 << 20
+
+# 解析错误距缓冲区末尾不超过该字符数时，记录可能只是被截断（如 "tru"、"\u12"），读取更多数据后重试
+TRUNCATION_MARGIN = 8
 
 class DataPersistenceManager:
-    def __init__(self, data_file="saved_records.json"):
+    def __init__(self, data_file="saved_records.db", legacy_file="saved_records.json"):
         """
             初始化数据持久化管理器。
 
-            data_file: 存储数据的文件名，默认为"saved_records.json"。
+            data_file: 存储数据的 SQLite 文件名，默认为"saved_records.db"。
+            legacy_file: 旧版 JSON 数组记录文件名，首次启动时会被一次性迁移到 data_file 中。
         """
         self.data_file = base_path / data_file
+        self.legacy_file = base_path / legacy_file
         self._ensure_file_exists()
 
     def _ensure_file_exists(self):
-        """确保数据文件存在，如果不存在则创建空列表"""
-        if not self.data_file.exists():
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump([], f, indent=4)
-
-    def save_record(self, record: Dict):
-        """保存单条记录到JSON文件"""
-        with open(self.data_file, 'r+', encoding='utf-8') as f:
-            file_data = json.load(f)
-            file_data.append(record)
-            f.seek(0)
-            json.dump(file_data, f, indent=4)
-            f.truncate()
+        """确保记录存储存在，并在首次使用时迁移旧版 JSON 记录文件"""
+        self.store = RecordStore(self.data_file)
+        migrate_json_records(self.legacy_file, self.store)
+
+    @metrics.timed("save_record")
+    def save_record(self, record: Dict) -> int:
+        """
+            追加保存单条记录，不会重写已有记录。
+
+            返回: 新记录的记录键，可用于之后更新其 hazardAttack 标签。
+        """
+        return self.store.append(record)
 
     def get_last_record(self) -> Dict:
-        """从文件中读取最后一条记录"""
-        with open(self.data_file, 'r', encoding='utf-8') as f:
-            records = json.load(f)
-            if records:
-                return records[-1]
-            raise ValueError("没有找到任何保存的记录。")
+        """读取最后一条记录"""
+        record = self.store.get_last()
+        if record is not None:
+            return record
+        raise ValueError("没有找到任何保存的记录。")
+
+    def update_attack_status(self, record_key: int, is_attack: bool) -> bool:
+        """
+            按记录键原地更新记录的 hazardAttack 标签。
+
+            record_key: save_record 返回的记录键。
+            is_attack: 布尔值，指示是否为攻击行为。
+            返回: 是否找到并更新了该记录。
+        """
+        return self.store.set_hazard_attack(record_key, 1 if is_attack else 0)
+
+    def query_records(self, vehicle_id=None, message_id=None, since=None, until=None, hazard_attack=None,
+                      page_size=DEFAULT_PAGE_SIZE) -> Iterator[List[Tuple[int, Dict]]]:
+        """
+            按车辆ID、消息ID、保存时间范围和标签查询已保存的记录，经索引定位，不需要读取全部记录。
+            例如某车辆最近一小时的记录：
+            query_records(vehicle_id="VEH_1234", since=datetime.datetime.now() - datetime.timedelta(hours=1))
+
+            参数含义见 RecordStore.query_page。
+            返回: 逐页产出 (记录键, 记录字典) 列表的迭代器。
+        """
+        return self.store.query(vehicle_id, message_id, since, until, hazard_attack, page_size)
 
     def generate_complete_record(self, input_data: Dict) -> Dict:
         """
@@ -63,10 +98,154 @@ class DataPersistenceManager:
 
         return complete_record
 
+    @metrics.timed("load_json_data")
     def load_json_data(self, filepath) -> List[Dict]:
         """从指定JSON文件加载数据"""
         with open(filepath, 'r', encoding='utf-8') as f:
             records = json.load(f)
         return records
 
-base_path = Path(__file__).parent
\ No newline at end of file
+    @staticmethod
+    def iter_json_records(filepath, read_size=STREAM_READ_SIZE) -> Iterator[Tuple[Dict, int]]:
+        """
+            以流式方式逐条读取记录文件，不会一次性把整个文件载入内存。
+            支持顶层为 JSON 数组的文件，以及每行一条记录的 JSON Lines 文件。
+
+            filepath: 记录文件路径。
+            read_size: 每次从磁盘读取的字节数。
+            返回: 逐条产出 (记录字典, 已读取字节数) 的迭代器。
+        """
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        with open(filepath, 'rb') as f:
+            buffer = ''
+            pos = 0
+            consumed = 0
+            eof = False
+
+            def read_more():
+                """丢弃缓冲区中已解析的部分，并从文件中追加读取下一块数据"""
+                nonlocal buffer, pos, consumed, eof
+                chunk = f.read(read_size)
+                consumed += len(chunk)
+                eof = not chunk
+                buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+                pos = 0
+
+            in_array = None  # None 表示尚未判断文件格式
+            # JSON 数组模式下的位置："first" 为 '[' 之后，"value" 为 ',' 之后，
+            # "separator" 为元素之后，"closed" 为 ']' 之后；与 json.load 一样要求元素之间恰好一个逗号
+            array_state = None
+            while True:
+                while pos < len(buffer) and buffer[pos].isspace():
+                    pos += 1
+                if pos == len(buffer):
+                    if not eof:
+                        read_more()
+                        continue
+                    if in_array and array_state != "closed":
+                        raise json.JSONDecodeError("JSON 数组缺少结尾的 ']'", buffer, pos)
+                    return
+
+                if in_array is None:
+                    in_array = buffer[pos] == '['
+                    if in_array:
+                        pos += 1
+                        array_state = "first"
+                    continue
+                if in_array:
+                    char = buffer[pos]
+                    if array_state == "closed":
+                        raise json.JSONDecodeError("JSON 数组结尾的 ']' 之后存在多余内容", buffer, pos)
+                    if char == ']':
+                        if array_state == "value":
+                            raise json.JSONDecodeError("JSON 数组结尾存在多余的 ','", buffer, pos)
+                        pos += 1
+                        array_state = "closed"
+                        continue
+                    if array_state == "separator":
+                        if char != ',':
+                            raise json.JSONDecodeError("JSON 数组元素之间缺少 ','", buffer, pos)
+                        pos += 1
+                        array_state = "value"
+                        continue
+                    if char == ',':
+                        raise json.JSONDecodeError("JSON 数组中存在多余的 ','", buffer, pos)
+
+                try:
+                    record, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    # 只有错误位于缓冲区末尾（记录被截断）时才读取更多数据重试；
+                    # 否则记录本身格式错误，立即报错，不再把文件的剩余部分读入内存
+                    truncated = len(buffer) - e.pos <= TRUNCATION_MARGIN or e.msg.startswith("Unterminated string")
+                    if eof or not truncated or len(buffer) - pos > MAX_RECORD_SIZE:
+                        offset = consumed - len(buffer[pos:].encode('utf-8'))
+                        raise json.JSONDecodeError(f"文件偏移 {offset} 字节处的记录格式错误: {e.msg}",
+                                                   e.doc, e.pos) from e
+                    read_more()
+                    continue
+                if end == len(buffer) and not eof:
+                    read_more()  # 记录恰好位于缓冲区末尾时可能被截断，读取更多数据后重新解析
+                    continue
+                pos = end
+                if in_array:
+                    array_state = "separator"
+                yield record, consumed
+
+    @staticmethod
+    def is_json_lines(filepath) -> bool:
+        """判断记录文件是否为 JSON Lines 格式（首个非空白字符不是 '['）"""
+        with open(filepath, 'rb') as f:
+            while True:
+                chunk = f.read(4096)
+                if not chunk:
+                    return False
+                stripped = chunk.lstrip(b'\xef\xbb\xbf \t\r\n')
+                if stripped:
+                    return not stripped.startswith(b'[')
+
+    @staticmethod
+    def split_json_lines(filepath, shard_count: int) -> List[Tuple[int, int]]:
+        """
+            将 JSON Lines 文件切分为若干按行对齐的字节范围。
+
+            filepath: JSON Lines 文件路径。
+            shard_count: 期望的分片数。
+            返回: [(起始字节, 结束字节), ...]，每个范围都从某一行的行首开始。
+        """
+        size = os.path.getsize(filepath)
+        boundaries = [0]
+        with open(filepath, 'rb') as f:
+            for i in range(1, shard_count):
+                f.seek(max(size * i // shard_count, boundaries[-1]))
+                f.readline()  # 跳到下一行的行首
+                position = f.tell()
+                if position >= size:
+                    break
+                if position > boundaries[-1]:
+                    boundaries.append(position)
+        boundaries.append(size)
+        return [(begin, end) for begin, end in zip(boundaries, boundaries[1:]) if end > begin]
+
+    @staticmethod
+    def iter_json_lines_range(filepath, begin: int, end: int) -> Iterator[Dict]:
+        """
+            逐条读取 JSON Lines 文件中行首位于 [begin, end) 字节范围内的记录。
+
+            filepath: JSON Lines 文件路径。
+            begin: 起始字节，必须位于行首。
+            end: 结束字节。
+        """
+        with open(filepath, 'rb') as f:
+            f.seek(begin)
+            position = begin
+            while position < end:
+                line = f.readline()
+                if not line:
+                    return
+                position += len(line)
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+base_path = Path(__file__).parent
@@ -1,93 +1,615 @@
-import pandas as pd
-from typing import Dict, List
-from tkinter import messagebox
-from collections import defaultdict
+import os
+import numpy as np
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from data_persistence_manager import DataPersistenceManager
+from metrics import metrics
+from result_cache import FileResultCache, ResultCache, model_key_of
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 批量打分时每个分块包含的记录数
+DEFAULT_CHUNK_SIZE = 8192
+
+# 多进程分析时 JSON 数组文件每个分片包含的记录数
+DEFAULT_SHARD_SIZE = 50000
+
+# 多进程分析时 JSON Lines 文件为每个工作进程切分的最少分片数，以及单个分片的最大字节数
+SHARDS_PER_WORKER = 4
+MAX_SHARD_BYTES = 32 * 1024 * 1024
+
+# 行数不超过该值的批次才查找结果缓存；更大的批次由向量化打分直接完成，逐行计算缓存键反而更慢
+CACHE_BATCH_LIMIT = 256
+
+# 不参与模型特征计算的元数据字段
+EXCLUDE_FIELDS = frozenset({'type', 'rcvTime', 'sendTime', 'sender', 'senderPseudo',
+                            'messageID', 'vehicleId', 'exchangedMessageType', 'EventID',
+                            'EventType', 'RoadID', 'hazardOccurrence', 'savedTimestamp'})
+
+# 需要按下标展开的列表字段前缀 (如 pos_0, spd_1, etc.)
+VECTOR_FIELD_PREFIXES = ('pos_', 'spd_', 'acl_', 'hed_', 'pos_noise_', 'spd_noise_', 'acl_noise_', 'hed_noise_',
+                         'sender_GPS_', 'currentDirection_')
+
+
+def compile_feature_plan(feature_columns: List[str]) -> Tuple[Tuple[Optional[str], Optional[int]], ...]:
+    """
+        将特征列名编译为可复用的提取计划。
+
+        feature_columns: 模型期望的特征列名列表。
+        返回: 与特征列一一对应的 (来源字段, 向量下标) 元组；
+              下标为 None 表示标量字段，来源字段为 None 表示该列恒为 0.0。
+    """
+    plan = []
+    for feature_name in feature_columns:
+        source, index = feature_name, None
+        for prefix in VECTOR_FIELD_PREFIXES:
+            index_str = feature_name[len(prefix):]  # 例如 '0'
+            if feature_name.startswith(prefix) and index_str.isdigit():
+                source, index = prefix.rstrip('_'), int(index_str)  # 例如 ('pos', 0)
+                break
+        if source in EXCLUDE_FIELDS:
+            source = None  # 被排除的字段在原始逻辑中始终取默认值
+        plan.append((source, index))
+    return tuple(plan)
+
+
+# 车辆安全评级阈值：攻击比例达到 10% 为恶意车辆，达到 5% 为嫌疑车辆
+MALICIOUS_RATIO = 0.1
+SUSPICIOUS_RATIO = 0.05
+
+# 车辆安全评级的显示名称
+RATING_LABELS = {"malicious": "恶意车辆", "suspicious": "嫌疑车辆", "normal": "正常车辆"}
+
+
+def vehicle_id_of(record: Dict):
+    """返回记录所属车辆的ID：优先使用 vehicleId，其次使用 sender，两者都缺失或为空值时为“未知车辆”"""
+    vehicle_id = record.get("vehicleId")
+    if vehicle_id is None:
+        vehicle_id = record.get("sender")
+    return "未知车辆" if vehicle_id is None else vehicle_id
+
+
+def rate_attack_ratios(attack_ratios: np.ndarray) -> np.ndarray:
+    """
+        根据攻击比例批量计算车辆安全评级。
+
+        attack_ratios: 攻击比例数组。
+        返回: 由 "malicious"、"suspicious"、"normal" 组成的评级数组。
+    """
+    return np.select([attack_ratios >= MALICIOUS_RATIO, attack_ratios >= SUSPICIOUS_RATIO],
+                     ["malicious", "suspicious"], default="normal")
+
+
+def show_error(message: str):
+    """默认的错误提示方式：弹出错误对话框"""
+    # 延迟导入 tkinter，使无界面的批处理入口不依赖 Tk
+    from tkinter import messagebox
+    messagebox.showerror("错误", message)
+
+
+class ModelState:
+    __slots__ = ("model", "metadata", "feature_plan", "version", "sha256")
 
-class DataProcessor:
     def __init__(self, model, metadata):
+        """
+            一次加载得到的模型、元数据和特征提取计划，创建后不再修改。
+            热更新模型时整体替换该对象，正在分析的分块始终使用同一个对象中的模型和特征列。
+
+            model: 推理引擎或 scikit-learn 模型。
+            metadata: 模型元数据字典。
+        """
         self.model = model
         self.metadata = metadata
+        # 在加载时一次性编译特征提取计划，避免每条记录重复解析列名
+        self.feature_plan = compile_feature_plan(metadata["feature_columns"])
+        self.version = metadata.get("model_version")
+        self.sha256 = metadata.get("model_sha256")
+
 
-    def preprocess_input(self, input_data: Dict) -> pd.DataFrame:
-        exclude_fields = {'type', 'rcvTime', 'sendTime', 'sender', 'senderPseudo',
-                          'messageID', 'vehicleId', 'exchangedMessageType', 'EventID',
-                          'EventType', 'RoadID', 'hazardOccurrence', 'savedTimestamp'}
-
-        # 过滤输入数据，排除不必要的字段
-        filtered_data = {k: v for k, v in input_data.items() if k not in exclude_fields}
-        # 定义一个字典来存储最终处理后的特征
-        processed_features = {}
-
-        # 遍历模型期望的所有特征列，按顺序填充 processed_features
-        # 确保优先使用 filtered_data 中的值
-        for feature_name in self.metadata["feature_columns"]:
-            # 检查是否是需要展开的列表字段 (如 pos_0, spd_1, etc.)
-            is_vector_feature = False
-            for prefix in ['pos_', 'spd_', 'acl_', 'hed_', 'pos_noise_', 'spd_noise_', 'acl_noise_', 'hed_noise_',
-                           'sender_GPS_', 'currentDirection_']:
-                if feature_name.startswith(prefix):
-                    base_name = prefix.rstrip('_')  # 例如 'pos'
-                    index_str = feature_name[len(prefix):]  # 例如 '0'
-                    if index_str.isdigit():
-                        index = int(index_str)
-                        is_vector_feature = True
-                        if base_name in filtered_data and isinstance(filtered_data[base_name], list) and index < len(
-                                filtered_data[base_name]):
-                            try:
-                                processed_features[feature_name] = float(filtered_data[base_name][index])
-                            except (ValueError, TypeError):
-                                processed_features[feature_name] = 0.0  # 转换失败用默认值
-                        else:
-                            processed_features[feature_name] = 0.0  # 基础字段不存在或索引超出范围
-                        break
-
-            if not is_vector_feature:  # 如果不是向量展开的字段
-                if feature_name in filtered_data:
-                    # 对于非列表字段，直接使用 filtered_data 中的值
-                    try:
-                        processed_features[feature_name] = float(filtered_data[feature_name])
-                    except (ValueError, TypeError):
-                        # 如果转换失败，或者不是数字类型，使用默认值
-                        processed_features[feature_name] = 0.0
+class DataProcessor:
+    def __init__(self, model, metadata, result_cache: Optional[ResultCache] = None):
+        """
+            初始化数据处理器。
+
+            model: 推理引擎或 scikit-learn 模型。
+            metadata: 模型元数据字典。
+            result_cache: 按特征行缓存打分结果的 LRU 缓存，默认创建一个新的缓存。
+        """
+        self.state = ModelState(model, metadata)
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+
+    @property
+    def model(self):
+        return self.state.model
+
+    @property
+    def metadata(self) -> Dict:
+        return self.state.metadata
+
+    @property
+    def feature_plan(self):
+        return self.state.feature_plan
+
+    def swap_model(self, model, metadata):
+        """
+            原子地替换当前使用的模型，不会中断正在进行的分析：
+            已开始的分块继续使用旧模型完成，之后的分块使用新模型。
+
+            model: 新的推理引擎或 scikit-learn 模型。
+            metadata: 新模型的元数据字典。
+        """
+        self.state = ModelState(model, metadata)
+        # 缓存键包含模型键，旧模型的条目不会再被命中，清空只是为了尽快释放空间
+        self.result_cache.clear()
+
+    def extract_features(self, input_data: Dict, feature_plan=None) -> List[float]:
+        """
+            按编译好的提取计划从单条记录中提取特征值。
+            字段缺失、下标越界或无法转换为数字时使用默认值 0.0。
+
+            input_data: 原始记录字典。
+            feature_plan: 使用的特征提取计划，默认为当前模型的计划。
+            返回: 与特征列一一对应的浮点数列表。
+        """
+        get = input_data.get
+        processed_features = []
+        append = processed_features.append
+        for source, index in feature_plan or self.state.feature_plan:
+            value = get(source) if source is not None else None
+            try:
+                if index is None:
+                    append(float(value))
+                elif isinstance(value, list) and index < len(value):
+                    append(float(value[index]))
                 else:
-                    # 如果 filtered_data 中没有这个字段，使用默认值 0.0
-                    processed_features[feature_name] = 0.0
+                    append(0.0)  # 基础字段不存在或索引超出范围
+            except (ValueError, TypeError):
+                append(0.0)  # 转换失败用默认值
+        return processed_features
 
+    @metrics.timed("preprocess_input")
+    def preprocess_input(self, input_data: Dict) -> "pd.DataFrame":
+        import pandas as pd  # pandas 仅用于构造单行 DataFrame，延迟导入以加快启动
         # 将处理后的特征转换为 DataFrame
         # 确保DataFrame的列顺序与模型训练时的特征列顺序一致
-        df = pd.DataFrame([processed_features], columns=self.metadata["feature_columns"])
+        state = self.state
+        return pd.DataFrame([self.extract_features(input_data, state.feature_plan)],
+                            columns=state.metadata["feature_columns"])
+
+    @metrics.timed("feature_extraction")
+    def records_to_matrix(self, records: List[Dict], on_error=None, state: Optional[ModelState] = None):
+        """
+            将一批记录转换为单个 float32 特征矩阵，列顺序与 metadata["feature_columns"] 一致。
+
+            records: 记录字典列表。
+            on_error: 单条记录提取失败时的回调，参数为 (记录在批内的下标, 异常)。
+            state: 使用的模型状态，默认为当前模型。
+            返回: (特征矩阵, 成功提取的记录在批内的下标数组)。
+        """
+        state = state or self.state
+        matrix = np.zeros((len(records), len(state.metadata["feature_columns"])), dtype=np.float32)
+        kept = []
+        for row, record in enumerate(records):
+            try:
+                matrix[len(kept)] = self.extract_features(record, state.feature_plan)
+                kept.append(row)
+            except Exception as e:
+                if on_error:
+                    on_error(row, e)
+        return matrix[:len(kept)], np.asarray(kept, dtype=np.intp)
+
+    @metrics.timed("model_predict")
+    def score_matrix(self, matrix: np.ndarray, state: Optional[ModelState] = None):
+        """
+            对特征矩阵进行一次性打分。
+            只调用一次 predict_proba，预测类别由概率最大的一列得到，不再单独调用 predict。
+
+            matrix: 形状为 (记录数, 特征数) 的特征矩阵。
+            state: 使用的模型状态，默认为当前模型；必须与生成 matrix 时使用的状态一致。
+            返回: (预测类别数组, 攻击概率数组)。
+        """
+        model = (state or self.state).model
+        proba = model.predict_proba(matrix)
+        predictions = model.classes_[np.argmax(proba, axis=1)]
+        if metrics.enabled:
+            metrics.count("records_scored", len(matrix))
+        return predictions, proba[:, 1]
+
+    def score_records(self, records: List[Dict], on_error=None):
+        """
+            对一批记录进行特征提取和打分，整批使用同一个模型状态，不受期间模型热更新的影响。
+
+            records: 记录字典列表。
+            on_error: 单条记录提取失败时的回调，参数为 (记录在批内的下标, 异常)。
+            返回: (预测类别数组, 攻击概率数组, 成功打分的记录在批内的下标数组, 使用的模型状态)。
+        """
+        state = self.state
+        matrix, kept = self.records_to_matrix(records, on_error, state)
+        model_key = model_key_of(state)
+        if model_key is not None and 0 < len(matrix) <= CACHE_BATCH_LIMIT:
+            predictions, attack_probs = self.score_matrix_cached(matrix, model_key, state)
+        else:
+            predictions, attack_probs = self.score_matrix(matrix, state)
+        return predictions, attack_probs, kept, state
+
+    def score_matrix_cached(self, matrix: np.ndarray, model_key: str, state: Optional[ModelState] = None):
+        """
+            与 score_matrix 相同，但先按特征行查找结果缓存，只对未命中的行调用一次模型。
+
+            matrix: 形状为 (记录数, 特征数) 的特征矩阵。
+            model_key: 模型的缓存键，见 result_cache.model_key_of。
+            state: 使用的模型状态，默认为当前模型。
+            返回: (预测类别数组, 攻击概率数组)。
+        """
+        keys = self.result_cache.row_keys(matrix, model_key)
+        cached = self.result_cache.get_many(keys)
+        missing = [row for row, value in enumerate(cached) if value is None]
+        if missing:
+            predictions, attack_probs = self.score_matrix(matrix[missing], state)
+            scored = list(zip(predictions.tolist(), attack_probs.tolist()))
+            self.result_cache.put_many([keys[row] for row in missing], scored)
+            for row, value in zip(missing, scored):
+                cached[row] = value
+        predictions, attack_probs = zip(*cached)
+        return np.asarray(predictions), np.asarray(attack_probs, dtype=np.float64)
+
+    def _score_chunk(self, chunk: List[Dict], start: int, on_error=None):
+        """
+            对一个记录分块进行特征提取和打分。
+
+            chunk: 记录字典列表。
+            start: 分块第一条记录在整个输入中的下标（从0开始），用于错误提示。
+            on_error: 错误提示回调，参数为错误信息字符串；默认弹出错误对话框。
+            返回: (预测类别数组, 攻击概率数组, 按记录顺序排列的车辆ID列表, (模型版本, 模型摘要))；
+                  打分失败时返回 None。
+        """
+        on_error = on_error or show_error
+        try:
+            predictions, attack_probs, kept, state = self.score_records(
+                chunk,
+                lambda row, e: on_error(f'处理记录 {start + row + 1} 时发生错误: {e}')
+            )
+        except Exception as e:
+            on_error(f'处理记录 {start + 1}-{start + len(chunk)} 时发生错误: {e}')
+            return None
+
+        vehicle_ids = [vehicle_id_of(chunk[row]) for row in kept.tolist()]
+        return predictions, attack_probs, vehicle_ids, (state.version, state.sha256)
+
+    @staticmethod
+    def _collect_scores(scores, results: List[Dict], vehicle_attack_counts):
+        """
+            把 _score_chunk 的输出追加到 results，并累加 vehicle_attack_counts。
+        """
+        if scores is None:
+            return
+        predictions, attack_probs, vehicle_ids, (model_version, model_sha256) = scores
+        for prediction, attack_prob, vehicle_id in zip(predictions.tolist(), attack_probs.tolist(), vehicle_ids):
+            results.append({
+                "prediction": int(prediction),
+                "attack_prob": float(attack_prob),
+                "is_attack": bool(prediction),
+                "vehicle_id": vehicle_id,
+                "model_version": model_version,
+                "model_sha256": model_sha256
+            })
+
+            if prediction == 1:
+                vehicle_attack_counts[vehicle_id] += 1
 
-        # 确保DataFrame的列与模型的特征列完全一致，并且顺序正确
-        df = df.reindex(columns=self.metadata["feature_columns"], fill_value=0.0)
+    def _analyze_chunk(self, chunk: List[Dict], start: int, results: List[Dict], vehicle_attack_counts,
+                       on_error=None):
+        """
+            对一个记录分块进行特征提取和打分，并把结果追加到 results 和 vehicle_attack_counts。
 
-        return df
+            chunk: 记录字典列表。
+            start: 分块第一条记录在整个输入中的下标（从0开始），用于错误提示。
+            results: 结果列表，原地追加。
+            vehicle_attack_counts: 车辆攻击次数统计字典，原地累加。
+            on_error: 错误提示回调，参数为错误信息字符串；默认弹出错误对话框。
+        """
+        self._collect_scores(self._score_chunk(chunk, start, on_error), results, vehicle_attack_counts)
 
-    def analyze_file_data(self, records: List[Dict], progress_callback=None):
+    @metrics.timed("analyze_file_data")
+    def analyze_file_data(self, records: List[Dict], progress_callback=None, chunk_size=DEFAULT_CHUNK_SIZE):
         results = []
         vehicle_attack_counts = defaultdict(int)
-        for idx, record in enumerate(records, 1):
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            self._analyze_chunk(chunk, start, results, vehicle_attack_counts)
+            if progress_callback:
+                progress_callback(start + len(chunk))
+        return results, vehicle_attack_counts
+
+    @metrics.timed("analyze_record_stream")
+    def analyze_record_stream(self, record_stream: Iterable[Tuple[Dict, int]], progress_callback=None,
+                              chunk_size=DEFAULT_CHUNK_SIZE, cancel_event=None, on_error=None):
+        """
+            以分块方式分析记录流，内存占用只与分块大小有关，与文件大小无关。
+
+            record_stream: 产出 (记录字典, 已读取字节数) 的可迭代对象，
+                           例如 DataPersistenceManager.iter_json_records 的返回值。
+            progress_callback: 每处理完一个分块后以已读取字节数调用。
+            chunk_size: 每个分块包含的记录数。
+            cancel_event: 可选的 threading.Event，被设置后在当前分块结束时停止分析。
+            on_error: 错误提示回调，参数为错误信息字符串；默认弹出错误对话框。
+            返回: 与 analyze_file_data 相同的 (results, vehicle_attack_counts)；被取消时只包含已完成分块的结果。
+        """
+        results = []
+        vehicle_attack_counts = defaultdict(int)
+        chunk = []
+        start = 0
+        consumed = 0
+        for record, consumed in record_stream:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                self._analyze_chunk(chunk, start, results, vehicle_attack_counts, on_error)
+                start += len(chunk)
+                chunk = []
+                if progress_callback:
+                    progress_callback(consumed)
+                if cancel_event is not None and cancel_event.is_set():
+                    return results, vehicle_attack_counts
+        if chunk:
+            self._analyze_chunk(chunk, start, results, vehicle_attack_counts, on_error)
+        if progress_callback:
+            progress_callback(consumed)
+        return results, vehicle_attack_counts
+
+    def analyze_columnar_file(self, filepath, progress_callback=None, cancel_event=None, on_error=None,
+                              batch_rows=DEFAULT_CHUNK_SIZE):
+        """
+            分析 Parquet、Arrow IPC 或 Feather 格式的记录文件（需要 pyarrow）。
+            只读取特征列，向量字段的定长列表列按下标整列取出后直接填入特征矩阵，不构造逐条记录的字典。
+
+            filepath: 列式记录文件路径。
+            progress_callback: 每处理完一个批次后以按行数折算的已处理字节数调用，
+                               与 analyze_record_stream 的进度单位一致。
+            cancel_event: 可选的 threading.Event，被设置后在当前批次结束时停止分析。
+            on_error: 错误提示回调，参数为错误信息字符串；默认弹出错误对话框。
+            batch_rows: 每个批次的行数。
+            返回: 与 analyze_file_data 相同的 (results, vehicle_attack_counts)。
+        """
+        from columnar_io import iter_feature_batches
+        on_error = on_error or show_error
+        results = []
+        vehicle_attack_counts = defaultdict(int)
+        file_size = os.path.getsize(filepath)
+        # 读取哪些列由开始分析时的特征提取计划决定；热更新的新模型特征列相同时，之后的批次使用新模型
+        state = self.state
+        start = 0
+        for matrix, vehicle_ids, rows_read, total_rows in iter_feature_batches(filepath, state.feature_plan,
+                                                                                batch_rows):
+            current = self.state
+            if current.metadata["feature_columns"] == state.metadata["feature_columns"]:
+                state = current
             try:
-                processed_data = self.preprocess_input(record)
-                prediction = self.model.predict(processed_data.values)
-                proba = self.model.predict_proba(processed_data.values)
+                predictions, attack_probs = self.score_matrix(matrix, state)
+            except Exception as e:
+                on_error(f'处理记录 {start + 1}-{rows_read} 时发生错误: {e}')
+            else:
+                self._collect_scores((predictions, attack_probs, vehicle_ids, (state.version, state.sha256)),
+                                     results, vehicle_attack_counts)
+            start = rows_read
+            if progress_callback:
+                progress_callback(file_size * rows_read // max(total_rows, 1))
+            if cancel_event is not None and cancel_event.is_set():
+                break
+        return results, vehicle_attack_counts
+
+    def score_binary_file(self, filepath, progress_callback=None, cancel_event=None):
+        """
+            对 binary_records.export_records 生成的二进制记录文件重新打分，不再解析 JSON，
+            结果以数组形式返回，不为每条记录构造字典。文件只打开和映射一次。
+
+            filepath: 二进制记录文件路径。
+            progress_callback: 每打分完一个切片后以按记录数折算的字节数调用，与 analyze_record_stream 的进度单位一致。
+            cancel_event: 可选的 threading.Event，被设置后在当前切片结束时停止分析。
+            返回: (预测类别数组, 攻击概率数组, 车辆编号数组, 车辆ID表, 模型状态)，见 binary_records.score_file。
+        """
+        from binary_records import BinaryRecordFile, score_file
+        binary_file = BinaryRecordFile(filepath)
+        file_size = os.path.getsize(filepath)
+        count = max(len(binary_file), 1)
+        return score_file(
+            self, binary_file,
+            progress_callback=progress_callback and (lambda scored: progress_callback(file_size * scored // count)),
+            cancel_event=cancel_event
+        )
+
+    def analyze_binary_file(self, filepath, progress_callback=None, cancel_event=None):
+        """
+            对二进制记录文件重新打分，并整理为与其他文件格式相同的逐条结果，供界面显示和结果缓存使用。
+            参数同 score_binary_file。
+
+            返回: 与 analyze_file_data 相同的 (results, vehicle_attack_counts)。
+        """
+        predictions, attack_probs, vehicles, vehicle_table, state = self.score_binary_file(
+            filepath, progress_callback, cancel_event)
+        results = []
+        vehicle_attack_counts = defaultdict(int)
+        vehicle_ids = [vehicle_table[code] for code in vehicles.tolist()]
+        self._collect_scores((predictions, attack_probs, vehicle_ids, (state.version, state.sha256)),
+                             results, vehicle_attack_counts)
+        return results, vehicle_attack_counts
+
+    def analyze_file_parallel(self, filepath, workers=None, progress_callback=None,
+                              cancel_event=None, on_error=None, shard_size=DEFAULT_SHARD_SIZE):
+        """
+            使用多进程并行分析大型记录文件。
+            文件被切分为多个分片，在 ProcessPoolExecutor 中分别完成特征提取和打分；
+            开始分析时取当前模型的快照，在工作进程启动时传给每个进程一次，任务中不传递模型；
+            因此多进程分析与单进程分析使用同一个模型（包括热更新和增量学习得到的模型），结果的模型版本标记一致。
+            分片结果按提交顺序合并，因此预测结果和车辆攻击统计（包括字典顺序）与单进程分析一致。
+
+            JSON Lines 文件按行对齐的字节范围切分，由工作进程自行读取和解析；
+            JSON 数组文件由主进程流式解析后按 shard_size 条记录一组分发。
+
+            filepath: 记录文件路径。
+            workers: 工作进程数，默认使用全部 CPU 核心。
+            progress_callback: 每合并完一个分片后以已处理字节数调用。
+            cancel_event: 可选的 threading.Event，被设置后停止提交和合并剩余分片。
+            on_error: 错误提示回调，参数为错误信息字符串；默认弹出错误对话框。
+            shard_size: JSON 数组文件每个分片包含的记录数。
+            返回: 与 analyze_file_data 相同的 (results, vehicle_attack_counts)。
+        """
+        on_error = on_error or show_error
+        workers = workers or os.cpu_count() or 1
+        results = []
+        vehicle_attack_counts = defaultdict(int)
 
-                results.append({
-                    "prediction": int(prediction[0]),
-                    "attack_prob": float(proba[0][1]),
-                    "is_attack": bool(prediction[0])
-                })
+        if DataPersistenceManager.is_json_lines(filepath):
+            shard_count = max(workers * SHARDS_PER_WORKER, -(-os.path.getsize(filepath) // MAX_SHARD_BYTES))
+            shard_ranges = DataPersistenceManager.split_json_lines(filepath, shard_count)
+            tasks = ((_analyze_line_range_shard, (str(filepath), begin, end), end) for begin, end in shard_ranges)
+        else:
+            tasks = self._record_shard_tasks(DataPersistenceManager.iter_json_records(filepath), shard_size)
 
-                if prediction[0] == 1:
-                    vehicle_id = record.get("vehicleId", "未知车辆")
-                    vehicle_attack_counts[vehicle_id] += 1
+        state = self.state
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+                                 initargs=(state.model, state.metadata)) as executor:
+            pending = deque()
 
+            def collect_oldest():
+                """按提交顺序合并最早的分片结果，保证合并结果与分片完成顺序无关"""
+                future, progress = pending.popleft()
+                scores, errors = future.result()
+                for message in errors:
+                    on_error(message)
+                self._collect_scores(scores, results, vehicle_attack_counts)
                 if progress_callback:
-                    progress_callback(idx)
-            except Exception as e:
-                messagebox.showerror("错误",f'处理记录 {idx} 时发生错误: {e}')
-                continue
+                    progress_callback(progress)
+
+            for func, args, progress in tasks:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                pending.append((executor.submit(func, *args), progress))
+                # 限制在途分片数量，保证主进程内存占用有界
+                if len(pending) >= workers * 2:
+                    collect_oldest()
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    executor.shutdown(cancel_futures=True)
+                    break
+                collect_oldest()
         return results, vehicle_attack_counts
 
+    def analyze_file_cached(self, filepath, file_cache: FileResultCache, analyze, on_error=None, cancel_event=None):
+        """
+            先按文件内容摘要查找磁盘结果缓存，命中时直接还原结果，不再解析和打分；
+            未命中时调用 analyze 完成分析，分析完整结束且全程使用同一个模型时写入缓存。
+
+            filepath: 记录文件路径。
+            file_cache: 磁盘结果缓存。
+            analyze: 以错误提示回调为参数、返回 (results, vehicle_attack_counts) 的函数，
+                     例如包装 analyze_record_stream 或 analyze_file_parallel 的 lambda。
+            on_error: 错误提示回调，参数为错误信息字符串；命中缓存时重放原分析产生的错误信息。
+            cancel_event: 可选的 threading.Event，分析被取消时不写入缓存。
+            返回: (results, vehicle_attack_counts, 是否命中缓存)。
+        """
+        on_error = on_error or show_error
+        state = self.state
+        model_key = model_key_of(state)
+        if model_key is None:
+            return (*analyze(on_error), False)
+
+        file_digest = file_cache.file_digest(filepath)
+        entry = file_cache.load(file_digest, model_key)
+        if entry is not None:
+            predictions, attack_probs, vehicle_ids, errors = entry
+            for message in errors:
+                on_error(message)
+            results = []
+            vehicle_attack_counts = defaultdict(int)
+            self._collect_scores((predictions, attack_probs, vehicle_ids, (state.version, state.sha256)),
+                                 results, vehicle_attack_counts)
+            return results, vehicle_attack_counts, True
+
+        errors = []
+
+        def record_error(message):
+            errors.append(message)
+            on_error(message)
+
+        results, vehicle_attack_counts = analyze(record_error)
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        # 分析期间模型被热更新时结果混合了多个模型，不写入缓存
+        if not cancelled and all(r["model_sha256"] == state.sha256 and r["model_version"] == state.version
+                                 for r in results):
+            try:
+                file_cache.store(file_digest, model_key, results, errors)
+            except (OSError, TypeError, ValueError):
+                pass  # 缓存写入失败（包括车辆ID无法序列化）不影响本次分析结果
+        return results, vehicle_attack_counts, False
+
+    @staticmethod
+    def _record_shard_tasks(record_stream: Iterable[Tuple[Dict, int]], shard_size: int):
+        """将记录流按 shard_size 条一组切分为分片任务 (函数, 参数, 进度)"""
+        shard = []
+        start = 0
+        consumed = 0
+        for record, consumed in record_stream:
+            shard.append(record)
+            if len(shard) >= shard_size:
+                yield _analyze_record_shard, (shard, start), consumed
+                start += len(shard)
+                shard = []
+        if shard:
+            yield _analyze_record_shard, (shard, start), consumed
+
+    @staticmethod
+    def aggregate_by_vehicle(results: List[Dict]) -> "pd.DataFrame":
+        """
+            按车辆对分析结果进行向量化分组统计。
+
+            results: analyze_file_data 等方法返回的结果列表，每条结果包含 vehicle_id 和 prediction。
+            返回: 每辆车一行的 DataFrame，包含 vehicle_id、total（消息总数）、attacks（攻击次数）、
+                  attack_ratio（攻击比例）和 rating（安全评级），按攻击比例和攻击次数从高到低排序。
+        """
+        import pandas as pd
+        return pd.DataFrame(DataProcessor.summarize_by_vehicle(results))
+
+    @staticmethod
+    def summarize_by_vehicle(results: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+            aggregate_by_vehicle 的统计过程，不依赖 pandas，供无需 DataFrame 的命令行输出使用。
+
+            返回: 列名到数组的字典（vehicle_id、total、attacks、attack_ratio、rating），行顺序与 aggregate_by_vehicle 相同。
+        """
+        vehicle_codes = {}
+        codes = np.fromiter((vehicle_codes.setdefault(r["vehicle_id"], len(vehicle_codes)) for r in results),
+                            dtype=np.intp, count=len(results))
+        is_attack = np.fromiter((r["prediction"] == 1 for r in results), dtype=bool, count=len(results))
+        return DataProcessor.summarize_vehicle_codes(codes, is_attack, list(vehicle_codes))
+
+    @staticmethod
+    def summarize_vehicle_codes(codes: np.ndarray, is_attack: np.ndarray, vehicle_table: List) -> Dict[str, np.ndarray]:
+        """
+            按车辆编号统计攻击比例，例如二进制记录文件中的车辆编号列。
+
+            codes: 每条结果的车辆编号，编号按车辆首次出现的顺序分配。
+            is_attack: 每条结果是否被判定为攻击。
+            vehicle_table: 编号到车辆ID的列表；没有结果的车辆不出现在汇总中。
+            返回: 与 summarize_by_vehicle 相同的列字典。
+        """
+        vehicle_ids = np.empty(len(vehicle_table), dtype=object)
+        vehicle_ids[:] = vehicle_table
+        totals = np.bincount(codes, minlength=len(vehicle_ids))
+        attacks = np.bincount(codes, weights=is_attack, minlength=len(vehicle_ids)).astype(np.int64)
+        attack_ratios = attacks / np.maximum(totals, 1)
+        # 按攻击比例、攻击次数从高到低排序，相同时保持车辆首次出现的顺序（lexsort 是稳定排序）
+        order = np.lexsort((-attacks, -attack_ratios))
+        order = order[totals[order] > 0]
+        return {
+            "vehicle_id": vehicle_ids[order],
+            "total": totals[order],
+            "attacks": attacks[order],
+            "attack_ratio": attack_ratios[order],
+            "rating": rate_attack_ratios(attack_ratios)[order],
+        }
+
     def analyze_manual_data(self, input_data: Dict):
         # analyze_file_data 已经可以处理单个记录的列表，不需要额外的逻辑
         # 传入一个包含单个字典的列表
@@ -95,4 +617,28 @@ class DataProcessor:
         if results:
             return results[0]
         else:
-            raise Exception("手动数据分析未能产生结果。")
\ No newline at end of file
+            raise Exception("手动数据分析未能产生结果。")
+
+
+# 工作进程内缓存的数据处理器，由 _init_shard_worker 在进程启动时创建，每个进程只接收一次模型
+_shard_processor = None
+
+
+def _init_shard_worker(model, metadata):
+    """进程池初始化函数：用主进程传来的模型快照在工作进程中创建数据处理器"""
+    global _shard_processor
+    _shard_processor = DataProcessor(model, metadata)
+
+
+def _analyze_record_shard(records: List[Dict], start: int):
+    """在工作进程中对一组记录进行特征提取和打分，返回 (打分结果, 错误信息列表)"""
+    errors = []
+    return _shard_processor._score_chunk(records, start, errors.append), errors
+
+
+def _analyze_line_range_shard(filepath: str, begin: int, end: int):
+    """在工作进程中读取并分析 JSON Lines 文件中 [begin, end) 字节范围内的记录"""
+    errors = []
+    records = list(DataPersistenceManager.iter_json_lines_range(filepath, begin, end))
+    return _shard_processor._score_chunk(records, 0, errors.append), [
+        f'文件字节范围 {begin}-{end}: {message}' for message in errors]
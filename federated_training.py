@@ -0,0 +1,428 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from data_processor import DataProcessor, vehicle_id_of
+from model_handler import LinearModelEngine, ModelHandler
+from update_codecs import CODECS, make_codec
+from robust_aggregation import ROBUST_AGGREGATORS
+
+base_path = Path(__file__).parent
+
+# 与 saved_models/model_metadata.pkl 一致的特征列顺序
+SCALAR_FEATURES = ('laneIndex', 'lanePosition', 'maxSpeed', 'maxDeceleration', 'hazardOccurrencePercentage')
+VECTOR_FEATURES = ('pos', 'pos_noise', 'spd', 'spd_noise', 'acl', 'acl_noise', 'hed', 'hed_noise',
+                   'sender_GPS', 'currentDirection')
+DEFAULT_FEATURE_COLUMNS = list(SCALAR_FEATURES) + [f"{field}_{index}" for field in VECTOR_FEATURES
+                                                   for index in range(3)]
+
+# 客户端数据的划分方式：按车辆、按道路或随机均分
+PARTITIONS = ("vehicleId", "RoadID", "random")
+
+DEFAULT_CLIENTS = 8
+DEFAULT_ROUNDS = 10
+DEFAULT_LOCAL_EPOCHS = 2
+DEFAULT_LEARNING_RATE = 0.1
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_L2 = 1e-4
+# 留出用于评估全局模型的记录比例
+DEFAULT_HOLDOUT_RATIO = 0.2
+
+
+def label_of(record: Dict) -> Optional[int]:
+    """
+        读取记录的攻击标签：优先使用 hazardAttack，其次根据 EventType 判断（"Normal" 为正常）。
+
+        返回: 1 表示攻击，0 表示正常；没有标签时返回 None。
+    """
+    label = record.get("hazardAttack")
+    if label is not None:
+        return 1 if label else 0
+    event_type = record.get("EventType")
+    if event_type is not None:
+        return 0 if event_type == "Normal" else 1
+    return None
+
+
+def partition_key_of(record: Dict, partition: str):
+    """按划分方式取出记录所属的分组键"""
+    if partition == "vehicleId":
+        return vehicle_id_of(record)
+    return record.get(partition, "Unknown")
+
+
+def partition_indices(keys: Optional[List], count: int, num_clients: int, seed=0) -> List[np.ndarray]:
+    """
+        把记录划分给各个客户端。同一分组键（车辆或道路）的记录总是属于同一个客户端，
+        分组按随机顺序轮流分配；keys 为 None 时随机均分。
+
+        keys: 每条记录的分组键列表，或 None。
+        count: 记录数。
+        num_clients: 客户端数。
+        seed: 随机种子。
+        返回: 每个客户端的记录下标数组。
+    """
+    rng = np.random.default_rng(seed)
+    if keys is None:
+        return [np.sort(part) for part in np.array_split(rng.permutation(count), num_clients)]
+    import pandas as pd
+    codes, uniques = pd.factorize(pd.Series(keys, dtype=object))
+    client_of_group = np.empty(len(uniques), dtype=np.intp)
+    client_of_group[rng.permutation(len(uniques))] = np.arange(len(uniques)) % num_clients
+    client_of_record = client_of_group[codes]
+    order = np.argsort(client_of_record, kind="stable")
+    bounds = np.searchsorted(client_of_record[order], np.arange(num_clients + 1))
+    return [order[bounds[client]:bounds[client + 1]] for client in range(num_clients)]
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+
+def evaluate(weights: np.ndarray, X: np.ndarray, y: np.ndarray):
+    """
+        计算逻辑回归参数在给定数据上的对数损失和准确率。
+
+        weights: 参数向量，最后一个元素为截距。
+        返回: (对数损失, 准确率)。
+    """
+    if not len(y):
+        return float("nan"), float("nan")
+    prob = np.clip(sigmoid(X @ weights[:-1] + weights[-1]), 1e-12, 1.0 - 1e-12)
+    loss = -np.mean(y * np.log(prob) + (1 - y) * np.log(1.0 - prob))
+    return float(loss), float(np.mean((prob >= 0.5) == y))
+
+
+def local_sgd(weights: np.ndarray, X: np.ndarray, y: np.ndarray, epochs=DEFAULT_LOCAL_EPOCHS,
+              learning_rate=DEFAULT_LEARNING_RATE, batch_size=DEFAULT_BATCH_SIZE, l2=DEFAULT_L2,
+              seed=0) -> np.ndarray:
+    """
+        在客户端本地数据上用小批量 SGD 训练逻辑回归。
+
+        weights: 初始参数向量（全局模型），最后一个元素为截距；不会被修改。
+        X: 标准化后的特征矩阵。
+        y: 0/1 标签数组。
+        返回: 训练后的参数向量。
+    """
+    weights = weights.astype(np.float64)
+    coef = weights[:-1]
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        for begin in range(0, len(order), batch_size):
+            batch = order[begin:begin + batch_size]
+            X_batch = X[batch]
+            error = sigmoid(X_batch @ coef + weights[-1]) - y[batch]
+            coef -= learning_rate * (X_batch.T @ error / len(batch) + l2 * coef)
+            weights[-1] -= learning_rate * float(error.mean())
+    return weights
+
+
+class FedAvgAggregator:
+    """联邦平均：按客户端样本数对参数更新加权平均"""
+
+    def aggregate(self, updates: np.ndarray, sample_counts: np.ndarray) -> np.ndarray:
+        """
+            聚合一轮的客户端更新。
+
+            updates: 形状为 (客户端数, 参数数) 的参数更新（本地参数减去全局参数）。
+            sample_counts: 每个客户端的训练样本数。
+            返回: 聚合后的参数更新。
+        """
+        weights = np.asarray(sample_counts, dtype=np.float64)
+        total = weights.sum()
+        if not total > 0:
+            raise ValueError("客户端训练样本总数为 0，无法按样本数加权平均")
+        return weights @ updates / total
+
+
+AGGREGATORS = {"fedavg": FedAvgAggregator, **ROBUST_AGGREGATORS}
+
+
+def make_aggregator(name: str, num_clients=DEFAULT_CLIENTS, trim_ratio=0.1, num_malicious=0, clip_norm=None):
+    """
+        按名称创建聚合器。
+
+        name: "fedavg"，或 robust_aggregation 中的 "median"、"trimmed_mean"、"krum"、"multi_krum"、"norm_clip"。
+        num_clients: 客户端数，multi_krum 默认选出 num_clients - num_malicious 个更新。
+        trim_ratio: trimmed_mean 每一侧去掉的比例。
+        num_malicious: krum/multi_krum 假定的恶意客户端数。
+        clip_norm: norm_clip 的裁剪阈值，None 表示取每轮更新范数的中位数。
+    """
+    if name == "trimmed_mean":
+        return AGGREGATORS[name](trim_ratio)
+    if name == "krum":
+        return AGGREGATORS[name](num_malicious)
+    if name == "multi_krum":
+        return AGGREGATORS[name](num_malicious, num_clients=num_clients)
+    if name == "norm_clip":
+        return AGGREGATORS[name](clip_norm)
+    try:
+        return AGGREGATORS[name]()
+    except KeyError:
+        raise ValueError(f"不支持的聚合方式: {name}（支持 {', '.join(AGGREGATORS)}）")
+
+
+# 工作进程内缓存的客户端数据，由 _init_client_worker 在进程启动时设置，每轮只传递全局参数
+_client_data = None
+
+
+def _init_client_worker(client_data):
+    """进程池初始化函数：在工作进程中保存所有客户端的 (特征矩阵, 标签) 数据"""
+    global _client_data
+    _client_data = client_data
+
+
+def _train_client(client_id: int, global_weights: np.ndarray, options: Dict, seed: int, codec):
+    """
+        在工作进程中训练一个客户端，并用该客户端的编码器把本地参数编码为上传的字节串。
+
+        返回: (客户端编号, 编码后的本地参数, 训练样本数, 训练耗时秒数, 编码耗时秒数, 更新了状态的编码器)。
+    """
+    started = time.perf_counter()
+    X, y = _client_data[client_id]
+    local_weights = local_sgd(global_weights, X, y, seed=seed, **options)
+    trained = time.perf_counter()
+    payload = codec.encode(local_weights, global_weights)
+    return client_id, payload, len(y), trained - started, time.perf_counter() - trained, codec
+
+
+class FederatedTrainer:
+    def __init__(self, records: List[Dict], feature_columns=None, num_clients=DEFAULT_CLIENTS,
+                 partition="vehicleId", local_epochs=DEFAULT_LOCAL_EPOCHS, learning_rate=DEFAULT_LEARNING_RATE,
+                 batch_size=DEFAULT_BATCH_SIZE, l2=DEFAULT_L2, workers=None, holdout_ratio=DEFAULT_HOLDOUT_RATIO,
+                 aggregator=None, codec="float64", codec_options=None, initial_engine=None, seed=0):
+        """
+            单机联邦训练：把带标签的记录划分给多个模拟客户端，各客户端在工作进程中本地训练逻辑回归，
+            由进程内的聚合器按 FedAvg 合并参数更新，得到全局模型。
+
+            records: 记录字典列表，没有标签的记录会被忽略（见 label_of）。
+            feature_columns: 特征列，默认与现有模型一致。
+            num_clients: 模拟客户端数。
+            partition: 客户端数据划分方式，"vehicleId"、"RoadID" 或 "random"。
+            local_epochs: 每轮客户端本地训练的轮数。
+            learning_rate: 本地 SGD 学习率。
+            batch_size: 本地 SGD 批大小。
+            l2: L2 正则化系数。
+            workers: 工作进程数，默认为客户端数和 CPU 核心数中的较小值。
+            holdout_ratio: 留出用于评估全局模型的记录比例。
+            aggregator: 提供 aggregate(updates, sample_counts) 的聚合器，默认为 FedAvgAggregator。
+            codec: 客户端上传本地参数使用的编码方式（见 update_codecs.CODECS）。
+            codec_options: 传给编码器构造函数的参数。
+            initial_engine: 作为初始全局模型的 LinearModelEngine（例如当前的 global_model.pkl），默认从零开始。
+            seed: 随机种子。
+        """
+        if partition not in PARTITIONS:
+            raise ValueError(f"不支持的划分方式: {partition}（支持 {', '.join(PARTITIONS)}）")
+        self.feature_columns = list(feature_columns or DEFAULT_FEATURE_COLUMNS)
+        self.num_clients = num_clients
+        self.workers = workers or min(num_clients, os.cpu_count() or 1)
+        self.aggregator = aggregator or FedAvgAggregator()
+        self.seed = seed
+        self.options = {"epochs": local_epochs, "learning_rate": learning_rate, "batch_size": batch_size, "l2": l2}
+
+        labelled = [record for record in records if label_of(record) is not None]
+        if not labelled:
+            raise ValueError("没有带标签的训练记录")
+        # 只用于特征提取，不需要模型
+        X, kept = DataProcessor(None, {"feature_columns": self.feature_columns}).records_to_matrix(labelled)
+        labelled = [labelled[row] for row in kept.tolist()]
+        y = np.array([label_of(record) for record in labelled], dtype=np.float64)
+        self.input_example = dict(zip(self.feature_columns, X[0].tolist()))
+
+        rng = np.random.default_rng(seed)
+        holdout = rng.random(len(y)) < holdout_ratio
+        train_rows = np.flatnonzero(~holdout)
+        keys = None if partition == "random" else [partition_key_of(labelled[row], partition)
+                                                   for row in train_rows.tolist()]
+        parts = [train_rows[part] for part in partition_indices(keys, len(train_rows), num_clients, seed)]
+
+        # 各客户端上报 (样本数, 特征和, 特征平方和)，聚合得到全局标准化参数
+        stats = [(len(part), X[part].sum(axis=0, dtype=np.float64),
+                  np.square(X[part], dtype=np.float64).sum(axis=0)) for part in parts]
+        total = sum(count for count, _, _ in stats)
+        if not total:
+            raise ValueError("没有可用于训练的记录：带标签的记录全部被划入留出集，请减小留出比例或提供更多记录")
+        self.mean = sum(sums for _, sums, _ in stats) / total
+        variance = sum(squares for _, _, squares in stats) / total - np.square(self.mean)
+        self.scale = np.sqrt(np.maximum(variance, 0.0))
+        self.scale[self.scale < 1e-12] = 1.0
+
+        standardized = ((X - self.mean) / self.scale).astype(np.float32)
+        self.client_data = [(standardized[part], y[part]) for part in parts]
+        self.holdout = (standardized[holdout], y[holdout])
+        self.initial_weights = np.zeros(len(self.feature_columns) + 1)
+        if initial_engine is not None:
+            self.initial_weights = self.from_engine(initial_engine)
+        self.codec = (codec, codec_options or {})
+        self.reset()
+
+    def reset(self):
+        """恢复到初始全局模型，清空训练历史和编码器状态，用于在同一份数据上比较不同的训练方式"""
+        self.weights = self.initial_weights.copy()
+        name, options = self.codec
+        self.client_codecs = [make_codec(name, **options) for _ in range(self.num_clients)]
+        self.history: List[Dict] = []
+
+    def client_sizes(self) -> List[int]:
+        return [len(y) for _, y in self.client_data]
+
+    def train(self, rounds=DEFAULT_ROUNDS, on_round=None) -> List[Dict]:
+        """
+            进行多轮联邦训练。每轮把全局参数发给所有非空客户端，等待全部更新后聚合。
+
+            rounds: 训练轮数。
+            on_round: 每轮结束后以该轮统计字典调用。
+            返回: 每轮的统计字典列表，包含 round、clients、samples、seconds、samples_per_second、
+                  bytes（客户端上传的总字节数）、encode_seconds、decode_seconds、holdout_loss 和 holdout_accuracy。
+        """
+        clients = [client for client, size in enumerate(self.client_sizes()) if size]
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_client_worker,
+                                 initargs=(self.client_data,)) as executor:
+            for _ in range(rounds):
+                round_number = len(self.history) + 1
+                started = time.perf_counter()
+                futures = [executor.submit(_train_client, client, self.weights, self.options,
+                                           self.seed * 1000003 + round_number * 1009 + client,
+                                           self.client_codecs[client])
+                           for client in clients]
+                outcomes = [future.result() for future in futures]
+
+                decode_started = time.perf_counter()
+                updates = np.empty((len(outcomes), len(self.weights)))
+                for row, (client, payload, _, _, _, codec) in enumerate(outcomes):
+                    self.client_codecs[client] = codec
+                    updates[row] = codec.decode(payload, self.weights) - self.weights
+                decode_seconds = time.perf_counter() - decode_started
+                sample_counts = np.array([outcome[2] for outcome in outcomes])
+                self.weights = self.weights + self.aggregator.aggregate(updates, sample_counts)
+                seconds = time.perf_counter() - started
+
+                loss, accuracy = evaluate(self.weights, *self.holdout)
+                samples = int(sample_counts.sum()) * self.options["epochs"]
+                report = {
+                    "round": round_number,
+                    "clients": len(clients),
+                    "samples": samples,
+                    "seconds": seconds,
+                    "samples_per_second": samples / seconds if seconds else float("inf"),
+                    "bytes": sum(len(outcome[1]) for outcome in outcomes),
+                    "encode_seconds": sum(outcome[4] for outcome in outcomes),
+                    "decode_seconds": decode_seconds,
+                    "holdout_loss": loss,
+                    "holdout_accuracy": accuracy
+                }
+                self.history.append(report)
+                if on_round:
+                    on_round(report)
+        return self.history
+
+    def from_engine(self, engine: LinearModelEngine) -> np.ndarray:
+        """把原始特征空间中的模型换算为标准化空间中的参数向量，to_engine 的逆运算"""
+        if not isinstance(engine, LinearModelEngine) or engine.n_features_in_ != len(self.feature_columns):
+            raise ValueError("初始模型必须是与特征列数一致的逻辑回归模型")
+        return np.append(engine.weights * self.scale, engine.intercept + float(engine.weights @ self.mean))
+
+    def to_engine(self, weights: Optional[np.ndarray] = None) -> LinearModelEngine:
+        """
+            把标准化空间中的参数折算回原始特征空间，得到可直接对原始特征打分的推理引擎。
+
+            weights: 标准化空间中的参数向量，默认为当前全局参数。
+        """
+        weights = self.weights if weights is None else weights
+        coef = weights[:-1] / self.scale
+        intercept = weights[-1] - float(coef @ self.mean)
+        return LinearModelEngine(coef, intercept, np.array([0, 1]))
+
+    def save(self, base_path: Path, model_version=None, weights: Optional[np.ndarray] = None) -> Path:
+        """
+            通过 ModelHandler.save_model 发布全局模型。
+
+            base_path: 应用程序的基础路径，模型写入其中的 saved_models 目录。
+            model_version: 模型版本号，默认为 "fedavg-<轮数>"。
+            weights: 需要发布的标准化空间参数向量，默认为当前全局参数。
+            返回: 写出的模型文件路径。
+        """
+        return ModelHandler.save_model(base_path, self.to_engine(weights), {
+            "feature_columns": self.feature_columns,
+            "input_example": self.input_example,
+            "model_version": model_version or f"fedavg-{len(self.history)}"
+        })
+
+
+def load_records(args) -> List[Dict]:
+    """按命令行参数读取训练记录文件，或生成合成记录"""
+    if args.records:
+        from data_persistence_manager import DataPersistenceManager
+        return [record for record, _ in DataPersistenceManager.iter_json_records(args.records)]
+    from synthetic_traces import generate_synthetic_records
+    return generate_synthetic_records(args.synthetic, seed=args.seed)
+
+
+def print_round(report: Dict):
+    print(f"第 {report['round']} 轮: 客户端 {report['clients']} 个，样本 {report['samples']} 个，"
+          f"耗时 {report['seconds']:.2f} 秒，吞吐 {report['samples_per_second']:.0f} 样本/秒，"
+          f"上传 {report['bytes']} 字节，"
+          f"留出集损失 {report['holdout_loss']:.4f}，准确率 {report['holdout_accuracy'] * 100:.2f}%",
+          file=sys.stderr, flush=True)
+
+
+def add_training_arguments(parser: argparse.ArgumentParser):
+    """添加训练数据和本地训练相关的命令行参数，供联邦训练和相关性能测试共用"""
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--records", help="带标签的记录文件（JSON 数组或 JSON Lines）")
+    source.add_argument("--synthetic", type=int, default=100000, help="不指定 --records 时生成的合成记录数")
+    parser.add_argument("--clients", type=int, default=DEFAULT_CLIENTS, help="模拟客户端数")
+    parser.add_argument("--partition", choices=PARTITIONS, default="vehicleId", help="客户端数据划分方式")
+    parser.add_argument("--local-epochs", type=int, default=DEFAULT_LOCAL_EPOCHS, help="每轮本地训练轮数")
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_LEARNING_RATE, help="本地 SGD 学习率")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="本地 SGD 批大小")
+    parser.add_argument("--workers", type=int, help="工作进程数")
+    parser.add_argument("--aggregator", choices=list(AGGREGATORS), default="fedavg",
+                        help="聚合方式，median/trimmed_mean/krum/multi_krum/norm_clip 可抵御恶意客户端更新")
+    parser.add_argument("--trim-ratio", type=float, default=0.1, help="trimmed_mean 每一侧去掉的比例")
+    parser.add_argument("--num-malicious", type=int, default=0, help="krum/multi_krum 假定的恶意客户端数")
+    parser.add_argument("--clip-norm", type=float, help="norm_clip 的裁剪阈值，默认取每轮更新范数的中位数")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="以 saved_models 中当前的全局模型作为初始模型（特征列也取自该模型）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+
+
+def trainer_from_args(records: List[Dict], args, **kwargs) -> FederatedTrainer:
+    if args.warm_start:
+        engine, metadata = ModelHandler.load_model(base_path)
+        kwargs.setdefault("initial_engine", engine)
+        kwargs.setdefault("feature_columns", metadata["feature_columns"])
+    kwargs.setdefault("aggregator", make_aggregator(args.aggregator, args.clients, args.trim_ratio,
+                                                    args.num_malicious, args.clip_norm))
+    return FederatedTrainer(records, num_clients=args.clients, partition=args.partition,
+                            local_epochs=args.local_epochs, learning_rate=args.learning_rate,
+                            batch_size=args.batch_size, workers=args.workers, seed=args.seed, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="单机联邦训练：模拟多个客户端本地训练并按 FedAvg 聚合全局模型")
+    add_training_arguments(parser)
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="联邦训练轮数")
+    parser.add_argument("--out", default=str(base_path), help="输出基础路径，模型写入其中的 saved_models 目录")
+    parser.add_argument("--model-version", help="写入模型元数据的版本号")
+    parser.add_argument("--codec", choices=list(CODECS), default="float64", help="客户端上传本地参数的编码方式")
+    parser.add_argument("--topk-ratio", type=float, default=0.1, help="topk 编码发送的参数比例")
+    args = parser.parse_args(argv)
+
+    trainer = trainer_from_args(load_records(args), args, codec=args.codec,
+                                codec_options={"ratio": args.topk_ratio} if args.codec == "topk" else None)
+    print(f"客户端样本数: {trainer.client_sizes()}", file=sys.stderr)
+    trainer.train(args.rounds, print_round)
+    model_path = trainer.save(Path(args.out), args.model_version)
+    print(f"已写出全局模型: {model_path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
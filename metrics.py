@@ -0,0 +1,192 @@
+import os
+import time
+import threading
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+# 直方图桶按纳秒的二进制位数划分：第 k 个桶统计 (2^(k-1), 2^k] 纳秒的耗时，与 Prometheus 的 le 上界一致
+HISTOGRAM_BUCKETS = 64
+# Prometheus 输出的桶上界范围：2^10 纳秒（约 1 微秒）到 2^36 纳秒（约 69 秒）
+PROMETHEUS_MIN_BITS = 10
+PROMETHEUS_MAX_BITS = 36
+
+# 设置该环境变量为 1 时在导入本模块时即启用指标采集
+METRICS_ENV = "VEHICLE_METRICS"
+METRICS_PREFIX = "vehicle"
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total_ns", "max_ns", "_lock")
+
+    def __init__(self):
+        """按二进制位数分桶的耗时直方图，记录一次耗时只需一次整数位运算"""
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ns: int):
+        with self._lock:
+            self.buckets[min(max(elapsed_ns - 1, 0).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+            self.count += 1
+            self.total_ns += elapsed_ns
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+
+    def quantile(self, q: float, buckets=None, max_ns=None) -> float:
+        """由桶计数估计分位数（纳秒）：在所在桶内线性插值，且不超过观测到的最大值"""
+        buckets = buckets or self.buckets
+        max_ns = self.max_ns if max_ns is None else max_ns
+        target = q * sum(buckets)
+        seen = 0
+        for bits, count in enumerate(buckets):
+            if count and seen + count >= target:
+                lower = (1 << bits) >> 1
+                estimate = lower + (target - seen) / count * ((1 << bits) - lower)
+                return min(estimate, max_ns)
+            seen += count
+        return 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+            热路径耗时指标注册表：按名称保存耗时直方图和计数器。
+            是否启用在被计时的模块导入之前决定；未启用时 timed 直接返回原函数，没有任何额外开销。
+        """
+        self.enabled = os.environ.get(METRICS_ENV) == "1"
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def enable(self):
+        """启用指标采集；必须在导入被计时的模块之前调用"""
+        self.enabled = True
+
+    def histogram(self, name: str) -> Histogram:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            return histogram
+
+    def timed(self, name: str):
+        """
+            装饰器：记录函数每次调用的耗时（perf_counter_ns）。
+            装饰时指标未启用则原样返回函数本身。
+
+            name: 指标名称，例如 "model_predict"。
+        """
+        def decorator(func):
+            if not self.enabled:
+                return func
+            histogram = self.histogram(name)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter_ns() - started)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: int = 1):
+        """累加计数器；调用方应在 enabled 为 True 时才调用，避免热路径上的额外开销"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict:
+        """
+            返回当前指标的快照。
+
+            返回: {"timers": {名称: {count、total_seconds、mean_us、p50_us、p99_us、max_us}},
+                   "counters": {名称: 值}}；分位数由直方图桶估计。
+        """
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = dict(self.counters)
+        timers = {}
+        for name, histogram in histograms:
+            with histogram._lock:
+                buckets = list(histogram.buckets)
+                count, total_ns, max_ns = histogram.count, histogram.total_ns, histogram.max_ns
+            timers[name] = {
+                "count": count,
+                "total_seconds": total_ns / 1e9,
+                "mean_us": total_ns / count / 1000 if count else 0.0,
+                "p50_us": histogram.quantile(0.5, buckets, max_ns) / 1000,
+                "p99_us": histogram.quantile(0.99, buckets, max_ns) / 1000,
+                "max_us": max_ns / 1000
+            }
+        return {"timers": timers, "counters": counters}
+
+    def prometheus_text(self) -> str:
+        """以 Prometheus 文本格式输出全部指标，耗时单位为秒"""
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = dict(self.counters)
+        lines = []
+        for name, histogram in sorted(histograms):
+            metric = f"{METRICS_PREFIX}_{name}_seconds"
+            with histogram._lock:
+                buckets = list(histogram.buckets)
+                count, total_ns = histogram.count, histogram.total_ns
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = sum(buckets[:PROMETHEUS_MIN_BITS + 1])
+            for bits in range(PROMETHEUS_MIN_BITS, PROMETHEUS_MAX_BITS + 1):
+                if bits > PROMETHEUS_MIN_BITS:
+                    cumulative += buckets[bits]
+                lines.append(f'{metric}_bucket{{le="{(1 << bits) / 1e9:.9g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{metric}_sum {total_ns / 1e9:.9f}")
+            lines.append(f"{metric}_count {count}")
+        for name, value in sorted(counters.items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+            在后台线程中启动 Prometheus 文本格式的指标端点（GET /metrics），默认只监听本机。
+
+            port: 监听端口，0 表示由系统分配。
+            host: 监听地址。
+            返回: 实际监听的 (地址, 端口)。
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不在标准错误中输出每次抓取的访问日志
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return self._server.server_address[:2]
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# 全局指标注册表，由环境变量 VEHICLE_METRICS=1 或各入口的 --metrics-port 参数启用
+metrics = MetricsRegistry()
@@ -1,22 +1,443 @@
-import joblib
+import os
+import json
+import struct
+import hashlib
+import tempfile
+import threading
+import numpy as np
 from pathlib import Path
 
+# 加载时校验推理引擎所用的随机样本数和允许的最大概率误差
+VERIFY_SAMPLES = 64
+VERIFY_TOLERANCE = 1e-6
+
+# 紧凑模型文件格式：
+#   8 字节魔数 | 32 字节 SHA-256（覆盖其后的全部内容）| 4 字节小端头部长度 | UTF-8 JSON 头部 |
+#   补齐到 8 字节边界 | 小端 float64 数组（权重，最后一个元素为截距）
+ARTIFACT_FILE = "global_model.vmodel"
+ARTIFACT_MAGIC = b"VMODEL01"
+ARTIFACT_VERSION = 1
+_DIGEST_SIZE = 32
+_PREFIX_SIZE = len(ARTIFACT_MAGIC) + _DIGEST_SIZE + 4
+
+# 模型目录中被监视的文件，以及轮询间隔（秒）
+WATCHED_FILES = ("global_model.pkl", "model_metadata.pkl", ARTIFACT_FILE)
+WATCH_INTERVAL = 2.0
+
+
+def atomic_write(path: Path, write):
+    """
+        先写入同目录下名称唯一的临时文件再原子替换目标文件；多个写入方同时写同一文件时互不破坏临时文件。
+
+        path: 目标文件路径。
+        write: 以二进制文件对象为参数、负责写入内容的函数。
+    """
+    path = Path(path)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class ModelMismatchError(ValueError):
+    """模型文件与元数据文件来自不同的发布"""
+
+
+def _require_finite(engine):
+    """拒绝发布包含 NaN 或无穷大参数的模型（例如训练发散时），以免覆盖正在使用的可用模型"""
+    if not (np.all(np.isfinite(engine.weights)) and np.isfinite(engine.intercept)):
+        raise ValueError("模型参数包含 NaN 或无穷大，拒绝写出模型文件")
+
+
+class LinearModelEngine:
+    def __init__(self, coef, intercept, classes, model=None):
+        """
+            二分类逻辑回归的纯 NumPy 推理引擎，绕过 scikit-learn 的输入校验和类型转换开销。
+            攻击概率为 sigmoid(X·w + b)。
+
+            coef: 形状为 (1, 特征数) 或 (特征数,) 的权重。
+            intercept: 截距。
+            classes: 类别标签数组，长度必须为2。
+            model: 原始的 scikit-learn 模型（如果有），仅供需要时访问。
+        """
+        self.weights = np.asarray(coef, dtype=np.float64).ravel()
+        self.intercept = float(np.ravel(intercept)[0])
+        self.classes_ = np.asarray(classes)
+        self.model = model
+
+    @property
+    def n_features_in_(self) -> int:
+        return self.weights.shape[0]
+
+    def decision_function(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        if X.dtype != np.float64:
+            # 混合精度的矩阵乘法不走 BLAS，先把 float32 特征转换为 float64 再相乘要快数倍
+            X = X.astype(np.float64)
+        return X @ self.weights + self.intercept
+
+    def predict_proba(self, X) -> np.ndarray:
+        """返回形状为 (记录数, 2) 的类别概率，与 scikit-learn 的 predict_proba 一致"""
+        # 0.5 * (1 + tanh(z / 2)) 与 sigmoid 等价，且在 |z| 很大时不会溢出
+        attack_prob = 0.5 * (1.0 + np.tanh(0.5 * self.decision_function(X)))
+        return np.column_stack((1.0 - attack_prob, attack_prob))
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[(self.decision_function(X) > 0).astype(np.intp)]
+
+
 class ModelHandler:
     @staticmethod
     def load_model(base_path: Path):
         """
             加载预训练模型和模型元数据。
 
+            优先读取 saved_models 中的紧凑模型文件（见 export_artifact），此时无需导入 scikit-learn；
+            文件不存在、校验失败或已落后于 pkl 文件时，才通过 joblib 反序列化 pkl 文件。
+
             base_path: 应用程序的基础路径。
-            返回: 加载的模型对象和模型元数据字典。
+            返回: 推理引擎（见 build_engine）和模型元数据字典。
+                  元数据中的 model_sha256 为模型文件摘要，model_version 为发布方写入的版本号（没有时取摘要前12位）。
         """
         model_path = base_path / "saved_models" / "global_model.pkl"
         metadata_path = base_path / "saved_models" / "model_metadata.pkl"
+        artifact_path = base_path / "saved_models" / ARTIFACT_FILE
+        source_sha256 = ModelHandler.source_digest(model_path, metadata_path)
+        if artifact_path.exists():
+            # 紧凑模型文件损坏或与 pkl 文件不一致时回退到 pkl 文件
+            try:
+                return ModelHandler.load_artifact(artifact_path, source_sha256)
+            except ValueError:
+                pass
         try:
+            # joblib 和 scikit-learn 仅在没有可用的紧凑模型文件时才导入
+            import joblib
             model = joblib.load(model_path)
             metadata = joblib.load(metadata_path)
-            return model, metadata
+            ModelHandler.check_pair(model, metadata)
+            ModelHandler._tag_version(metadata, source_sha256)
+            return ModelHandler.build_engine(model, metadata), metadata
+        except ModelMismatchError:
+            raise
         except FileNotFoundError as e:
             raise FileNotFoundError(f"模型或元数据文件未找到: {e}. 请确保 'saved_models' 文件夹存在且包含 'global_model.pkl' 和 'model_metadata.pkl'")
         except Exception as e:
-            raise Exception(f"加载模型时发生错误: {e}")
\ No newline at end of file
+            raise Exception(f"加载模型时发生错误: {e}")
+
+    @staticmethod
+    def build_engine(model, metadata):
+        """
+            为加载的模型选择推理引擎。
+            对二分类逻辑回归提取 coef_、intercept_ 和 classes_ 构建 LinearModelEngine，
+            并用 scikit-learn 的输出进行校验；不支持的模型类型或校验失败时直接使用原模型。
+
+            model: scikit-learn 模型对象。
+            metadata: 模型元数据字典。
+            返回: 提供 predict_proba、predict 和 classes_ 的推理对象。
+        """
+        coef = getattr(model, "coef_", None)
+        intercept = getattr(model, "intercept_", None)
+        classes = getattr(model, "classes_", None)
+        if (type(model).__name__ != "LogisticRegression" or coef is None or intercept is None
+                or classes is None or len(classes) != 2 or np.shape(coef)[0] != 1):
+            return model
+
+        engine = LinearModelEngine(coef, intercept, classes, model)
+        if not ModelHandler.verify_engine(engine, model, metadata):
+            return model
+        return engine
+
+    @staticmethod
+    def verify_engine(engine, model, metadata) -> bool:
+        """
+            用元数据中的输入样例和固定种子的随机样本比较推理引擎与原模型的输出。
+
+            返回: 概率误差不超过 VERIFY_TOLERANCE 且预测类别一致时返回 True。
+        """
+        feature_columns = metadata["feature_columns"]
+        if len(feature_columns) != engine.n_features_in_:
+            return False
+        rng = np.random.default_rng(0)
+        samples = rng.normal(0.0, 100.0, size=(VERIFY_SAMPLES, len(feature_columns))).astype(np.float32)
+        input_example = metadata.get("input_example")
+        if input_example:
+            samples[0] = [float(input_example.get(column, 0.0)) for column in feature_columns]
+        try:
+            expected_proba = model.predict_proba(samples)
+            expected_prediction = model.predict(samples)
+        except Exception:
+            return False
+        return (np.allclose(engine.predict_proba(samples), expected_proba, rtol=0.0, atol=VERIFY_TOLERANCE)
+                and np.array_equal(engine.predict(samples), expected_prediction))
+
+    @staticmethod
+    def weights_digest(coef, intercept, classes) -> str:
+        """计算逻辑回归模型参数（权重、截距和类别）的 SHA-256 十六进制摘要"""
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(coef, dtype="<f8").tobytes())
+        digest.update(np.ascontiguousarray(intercept, dtype="<f8").tobytes())
+        digest.update(json.dumps(np.asarray(classes).tolist()).encode("utf-8"))
+        return digest.hexdigest()
+
+    @staticmethod
+    def check_pair(model, metadata):
+        """
+            检查 pkl 模型文件与元数据文件是否属于同一次发布：save_model 会把模型参数摘要写入元数据的
+            weights_sha256。没有该字段的旧元数据不做检查。
+
+            异常: 摘要不一致（例如发布方只替换了其中一个文件）时抛出 ModelMismatchError。
+        """
+        expected = metadata.get("weights_sha256")
+        if expected is None:
+            return
+        actual = ModelHandler.weights_digest(getattr(model, "coef_", None), getattr(model, "intercept_", None),
+                                             getattr(model, "classes_", None))
+        if actual != expected:
+            raise ModelMismatchError("模型文件与元数据文件不属于同一版本，发布可能尚未完成")
+
+    @staticmethod
+    def _tag_version(metadata, model_sha256):
+        """在元数据中记录模型摘要和版本号"""
+        metadata["model_sha256"] = model_sha256
+        metadata["model_version"] = metadata.get("model_version") or (model_sha256 or "")[:12] or None
+
+    @staticmethod
+    def source_digest(model_path: Path, metadata_path: Path):
+        """
+            计算 pkl 模型文件和元数据文件的 SHA-256，用于判断紧凑模型文件是否由它们转换而来。
+
+            返回: 十六进制摘要；任一文件不存在时返回 None。
+        """
+        digest = hashlib.sha256()
+        try:
+            for path in (model_path, metadata_path):
+                digest.update(Path(path).read_bytes())
+        except FileNotFoundError:
+            return None
+        return digest.hexdigest()
+
+    @staticmethod
+    def export_artifact(engine: LinearModelEngine, metadata, artifact_path: Path, source_sha256=None):
+        """
+            把推理引擎写出为紧凑模型文件。先写入临时文件再原子替换，读取方不会看到写了一半的文件。
+
+            engine: LinearModelEngine 实例。
+            metadata: 模型元数据字典。
+            artifact_path: 输出文件路径。
+            source_sha256: 来源 pkl 文件的摘要（见 source_digest），加载时用于检测紧凑模型文件是否过期。
+        """
+        if not isinstance(engine, LinearModelEngine):
+            raise ValueError("紧凑模型文件仅支持二分类逻辑回归模型")
+        _require_finite(engine)
+        label_encoder = metadata.get("label_encoder")
+        header = {
+            "format_version": ARTIFACT_VERSION,
+            "model_type": "logistic_regression",
+            "n_features": engine.n_features_in_,
+            "classes": engine.classes_.tolist(),
+            "feature_columns": list(metadata["feature_columns"]),
+            "label_classes": (np.asarray(label_encoder.classes_).tolist() if label_encoder is not None
+                              else metadata.get("label_classes")),
+            "input_example": metadata.get("input_example"),
+            "model_version": metadata.get("model_version"),
+            "source_sha256": source_sha256
+        }
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        header_bytes += b" " * (-(_PREFIX_SIZE + len(header_bytes)) % 8)
+        values = np.append(engine.weights, engine.intercept).astype("<f8")
+        body = struct.pack("<I", len(header_bytes)) + header_bytes + values.tobytes()
+        digest = hashlib.sha256(body).digest()
+
+        atomic_write(artifact_path, lambda f: f.write(ARTIFACT_MAGIC + digest + body))
+
+    @staticmethod
+    def load_artifact(artifact_path: Path, source_sha256=None):
+        """
+            通过 numpy.memmap 读取紧凑模型文件，不经过 pickle。校验通过后把权重复制到内存中并释放映射，
+            文件不会一直处于映射状态，Windows 上也能用 os.replace 替换正在使用的模型文件。
+
+            artifact_path: 紧凑模型文件路径。
+            source_sha256: 当前 pkl 文件的摘要；不为 None 且与文件中记录的不一致时视为过期。
+            返回: LinearModelEngine 实例和模型元数据字典。
+            异常: 文件格式错误、内容校验失败或已过期时抛出 ValueError。
+        """
+        raw = np.memmap(artifact_path, dtype=np.uint8, mode="r")
+        try:
+            if len(raw) < _PREFIX_SIZE or bytes(raw[:len(ARTIFACT_MAGIC)]) != ARTIFACT_MAGIC:
+                raise ValueError(f"不是有效的模型文件: {artifact_path}")
+            stored_digest = bytes(raw[len(ARTIFACT_MAGIC):len(ARTIFACT_MAGIC) + _DIGEST_SIZE])
+            if hashlib.sha256(raw[len(ARTIFACT_MAGIC) + _DIGEST_SIZE:]).digest() != stored_digest:
+                raise ValueError(f"模型文件校验失败，文件可能已损坏: {artifact_path}")
+
+            header_size = struct.unpack("<I", bytes(raw[_PREFIX_SIZE - 4:_PREFIX_SIZE]))[0]
+            header = json.loads(bytes(raw[_PREFIX_SIZE:_PREFIX_SIZE + header_size]).decode("utf-8"))
+            if header.get("format_version") != ARTIFACT_VERSION or header.get("model_type") != "logistic_regression":
+                raise ValueError(f"不支持的模型文件版本或模型类型: {artifact_path}")
+            if source_sha256 is not None and header.get("source_sha256") not in (None, source_sha256):
+                raise ValueError(f"模型文件已过期，与 pkl 模型文件不一致: {artifact_path}")
+
+            n_features = header["n_features"]
+            values = np.array(np.frombuffer(raw, dtype="<f8", count=n_features + 1,
+                                            offset=_PREFIX_SIZE + header_size), dtype=np.float64, copy=True)
+        finally:
+            del raw  # 不保留任何指向映射的引用，映射随之关闭
+        engine = LinearModelEngine(values[:n_features], values[n_features], header["classes"])
+        metadata = {
+            "feature_columns": header["feature_columns"],
+            "label_classes": header["label_classes"],
+            "input_example": header["input_example"],
+            "model_version": header.get("model_version")
+        }
+        ModelHandler._tag_version(metadata, header.get("source_sha256") or stored_digest.hex())
+        return engine, metadata
+
+    @staticmethod
+    def convert_model(base_path: Path) -> Path:
+        """
+            把 saved_models 中的 pkl 模型文件转换为紧凑模型文件。需要 scikit-learn 和 joblib。
+
+            base_path: 应用程序的基础路径。
+            返回: 写出的紧凑模型文件路径。
+        """
+        import joblib
+        model_path = base_path / "saved_models" / "global_model.pkl"
+        metadata_path = base_path / "saved_models" / "model_metadata.pkl"
+        artifact_path = base_path / "saved_models" / ARTIFACT_FILE
+        model = joblib.load(model_path)
+        metadata = joblib.load(metadata_path)
+        engine = ModelHandler.build_engine(model, metadata)
+        ModelHandler.export_artifact(engine, metadata, artifact_path,
+                                     ModelHandler.source_digest(model_path, metadata_path))
+        return artifact_path
+
+    @staticmethod
+    def save_model(base_path: Path, engine: LinearModelEngine, metadata) -> Path:
+        """
+            把训练得到的逻辑回归模型发布到 saved_models 目录：写出 load_model 能直接读取的
+            global_model.pkl、model_metadata.pkl 和对应的紧凑模型文件。
+            每个文件都先写入名称唯一的临时文件再原子替换，正在运行的 ModelWatcher 只会看到完整的文件；
+            元数据中记录模型参数摘要（weights_sha256），加载时据此拒绝来自不同发布的模型文件和元数据文件。
+            紧凑模型文件最后写出，并记录 pkl 文件的摘要，与 pkl 文件不一致时加载方会回退到 pkl 文件。
+            需要 scikit-learn 和 joblib。
+
+            base_path: 应用程序的基础路径。
+            engine: LinearModelEngine 实例，权重对应原始（未标准化的）特征。
+            metadata: 模型元数据字典，至少包含 feature_columns，可包含 input_example 和 model_version。
+            返回: 写出的模型文件路径。
+            异常: 模型参数包含 NaN 或无穷大时抛出 ValueError，不写出任何文件。
+        """
+        _require_finite(engine)
+        import joblib
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.preprocessing import LabelEncoder
+
+        model = LogisticRegression()
+        model.coef_ = engine.weights.reshape(1, -1).copy()
+        model.intercept_ = np.array([engine.intercept])
+        model.classes_ = engine.classes_.copy()
+        model.n_features_in_ = engine.n_features_in_
+        model.n_iter_ = np.array([0], dtype=np.int32)
+        label_encoder = LabelEncoder().fit(engine.classes_)
+        metadata = {
+            "feature_columns": list(metadata["feature_columns"]),
+            "label_encoder": label_encoder,
+            "input_example": metadata.get("input_example"),
+            "model_version": metadata.get("model_version"),
+            "weights_sha256": ModelHandler.weights_digest(model.coef_, model.intercept_, model.classes_)
+        }
+
+        model_dir = Path(base_path) / "saved_models"
+        model_dir.mkdir(parents=True, exist_ok=True)
+        model_path = model_dir / "global_model.pkl"
+        metadata_path = model_dir / "model_metadata.pkl"
+        for path, value in ((model_path, model), (metadata_path, metadata)):
+            atomic_write(path, lambda f, value=value: joblib.dump(value, f))
+        ModelHandler.export_artifact(engine, metadata, model_dir / ARTIFACT_FILE,
+                                     ModelHandler.source_digest(model_path, metadata_path))
+        return model_path
+
+
+class ModelWatcher:
+    def __init__(self, base_path: Path, on_model_loaded, on_error=None, current_sha256=None,
+                 interval=WATCH_INTERVAL):
+        """
+            在后台线程中轮询 saved_models 目录，发现联邦聚合方发布了新的全局模型时自动重新加载。
+            通过比较文件的 mtime、inode 和大小判断是否变化；连续两次轮询结果一致后才加载，
+            避免读到尚未写完的文件。新模型通过 load_model 加载并校验后交给 on_model_loaded。
+
+            base_path: 应用程序的基础路径。
+            on_model_loaded: 新模型加载成功后的回调，参数为 (推理引擎, 模型元数据)，在监视线程中调用。
+            on_error: 新模型加载失败时的回调，参数为错误信息字符串；当前模型保持不变。
+            current_sha256: 当前正在使用的模型摘要，内容相同的文件不会重复加载。
+            interval: 轮询间隔（秒）。
+        """
+        self.model_dir = Path(base_path) / "saved_models"
+        self.base_path = Path(base_path)
+        self.on_model_loaded = on_model_loaded
+        self.on_error = on_error
+        self.current_sha256 = current_sha256
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _signature(self):
+        """返回被监视文件的 (mtime, inode, 大小) 元组，文件不存在时对应位置为 None"""
+        signature = []
+        for name in WATCHED_FILES:
+            try:
+                stat = os.stat(self.model_dir / name)
+                signature.append((stat.st_mtime_ns, stat.st_ino, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        loaded = self._signature()
+        pending = None
+        while not self._stop_event.wait(self.interval):
+            signature = self._signature()
+            if signature == loaded:
+                pending = None
+            elif signature != pending:
+                # 文件刚发生变化，等下一次轮询确认已写完
+                pending = signature
+            else:
+                loaded = signature
+                pending = None
+                self.check_now()
+
+    def check_now(self) -> bool:
+        """
+            立即加载并校验模型目录中的模型。
+
+            返回: 加载了与当前模型不同的新模型时返回 True。
+        """
+        try:
+            model, metadata = ModelHandler.load_model(self.base_path)
+            proba = model.predict_proba(np.zeros((1, len(metadata["feature_columns"])), dtype=np.float32))
+            if proba.shape != (1, 2) or not np.all(np.isfinite(proba)):
+                raise ValueError("新模型的输出不是有效的二分类概率")
+        except Exception as e:
+            if self.on_error:
+                self.on_error(f"加载新发布的模型失败，继续使用当前模型: {e}")
+            return False
+        if metadata.get("model_sha256") == self.current_sha256:
+            return False
+        self.current_sha256 = metadata.get("model_sha256")
+        self.on_model_loaded(model, metadata)
+        return True
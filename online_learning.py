@@ -0,0 +1,213 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, Optional
+
+from data_processor import DataProcessor
+from model_handler import LinearModelEngine, ModelHandler, atomic_write
+
+base_path = Path(__file__).parent
+
+# 增量模型版本保存在 saved_models 下的该目录中，state.json 记录版本号、标签游标和特征统计
+ONLINE_MODEL_DIR = "online_models"
+STATE_FILE = "state.json"
+
+DEFAULT_LEARNING_RATE = 0.05
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_L2 = 1e-4
+DEFAULT_KEEP_VERSIONS = 10
+# 每次从标签日志读取的最大条数
+FETCH_SIZE = 1024
+
+
+class OnlineLearner:
+    def __init__(self, base_path: Path, store, learning_rate=DEFAULT_LEARNING_RATE, batch_size=DEFAULT_BATCH_SIZE,
+                 l2=DEFAULT_L2, keep_versions=DEFAULT_KEEP_VERSIONS):
+        """
+            基于人工标注的增量学习。按标签日志的序号游标只读取新产生的标签，
+            以小批量 SGD 更新逻辑回归参数，每次更新的开销只与新标签数量成正比，与历史记录总数无关。
+            特征尺度差异很大（位置为数千、噪声为个位数），梯度按各特征的均方值做对角预条件。
+            每次更新生成一个新版本，以紧凑模型文件保存在 saved_models/online_models 中。
+
+            base_path: 应用程序的基础路径。
+            store: RecordStore 实例，提供标签日志。
+            learning_rate: SGD 学习率。
+            batch_size: 小批量大小。
+            l2: L2 正则化系数。
+            keep_versions: 保留的历史版本数。
+        """
+        self.base_path = Path(base_path)
+        self.store = store
+        self.learning_rate = learning_rate
+        self.batch_size = batch_size
+        self.l2 = l2
+        self.keep_versions = keep_versions
+        self.version_dir = self.base_path / "saved_models" / ONLINE_MODEL_DIR
+        self.state = self._load_state()
+        # 旧版状态文件没有 current 字段，其最新版本总是基于当前的全局模型
+        self.state.setdefault("current", self.state["version"])
+
+        engine, metadata = ModelHandler.load_model(self.base_path)
+        latest = self.version_path(self.online_version) if self.online_version else None
+        if latest is not None and latest.exists() and self.state["base_sha256"] == metadata.get("model_sha256"):
+            self._set_model(*ModelHandler.load_artifact(latest))
+        else:
+            self.rebase(engine, metadata)
+
+    def _set_model(self, engine, metadata):
+        if not isinstance(engine, LinearModelEngine):
+            raise ValueError("增量学习仅支持逻辑回归模型")
+        self.metadata = metadata
+        self.weights = np.append(engine.weights, engine.intercept)
+        self.classes = engine.classes_
+        # 只用于特征提取，不需要模型
+        self.feature_processor = DataProcessor(None, {"feature_columns": metadata["feature_columns"]})
+
+    def rebase(self, engine, metadata):
+        """
+            全局模型被新一轮联邦训练替换后，从新的全局模型继续学习。
+            标签游标保持不变，已处理的标签不会被重复使用；特征列变化时重新累计特征均方值。
+
+            engine: 新的全局模型推理引擎，必须是 LinearModelEngine。
+            metadata: 新的全局模型元数据。
+        """
+        self._set_model(engine, metadata)
+        self.state["current"] = 0
+        sum_squares = self.state["sum_squares"]
+        if sum_squares is not None and len(sum_squares) != len(metadata["feature_columns"]):
+            self.state["seen"], self.state["sum_squares"] = 0, None
+        self.state["base_sha256"] = metadata.get("model_sha256")
+        self.version_dir.mkdir(parents=True, exist_ok=True)
+        self._save_state()
+
+    @property
+    def base_sha256(self) -> Optional[str]:
+        """当前增量模型所基于的全局模型摘要"""
+        return self.state["base_sha256"]
+
+    @property
+    def online_version(self) -> int:
+        """当前参数对应的增量模型版本号；0 表示参数与全局模型相同"""
+        return self.state["current"]
+
+    def _load_state(self) -> Dict:
+        try:
+            return json.loads((self.version_dir / STATE_FILE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"version": 0, "current": 0, "cursor": 0, "seen": 0, "sum_squares": None, "base_sha256": None,
+                    "versions": []}
+
+    def _save_state(self):
+        content = json.dumps(self.state, ensure_ascii=False, indent=2).encode("utf-8")
+        atomic_write(self.version_dir / STATE_FILE, lambda f: f.write(content))
+
+    def version_path(self, version: int) -> Path:
+        return self.version_dir / f"online-{version}.vmodel"
+
+    def pending_labels(self) -> int:
+        """返回尚未用于训练的新标签数量"""
+        return self.store.label_count_since(self.state["cursor"])
+
+    def current(self):
+        """返回当前参数对应的 (推理引擎, 模型元数据)"""
+        engine = LinearModelEngine(self.weights[:-1].copy(), self.weights[-1], self.classes)
+        return engine, self.metadata
+
+    def _sgd_step(self, X: np.ndarray, y: np.ndarray):
+        """对一个小批量做一次按特征均方值预条件的 SGD 更新"""
+        mean_squares = np.asarray(self.state["sum_squares"]) / self.state["seen"]
+        preconditioner = 1.0 / np.where(mean_squares > 1e-12, mean_squares, 1.0)
+        coef = self.weights[:-1]
+        error = 0.5 * (1.0 + np.tanh(0.5 * (X @ coef + self.weights[-1]))) - y
+        gradient = X.T @ error / len(y) + self.l2 * coef
+        coef -= self.learning_rate * preconditioner * gradient
+        self.weights[-1] -= self.learning_rate * float(error.mean())
+
+    def update(self, min_labels=1) -> Optional[Dict]:
+        """
+            用所有新标签更新模型并保存新版本。
+
+            min_labels: 新标签少于该数量时不更新。
+            返回: 本次更新的统计字典（version、labels、seconds、path）；没有更新时返回 None。
+        """
+        if self.pending_labels() < min_labels:
+            return None
+        started = time.perf_counter()
+        consumed = 0
+        while True:
+            labelled = self.store.labels_since(self.state["cursor"], FETCH_SIZE)
+            if not labelled:
+                break
+            records = [record for _, record in labelled]
+            X, kept = self.feature_processor.records_to_matrix(records)
+            X = X.astype(np.float64)
+            y = np.array([1.0 if records[row].get("hazardAttack") else 0.0 for row in kept.tolist()])
+
+            squares = np.square(X).sum(axis=0)
+            self.state["sum_squares"] = (squares if self.state["sum_squares"] is None
+                                         else np.asarray(self.state["sum_squares"]) + squares).tolist()
+            self.state["seen"] += len(y)
+            for begin in range(0, len(y), self.batch_size):
+                self._sgd_step(X[begin:begin + self.batch_size], y[begin:begin + self.batch_size])
+            self.state["cursor"] = labelled[-1][0]
+            consumed += len(labelled)
+        return self._save_version(consumed, time.perf_counter() - started)
+
+    def _save_version(self, labels: int, seconds: float) -> Dict:
+        """把当前参数保存为新版本，并删除超出保留数量的旧版本"""
+        self.version_dir.mkdir(parents=True, exist_ok=True)
+        version = self.state["version"] + 1
+        engine, _ = self.current()
+        metadata = dict(self.metadata, model_version=f"online-{version}")
+        path = self.version_path(version)
+        ModelHandler.export_artifact(engine, metadata, path)
+        self.metadata = ModelHandler.load_artifact(path)[1]
+
+        self.state["version"] = version
+        self.state["current"] = version
+        self.state["versions"].append(version)
+        for old_version in self.state["versions"][:-self.keep_versions]:
+            self.version_path(old_version).unlink(missing_ok=True)
+        self.state["versions"] = self.state["versions"][-self.keep_versions:]
+        self._save_state()
+        return {"version": version, "labels": labels, "seconds": seconds, "path": path}
+
+    def publish(self) -> Path:
+        """
+            把当前增量模型发布为 saved_models 中的全局模型（需要 scikit-learn），
+            运行中的 ModelWatcher 会自动加载它。
+        """
+        engine, metadata = self.current()
+        model_path = ModelHandler.save_model(self.base_path, engine, metadata)
+        self.state["base_sha256"] = ModelHandler.source_digest(model_path, model_path.with_name("model_metadata.pkl"))
+        self._save_state()
+        return model_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用人工标注的新记录增量更新模型")
+    parser.add_argument("--db", default=str(base_path / "saved_records.db"), help="记录存储数据库文件")
+    parser.add_argument("--min-labels", type=int, default=1, help="新标签少于该数量时不更新")
+    parser.add_argument("--learning-rate", type=float, default=DEFAULT_LEARNING_RATE, help="SGD 学习率")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="小批量大小")
+    parser.add_argument("--publish", action="store_true", help="把更新后的模型发布为全局模型")
+    args = parser.parse_args(argv)
+
+    from record_store import RecordStore
+    learner = OnlineLearner(base_path, RecordStore(args.db), args.learning_rate, args.batch_size)
+    report = learner.update(args.min_labels)
+    if report is None:
+        print(f"新标签 {learner.pending_labels()} 条，未达到更新所需的 {args.min_labels} 条", file=sys.stderr)
+        return 0
+    print(f"已用 {report['labels']} 条新标签生成模型版本 online-{report['version']}，"
+          f"耗时 {report['seconds'] * 1000:.1f} 毫秒: {report['path']}", file=sys.stderr)
+    if args.publish:
+        print(f"已发布为全局模型: {learner.publish()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
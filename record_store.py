@@ -0,0 +1,305 @@
+import json
+import sqlite3
+import datetime
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 旧版记录中以字符串保存的 hazardAttack 标签
+LABEL_STRINGS = {"true": 1, "false": 0, "1": 1, "0": 0, "yes": 1, "no": 0}
+
+# 查询结果每页的默认记录数
+DEFAULT_PAGE_SIZE = 500
+
+# 二级索引：按车辆、消息ID和标签查找，以及它们与保存时间范围的组合。
+# SQLite 的索引项末尾隐含记录键，同一索引值下的记录天然按记录键（或保存时间、记录键）排列，
+# 各字段与时间范围的任意组合分页查询时都无需排序
+RECORD_INDEXES = {
+    "records_vehicle": "vehicle_id",
+    "records_vehicle_time": "vehicle_id, saved_timestamp",
+    "records_message": "message_id",
+    "records_message_time": "message_id, saved_timestamp",
+    "records_time": "saved_timestamp",
+    "records_hazard": "hazard_attack",
+    "records_hazard_time": "hazard_attack, saved_timestamp",
+}
+
+
+class RecordStore:
+    def __init__(self, db_path):
+        """
+            初始化基于 SQLite (WAL 模式) 的追加式记录存储。
+            每条记录以自增主键作为记录键，追加和读取最后一条记录都不需要重写整个文件。
+
+            db_path: SQLite 数据库文件路径。
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " saved_timestamp TEXT,"
+            " vehicle_id,"
+            " message_id TEXT,"
+            " hazard_attack INTEGER,"
+            " body TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # 标签日志：每次人工标注追加一行，按序号递增，增量学习据此只读取新产生的标签
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS labels ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " record_id INTEGER NOT NULL,"
+            " hazard_attack INTEGER NOT NULL)"
+        )
+        # 已有的存储第一次打开时会补建索引，只需全表扫描一次
+        for name, columns in RECORD_INDEXES.items():
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON records ({columns})")
+
+    def append(self, record: Dict) -> int:
+        """
+            追加一条记录。
+
+            record: 记录字典。
+            返回: 新记录的记录键。
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO records (saved_timestamp, vehicle_id, message_id, hazard_attack, body)"
+                " VALUES (?, ?, ?, ?, ?)",
+                self._index_values(record) + (json.dumps(record, ensure_ascii=False),)
+            )
+            return cursor.lastrowid
+
+    def append_many(self, records, meta: Optional[Dict[str, str]] = None) -> int:
+        """
+            在同一个事务中批量追加记录，可选地同时写入元数据标记。
+
+            records: 记录字典的可迭代对象。
+            meta: 需要与记录一起提交的元数据键值对。
+            返回: 追加的记录条数。
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.executemany(
+                    "INSERT INTO records (saved_timestamp, vehicle_id, message_id, hazard_attack, body)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (self._index_values(r) + (json.dumps(r, ensure_ascii=False),) for r in records)
+                )
+                for key, value in (meta or {}).items():
+                    self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount
+
+    def get(self, key: int) -> Optional[Dict]:
+        """按记录键读取一条记录，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT hazard_attack, body FROM records WHERE id = ?", (key,)).fetchone()
+        return self._to_record(row) if row else None
+
+    def get_last(self) -> Optional[Dict]:
+        """读取最后追加的一条记录，存储为空时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT hazard_attack, body FROM records ORDER BY id DESC LIMIT 1").fetchone()
+        return self._to_record(row) if row else None
+
+    def set_hazard_attack(self, key: int, hazard_attack: int) -> bool:
+        """
+            按记录键原地更新记录的 hazardAttack 标签，并在同一事务中追加一条标签日志。
+
+            key: 记录键。
+            hazard_attack: 标签值，1 表示攻击，0 表示正常。
+            返回: 是否找到并更新了该记录。
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                cursor = self._conn.execute("UPDATE records SET hazard_attack = ? WHERE id = ?",
+                                            (hazard_attack, key))
+                if cursor.rowcount > 0:
+                    self._conn.execute("INSERT INTO labels (record_id, hazard_attack) VALUES (?, ?)",
+                                       (key, hazard_attack))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return cursor.rowcount > 0
+
+    def labels_since(self, seq: int, limit: int) -> List[Tuple[int, Dict]]:
+        """
+            按标注顺序读取序号大于 seq 的标签日志，只访问新的标签，与记录总数无关。
+
+            seq: 已处理的最大标签序号。
+            limit: 最多读取的条数。
+            返回: (标签序号, 记录字典) 列表，记录的 hazardAttack 为该次标注的值。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT labels.seq, labels.hazard_attack, records.body FROM labels"
+                " JOIN records ON records.id = labels.record_id"
+                " WHERE labels.seq > ? ORDER BY labels.seq LIMIT ?",
+                (seq, limit)
+            ).fetchall()
+        return [(row[0], self._to_record(row[1:])) for row in rows]
+
+    def label_count_since(self, seq: int) -> int:
+        """返回序号大于 seq 的标签日志条数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM labels WHERE seq > ?", (seq,)).fetchone()[0]
+
+    def query_page(self, vehicle_id=None, message_id=None, since=None, until=None, hazard_attack=None,
+                   page_size=DEFAULT_PAGE_SIZE, after=None) -> Tuple[List[Tuple[int, Dict]], Optional[Tuple]]:
+        """
+            按索引字段查询一页记录，使用键集分页：下一页从上一页最后一条记录之后开始，翻页开销与页码无关。
+            没有时间范围时按记录键（保存顺序）排列；给出 since 或 until 时按 (保存时间, 记录键) 排列，
+            并只返回带有 savedTimestamp 的记录。
+
+            vehicle_id: 车辆ID，类型需与保存时一致（整数与字符串不相等）。
+            message_id: 消息ID。
+            since / until: 保存时间范围 [since, until)，可以是 datetime 或 ISO 格式字符串。
+            hazard_attack: 标签值，1 表示攻击，0 表示正常。
+            page_size: 每页的最大记录数。
+            after: 上一页返回的游标，None 表示第一页。
+            返回: ((记录键, 记录字典) 列表, 下一页游标)；没有更多记录时游标为 None。
+        """
+        by_time = since is not None or until is not None
+        conditions = []
+        params = []
+        for column, value in (("vehicle_id", vehicle_id), ("message_id", message_id),
+                              ("hazard_attack", hazard_attack)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("saved_timestamp >= ?")
+            params.append(self._timestamp_bound(since))
+        if until is not None:
+            conditions.append("saved_timestamp < ?")
+            params.append(self._timestamp_bound(until))
+        if after is not None:
+            conditions.append("(saved_timestamp, id) > (?, ?)" if by_time else "id > ?")
+            params.extend(after)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "saved_timestamp, id" if by_time else "id"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, saved_timestamp, hazard_attack, body FROM records{where} ORDER BY {order} LIMIT ?",
+                params + [page_size]
+            ).fetchall()
+        page = [(row[0], self._to_record(row[2:])) for row in rows]
+        if len(rows) < page_size:
+            return page, None
+        last = rows[-1]
+        return page, ((last[1], last[0]) if by_time else (last[0],))
+
+    def query(self, vehicle_id=None, message_id=None, since=None, until=None, hazard_attack=None,
+              page_size=DEFAULT_PAGE_SIZE) -> Iterator[List[Tuple[int, Dict]]]:
+        """
+            按页迭代满足条件的记录，参数与 query_page 相同。每页单独查询，迭代期间不持有锁，
+            期间追加的记录若排在当前位置之后也会被返回。
+
+            返回: 逐页产出 (记录键, 记录字典) 列表的迭代器。
+        """
+        after = None
+        while True:
+            page, after = self.query_page(vehicle_id, message_id, since, until, hazard_attack, page_size, after)
+            if page:
+                yield page
+            if after is None:
+                return
+
+    def count(self) -> int:
+        """返回存储中的记录条数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _index_values(record: Dict):
+        """
+            提取写入索引列的字段值。vehicleId 等字段保持原始类型，SQLite 无法保存的值（列表、字典、
+            超出 64 位的整数）转换为 JSON 字符串；无法识别的 hazardAttack 标签在索引列中记为空值，
+            记录正文保持原样，单条异常记录不会导致整批写入失败。
+        """
+        return (
+            RecordStore._index_value(record.get("savedTimestamp")),
+            RecordStore._index_value(record.get("vehicleId")),
+            RecordStore._index_value(record.get("messageID")),
+            RecordStore._label_value(record.get("hazardAttack")),
+        )
+
+    @staticmethod
+    def _index_value(value):
+        if value is None or isinstance(value, (str, float)):
+            return value
+        if isinstance(value, int) and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+    @staticmethod
+    def _label_value(value) -> Optional[int]:
+        """把 hazardAttack 标签规范为 1/0；支持布尔值、数字以及 "true"/"false"/"1"/"0" 等字符串"""
+        if isinstance(value, (bool, int, float)):
+            return 1 if value else 0
+        if isinstance(value, str):
+            return LABEL_STRINGS.get(value.strip().lower())
+        return None
+
+    @staticmethod
+    def _timestamp_bound(value) -> str:
+        """时间范围边界统一为 ISO 格式字符串，与 generate_complete_record 写入的 savedTimestamp 按字符串比较"""
+        if isinstance(value, datetime.datetime):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def _to_record(row) -> Dict:
+        """将数据库行还原为记录字典，hazardAttack 以索引列中的最新值为准"""
+        hazard_attack, body = row
+        record = json.loads(body)
+        if hazard_attack is not None:
+            record["hazardAttack"] = hazard_attack
+        return record
+
+
+def migrate_json_records(json_path, store: RecordStore) -> int:
+    """
+        将旧版 JSON 数组格式的记录文件一次性迁移到记录存储中。
+        迁移完成后会在存储中做标记，重复调用不会重复导入；原 JSON 文件保持不变。
+
+        json_path: 旧版记录文件路径（例如 saved_records.json）。
+        store: 目标记录存储。
+        返回: 本次迁移的记录条数。
+    """
+    json_path = Path(json_path)
+    if store.get_meta("migrated_from") is not None:
+        return 0
+    if not json_path.exists():
+        # 首次打开时没有旧版文件也做标记，之后放入的同名文件不会被导入到已在使用的存储中
+        store.set_meta("migrated_from", "")
+        return 0
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+
+    store.append_many(records, meta={"migrated_from": json_path.name})
+    return len(records)
@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from model_handler import atomic_write
+
+# 内存缓存的最大条目数
+DEFAULT_MAX_ENTRIES = 65536
+
+# 磁盘缓存最多保留的文件结果数，超出时删除最久未使用的
+DEFAULT_MAX_FILES = 32
+
+# 计算文件内容摘要时每次读取的字节数
+DIGEST_READ_SIZE = 1 << 20
+
+CACHE_FORMAT_VERSION = 1
+
+
+def model_key_of(state) -> Optional[str]:
+    """返回区分模型的缓存键：优先使用模型摘要，没有摘要时使用模型版本；两者都没有时返回 None"""
+    return state.sha256 or state.version
+
+
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+            按特征行缓存打分结果的有界 LRU 缓存，可在多个线程中共享。
+            键为 float32 特征行字节与模型键的摘要，值为 (预测类别, 攻击概率)。
+
+            max_entries: 最大条目数，超出时淘汰最久未使用的条目。
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def row_keys(matrix: np.ndarray, model_key: str) -> List[bytes]:
+        """
+            计算特征矩阵每一行的缓存键。
+            特征行先规范化为 float32，并把 -0.0 统一为 0.0，数值相等的行得到相同的键。
+        """
+        normalized = np.ascontiguousarray(matrix, dtype=np.float32) + np.float32(0.0)
+        suffix = model_key.encode("utf-8")
+        return [hashlib.blake2b(row.tobytes() + suffix, digest_size=16).digest() for row in normalized]
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[Tuple[int, float]]]:
+        """按键批量查找，返回与 keys 一一对应的缓存值，未命中的位置为 None"""
+        found = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                found.append(value)
+            hit_count = sum(value is not None for value in found)
+            self.hits += hit_count
+            self.misses += len(found) - hit_count
+        return found
+
+    def put_many(self, keys: List[bytes], values: List[Tuple[int, float]]):
+        """批量写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            for key, value in zip(keys, values):
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存条目，命中统计保留"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """返回缓存统计：hits、misses、hit_rate、size、max_entries"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+class FileResultCache:
+    def __init__(self, directory, max_files=DEFAULT_MAX_FILES):
+        """
+            按文件内容摘要保存整个文件分析结果的磁盘缓存。
+            同一模型重新分析内容相同的文件时直接还原结果，跳过解析和打分。
+
+            directory: 缓存目录，不存在时自动创建。
+            max_files: 最多保留的文件结果数。
+        """
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    @staticmethod
+    def file_digest(filepath) -> str:
+        """计算文件内容的 SHA-256 十六进制摘要"""
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            while True:
+                block = f.read(DIGEST_READ_SIZE)
+                if not block:
+                    return digest.hexdigest()
+                digest.update(block)
+
+    def entry_path(self, file_digest: str, model_key: str) -> Path:
+        model_digest = hashlib.sha256(model_key.encode("utf-8")).hexdigest()[:16]
+        return self.directory / f"{file_digest}-{model_digest}.npz"
+
+    def load(self, file_digest: str, model_key: str):
+        """
+            读取缓存的分析结果。
+
+            返回: (预测类别数组, 攻击概率数组, 车辆ID列表, 错误信息列表)；未命中或缓存文件损坏时返回 None。
+        """
+        path = self.entry_path(file_digest, model_key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                header = json.loads(data["header"].tobytes().decode("utf-8"))
+                if header["format"] != CACHE_FORMAT_VERSION or header["model_key"] != model_key:
+                    return None
+                vehicle_ids = (data["vehicle_ids"].tolist() if header["vehicle_ids"] is None
+                               else header["vehicle_ids"])
+                entry = data["predictions"], data["attack_probs"], vehicle_ids, header["errors"]
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)  # 更新修改时间，淘汰时按最久未使用处理
+        except OSError:
+            pass  # 缓存文件刚被其他分析淘汰，已读取的结果仍然有效
+        return entry
+
+    def store(self, file_digest: str, model_key: str, results: List[Dict], errors: List[str]):
+        """
+            保存一个文件的分析结果。车辆ID全部为整数时以整数数组保存，否则以 JSON 保存以保留原始类型。
+            先写入名称唯一的临时文件再原子替换，同时分析同一文件的多个线程或进程互不干扰。
+
+            file_digest: 文件内容摘要。
+            model_key: 分析所用模型的缓存键。
+            results: 分析结果列表。
+            errors: 分析过程中产生的错误信息。
+            异常: 写入失败时抛出 OSError；车辆ID无法以 JSON 保存时抛出 TypeError 或 ValueError。
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vehicle_ids = [r["vehicle_id"] for r in results]
+        all_ints = all(type(v) is int and -2 ** 63 <= v < 2 ** 63 for v in vehicle_ids)
+        header = {
+            "format": CACHE_FORMAT_VERSION,
+            "model_key": model_key,
+            "errors": errors,
+            "vehicle_ids": None if all_ints else vehicle_ids
+        }
+        arrays = {
+            "header": np.frombuffer(json.dumps(header, ensure_ascii=False).encode("utf-8"), dtype=np.uint8),
+            "predictions": np.fromiter((r["prediction"] for r in results), dtype=np.int64, count=len(results)),
+            "attack_probs": np.fromiter((r["attack_prob"] for r in results), dtype=np.float64, count=len(results)),
+            "vehicle_ids": np.asarray(vehicle_ids if all_ints else [], dtype=np.int64)
+        }
+        atomic_write(self.entry_path(file_digest, model_key), lambda f: np.savez(f, **arrays))
+        self._prune()
+
+    def _prune(self):
+        """删除超出 max_files 的最久未使用的缓存文件"""
+        entries = []
+        for path in self.directory.glob("*.npz"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                pass  # 其他分析同时淘汰了该文件
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_files:]:
+            path.unlink(missing_ok=True)
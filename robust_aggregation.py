@@ -0,0 +1,97 @@
+import numpy as np
+
+
+def _weighted_mean(updates: np.ndarray, sample_counts: np.ndarray) -> np.ndarray:
+    weights = np.asarray(sample_counts, dtype=np.float64)
+    return weights @ updates / weights.sum()
+
+
+class CoordinateMedianAggregator:
+    """逐坐标中位数：每个参数取所有客户端更新的中位数，不受少数极端值影响"""
+
+    def aggregate(self, updates: np.ndarray, sample_counts: np.ndarray) -> np.ndarray:
+        return np.median(updates, axis=0)
+
+
+class TrimmedMeanAggregator:
+    def __init__(self, trim_ratio=0.1):
+        """
+            逐坐标截尾均值：每个参数去掉最大和最小的各 trim_ratio 比例的客户端更新后取平均。
+
+            trim_ratio: 每一侧去掉的比例，必须小于 0.5。
+        """
+        if not 0.0 <= trim_ratio < 0.5:
+            raise ValueError("trim_ratio 必须在 [0, 0.5) 范围内")
+        self.trim_ratio = trim_ratio
+
+    def aggregate(self, updates: np.ndarray, sample_counts: np.ndarray) -> np.ndarray:
+        trimmed = int(len(updates) * self.trim_ratio)
+        ordered = np.sort(updates, axis=0)
+        return ordered[trimmed:len(updates) - trimmed].mean(axis=0)
+
+
+class KrumAggregator:
+    def __init__(self, num_malicious=0, num_selected=1):
+        """
+            Krum/Multi-Krum：为每个更新计算它到最近的 n - f - 2 个其他更新的平方距离之和，
+            选出得分最低的 num_selected 个更新按样本数加权平均。num_selected 为 1 时即 Krum。
+            两两距离通过 Gram 矩阵一次性计算。
+
+            num_malicious: 假定的恶意客户端数 f。
+            num_selected: 参与平均的更新数 m。
+        """
+        self.num_malicious = num_malicious
+        self.num_selected = num_selected
+
+    def scores(self, updates: np.ndarray) -> np.ndarray:
+        """返回每个更新的 Krum 得分"""
+        count = len(updates)
+        neighbours = max(1, count - self.num_malicious - 2)
+        if count <= neighbours:
+            return np.zeros(count)
+        squared_norms = np.einsum("ij,ij->i", updates, updates)
+        distances = squared_norms[:, None] + squared_norms[None, :] - 2.0 * (updates @ updates.T)
+        np.maximum(distances, 0.0, out=distances)
+        np.fill_diagonal(distances, np.inf)
+        return np.partition(distances, neighbours - 1, axis=1)[:, :neighbours].sum(axis=1)
+
+    def aggregate(self, updates: np.ndarray, sample_counts: np.ndarray) -> np.ndarray:
+        selected = np.argsort(self.scores(updates), kind="stable")[:max(1, self.num_selected)]
+        return _weighted_mean(updates[selected], np.asarray(sample_counts)[selected])
+
+
+class NormClippingAggregator:
+    def __init__(self, max_norm=None, inner=None):
+        """
+            范数裁剪：把 L2 范数超过阈值的更新按比例缩小到阈值，再交给内层聚合器。
+
+            max_norm: 裁剪阈值；None 表示每轮取所有更新范数的中位数。
+            inner: 内层聚合器，默认为按样本数加权平均。
+        """
+        self.max_norm = max_norm
+        self.inner = inner
+
+    def aggregate(self, updates: np.ndarray, sample_counts: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(updates, axis=1)
+        max_norm = float(np.median(norms)) if self.max_norm is None else self.max_norm
+        scale = np.minimum(1.0, max_norm / np.maximum(norms, 1e-12))
+        clipped = updates * scale[:, None]
+        if self.inner is None:
+            return _weighted_mean(clipped, sample_counts)
+        return self.inner.aggregate(clipped, sample_counts)
+
+
+def multi_krum(num_malicious=0, num_selected=None, num_clients=None) -> KrumAggregator:
+    """创建 Multi-Krum 聚合器；num_selected 默认为 n - f（需要提供 num_clients）"""
+    if num_selected is None:
+        num_selected = max(1, (num_clients or 1) - num_malicious)
+    return KrumAggregator(num_malicious, num_selected)
+
+
+ROBUST_AGGREGATORS = {
+    "median": CoordinateMedianAggregator,
+    "trimmed_mean": TrimmedMeanAggregator,
+    "krum": KrumAggregator,
+    "multi_krum": multi_krum,
+    "norm_clip": NormClippingAggregator
+}
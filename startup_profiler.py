@@ -0,0 +1,86 @@
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+# 进程内的计时起点：本模块应作为 app.py 的第一个导入
+_process_start = time.perf_counter()
+
+
+class StartupProfiler:
+    def __init__(self):
+        """
+            启动耗时分析器。记录各模块导入和各启动阶段（窗口创建、模型加载、控件构建、图片解码等）的耗时。
+            未启用时 phase 和 import_module 几乎没有额外开销。
+        """
+        self.enabled = False
+        self.records = []
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    @contextmanager
+    def phase(self, name: str, kind: str = "phase"):
+        """
+            记录一个启动阶段的耗时。
+
+            name: 阶段名称。
+            kind: 记录类型，"phase" 表示启动阶段，"import" 表示模块导入。
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.records.append((kind, name, started - _process_start, finished - started,
+                                     threading.current_thread().name))
+
+    def import_module(self, name: str):
+        """
+            导入模块并记录耗时；已导入过的模块直接返回，不计入记录。
+
+            name: 模块名称。
+            返回: 导入的模块对象。
+        """
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        with self.phase(name, "import"):
+            return importlib.import_module(name)
+
+    def mark(self, name: str):
+        """记录一个时间点，例如主窗口可见的时刻"""
+        if self.enabled:
+            with self._lock:
+                self.marks.setdefault(name, time.perf_counter() - _process_start)
+
+    def report(self, stream=None) -> str:
+        """
+            生成启动耗时报告，并在提供 stream 时写入其中。
+
+            stream: 可选的输出流，例如 sys.stderr。
+            返回: 报告文本。
+        """
+        with self._lock:
+            records = sorted(self.records, key=lambda record: record[2])
+            marks = sorted(self.marks.items(), key=lambda item: item[1])
+        lines = ["启动耗时分析（单位：毫秒）", f"{'类型':<8}{'开始':>10}{'耗时':>10}  {'线程':<20}名称"]
+        for kind, name, started, duration, thread_name in records:
+            lines.append(f"{kind:<8}{started * 1000:>10.1f}{duration * 1000:>10.1f}  {thread_name:<20}{name}")
+        for name, at in marks:
+            lines.append(f"{'mark':<8}{at * 1000:>10.1f}{'':>10}  {'':<20}{name}")
+        text = "\n".join(lines)
+        if stream is not None:
+            print(text, file=stream, flush=True)
+        return text
+
+
+# 全局启动耗时分析器，由 app.py 的 --profile-startup 参数启用
+profiler = StartupProfiler()
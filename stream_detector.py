@@ -0,0 +1,336 @@
+import sys
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List
+from metrics import metrics
+
+# data_processor 等被计时的模块在 main 解析 --metrics-port 之后才导入，
+# 导入本模块本身不读取命令行参数，也不会改变指标采集的状态
+base_path = Path(__file__).parent
+
+# 默认的滑动窗口长度（每辆车保留的最近预测条数）
+DEFAULT_WINDOW_SIZE = 100
+# 车辆窗口内至少有多少条消息后才开始评级，避免第一条攻击消息就把车辆判为恶意
+DEFAULT_MIN_MESSAGES = 10
+# 微批次的最大消息数和最长等待时间（秒）
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_BATCH_TIMEOUT = 0.002
+# 最多同时保留滑动窗口的车辆数，超出时淘汰最久没有消息的车辆，长时间运行时内存不随车辆ID的更替无限增长
+DEFAULT_MAX_VEHICLES = 100000
+
+
+class VehicleWindow:
+    __slots__ = ("buffer", "position", "count", "attacks", "rating")
+
+    def __init__(self, window_size: int):
+        """
+            单辆车的预测滑动窗口，使用定长环形缓冲区保存最近的预测结果。
+
+            window_size: 窗口长度。
+        """
+        self.buffer = bytearray(window_size)
+        self.position = 0
+        self.count = 0
+        self.attacks = 0
+        self.rating = "normal"
+
+    def push(self, is_attack: int) -> float:
+        """
+            写入一条新的预测结果，覆盖窗口中最旧的一条。
+
+            is_attack: 1 表示攻击，0 表示正常。
+            返回: 更新后的窗口攻击比例。
+        """
+        size = len(self.buffer)
+        if self.count == size:
+            self.attacks -= self.buffer[self.position]
+        else:
+            self.count += 1
+        self.buffer[self.position] = is_attack
+        self.attacks += is_attack
+        self.position = (self.position + 1) % size
+        return self.attacks / self.count
+
+
+class StreamingDetector:
+    def __init__(self, data_processor, window_size=DEFAULT_WINDOW_SIZE, min_messages=DEFAULT_MIN_MESSAGES,
+                 on_rating_change=None, max_vehicles=DEFAULT_MAX_VEHICLES):
+        """
+            实时流检测器。按微批次对消息打分，并为每辆车维护最近预测的滑动窗口；
+            车辆窗口内的攻击比例越过恶意/嫌疑阈值时立即更新评级。
+
+            data_processor: 数据处理器实例，用于特征提取和打分。
+            window_size: 每辆车滑动窗口的长度。
+            min_messages: 窗口内至少有多少条消息后才开始评级。
+            on_rating_change: 车辆评级变化时的回调，参数为 (车辆ID, 新评级, 窗口攻击比例, 窗口消息数)。
+            max_vehicles: 最多保留滑动窗口的车辆数，超出时淘汰最久没有消息的车辆。
+        """
+        self.data_processor = data_processor
+        self.window_size = window_size
+        self.min_messages = min_messages
+        self.on_rating_change = on_rating_change
+        self.max_vehicles = max_vehicles
+        # 按最近收到消息的先后排列，最久没有消息的车辆在最前面
+        self.windows: "OrderedDict[object, VehicleWindow]" = OrderedDict()
+        self.messages_processed = 0
+        self.batches_processed = 0
+        self.processing_seconds = 0.0
+
+    def process_batch(self, records: List[Dict]) -> List[Dict]:
+        """
+            对一个微批次的消息打分并更新各车辆的滑动窗口。
+
+            records: 消息记录字典列表。
+            返回: 每条成功打分的消息对应的结果字典，包含 vehicle_id、prediction、attack_prob、
+                  window_attack_ratio、rating 和 model_version。
+        """
+        from data_processor import MALICIOUS_RATIO, SUSPICIOUS_RATIO, vehicle_id_of
+        started = time.perf_counter()
+        predictions, attack_probs, kept, state = self.data_processor.score_records(records)
+        if not len(kept):
+            return []
+
+        outputs = []
+        windows = self.windows
+        for row, prediction, attack_prob in zip(kept.tolist(), predictions.tolist(), attack_probs.tolist()):
+            vehicle_id = vehicle_id_of(records[row])
+            window = windows.get(vehicle_id)
+            if window is None:
+                window = windows[vehicle_id] = VehicleWindow(self.window_size)
+                if len(windows) > self.max_vehicles:
+                    windows.popitem(last=False)
+            else:
+                windows.move_to_end(vehicle_id)
+            is_attack = 1 if prediction == 1 else 0
+            ratio = window.push(is_attack)
+
+            if window.count >= self.min_messages:
+                if ratio >= MALICIOUS_RATIO:
+                    rating = "malicious"
+                elif ratio >= SUSPICIOUS_RATIO:
+                    rating = "suspicious"
+                else:
+                    rating = "normal"
+                if rating != window.rating:
+                    window.rating = rating
+                    if self.on_rating_change:
+                        self.on_rating_change(vehicle_id, rating, ratio, window.count)
+
+            outputs.append({
+                "vehicle_id": vehicle_id,
+                "prediction": int(prediction),
+                "attack_prob": float(attack_prob),
+                "window_attack_ratio": ratio,
+                "rating": window.rating,
+                "model_version": state.version
+            })
+
+        self.messages_processed += len(outputs)
+        self.batches_processed += 1
+        self.processing_seconds += time.perf_counter() - started
+        return outputs
+
+    def vehicle_ratings(self) -> Dict[object, Dict]:
+        """返回所有车辆当前的窗口统计和评级"""
+        return {
+            vehicle_id: {
+                "messages": window.count,
+                "attacks": window.attacks,
+                "attack_ratio": window.attacks / window.count if window.count else 0.0,
+                "rating": window.rating
+            }
+            for vehicle_id, window in self.windows.items()
+        }
+
+
+def report_error(message: str):
+    """实时流模式下的错误提示：输出到标准错误，检测继续进行"""
+    print(f"错误: {message}", file=sys.stderr, flush=True)
+
+
+def parse_messages(payload: bytes, on_error=report_error) -> List[Dict]:
+    """
+        解析一个数据报或一行文本中的消息。
+        支持单个 JSON 对象、JSON 数组以及按行分隔的多个 JSON 对象。
+        格式错误的行和不是 JSON 对象的值会被跳过并通过 on_error 报告，同一批次中的其他消息不受影响。
+    """
+    messages = []
+    for line in payload.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:  # 包括 json.JSONDecodeError 和 UnicodeDecodeError
+            on_error(f"无法解析的消息已跳过: {e}")
+            continue
+        for message in value if isinstance(value, list) else [value]:
+            if isinstance(message, dict):
+                messages.append(message)
+            else:
+                on_error(f"消息不是 JSON 对象，已跳过: {str(message)[:100]}")
+    return messages
+
+
+class UdpMessageSource:
+    def __init__(self, host: str, port: int):
+        """
+            从本地 UDP 套接字接收 CAM/BSM 消息，每个数据报包含一条或多条 JSON 消息。
+
+            host: 监听地址。
+            port: 监听端口。
+        """
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+        self.sock.bind((host, port))
+
+    def read_batch(self, max_messages: int, timeout: float) -> List[Dict]:
+        """
+            读取一个微批次：最多等待 timeout 秒收到第一条消息，之后不再阻塞，尽量取满 max_messages 条。
+        """
+        messages = []
+        self.sock.settimeout(timeout)
+        try:
+            messages.extend(parse_messages(self.sock.recv(65535)))
+            self.sock.setblocking(False)
+            while len(messages) < max_messages:
+                messages.extend(parse_messages(self.sock.recv(65535)))
+        except (BlockingIOError, socket.timeout):
+            pass
+        return messages
+
+    def close(self):
+        self.sock.close()
+
+
+class PipeMessageSource:
+    def __init__(self, path):
+        """
+            从命名管道、普通文件或标准输入逐行读取 JSON 消息（路径为 "-" 时读取标准输入）。
+            读取在后台线程中进行，read_batch 从队列中按微批次取出消息。
+
+            path: 命名管道或文件路径。
+        """
+        self.path = path
+        self.lines = queue.Queue(maxsize=100000)
+        self.finished = threading.Event()
+        threading.Thread(target=self._read_lines, daemon=True).start()
+
+    def _read_lines(self):
+        stream = sys.stdin.buffer if self.path == "-" else open(self.path, 'rb')
+        try:
+            for line in stream:
+                self.lines.put(line)
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+            self.finished.set()
+
+    def read_batch(self, max_messages: int, timeout: float) -> List[Dict]:
+        messages = []
+        try:
+            messages.extend(parse_messages(self.lines.get(timeout=timeout)))
+            while len(messages) < max_messages:
+                messages.extend(parse_messages(self.lines.get_nowait()))
+        except queue.Empty:
+            pass
+        return messages
+
+    def exhausted(self) -> bool:
+        return self.finished.is_set() and self.lines.empty()
+
+    def close(self):
+        pass
+
+
+def run_stream(source, detector: StreamingDetector, batch_size=DEFAULT_BATCH_SIZE,
+               batch_timeout=DEFAULT_BATCH_TIMEOUT, stop_event=None):
+    """
+        持续从消息源读取微批次并交给检测器处理，直到 stop_event 被设置或消息源读完。
+
+        source: UdpMessageSource 或 PipeMessageSource 实例。
+        detector: 实时流检测器。
+        batch_size: 微批次的最大消息数。
+        batch_timeout: 等待凑满一个微批次的最长时间（秒）。
+        stop_event: 可选的 threading.Event，用于停止检测。
+    """
+    while stop_event is None or not stop_event.is_set():
+        messages = source.read_batch(batch_size, batch_timeout)
+        if messages:
+            detector.process_batch(messages)
+        elif getattr(source, "exhausted", lambda: False)():
+            return
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="实时流检测模式：从 UDP 套接字或命名管道持续读取消息并评级车辆")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--udp", metavar="HOST:PORT", help="监听的 UDP 地址，例如 127.0.0.1:9999")
+    group.add_argument("--pipe", metavar="PATH", help="逐行读取 JSON 消息的命名管道或文件，'-' 表示标准输入")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_SIZE, help="每辆车滑动窗口的长度")
+    parser.add_argument("--min-messages", type=int, default=DEFAULT_MIN_MESSAGES, help="开始评级所需的最少消息数")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="微批次的最大消息数")
+    parser.add_argument("--batch-timeout-ms", type=float, default=DEFAULT_BATCH_TIMEOUT * 1000,
+                        help="凑满一个微批次的最长等待时间（毫秒）")
+    parser.add_argument("--max-vehicles", type=int, default=DEFAULT_MAX_VEHICLES,
+                        help="最多保留滑动窗口的车辆数，超出时淘汰最久没有消息的车辆")
+    parser.add_argument("--watch-model", action="store_true",
+                        help="监视 saved_models 目录，发布新的全局模型时自动热更新")
+    parser.add_argument("--metrics-port", type=int,
+                        help="启用热路径耗时指标，并在本机该端口提供 Prometheus 文本格式的 /metrics 端点")
+    args = parser.parse_args(argv)
+
+    # 指标采集需要在导入被计时的模块之前启用
+    if args.metrics_port is not None:
+        metrics.enable()
+        metrics.serve(args.metrics_port)
+    from model_handler import ModelHandler, ModelWatcher
+    from data_processor import DataProcessor
+    model, metadata = ModelHandler.load_model(base_path)
+    data_processor = DataProcessor(model, metadata)
+
+    def print_rating_change(vehicle_id, rating, ratio, count):
+        print(json.dumps({"vehicle_id": vehicle_id, "rating": rating, "window_attack_ratio": round(ratio, 4),
+                          "window_messages": count}, ensure_ascii=False), flush=True)
+
+    def report_model_swap(new_model, new_metadata):
+        data_processor.swap_model(new_model, new_metadata)
+        print(f"已切换到新模型，版本 {new_metadata.get('model_version')}", file=sys.stderr, flush=True)
+
+    model_watcher = None
+    if args.watch_model:
+        model_watcher = ModelWatcher(base_path, report_model_swap,
+                                     on_error=lambda message: print(message, file=sys.stderr, flush=True),
+                                     current_sha256=metadata.get("model_sha256"))
+        model_watcher.start()
+
+    detector = StreamingDetector(data_processor, args.window, args.min_messages, print_rating_change,
+                                 args.max_vehicles)
+    if args.udp:
+        host, port = args.udp.rsplit(":", 1)
+        source = UdpMessageSource(host, int(port))
+    else:
+        source = PipeMessageSource(args.pipe)
+
+    try:
+        run_stream(source, detector, args.batch_size, args.batch_timeout_ms / 1000)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+        if model_watcher:
+            model_watcher.stop()
+        if detector.messages_processed:
+            print(f"已处理 {detector.messages_processed} 条消息，平均每条耗时 "
+                  f"{detector.processing_seconds / detector.messages_processed * 1e6:.1f} 微秒",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
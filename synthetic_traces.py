@@ -0,0 +1,167 @@
+import sys
+import json
+import argparse
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# 合成攻击类型：位置伪造、速度伪造和航向伪造
+ATTACK_TYPES = ("RandomPosition", "HighSpeed", "HeadingMismatch")
+
+# 每次向量化生成的记录数
+GENERATE_BLOCK_SIZE = 10000
+
+
+def iter_synthetic_records(count: int, vehicles=100, roads=20, attacker_ratio=0.1, attack_rate=0.5,
+                           seed=0) -> Iterator[Dict]:
+    """
+        生成与 saved_records.json 格式一致、带攻击标签的合成 CAM 消息，用于联邦训练和性能测试。
+        攻击车辆的消息按 attack_rate 的概率被伪造，伪造消息的 hazardAttack 为 1，EventType 为攻击类型。
+
+        count: 生成的记录数。
+        vehicles: 车辆数。
+        roads: 道路数，每辆车固定行驶在一条道路上（RoadID 为 "road_<编号>"）。
+        attacker_ratio: 攻击车辆所占比例。
+        attack_rate: 攻击车辆每条消息被伪造的概率。
+        seed: 随机种子，相同参数和种子生成的记录完全相同。
+    """
+    rng = np.random.default_rng(seed)
+    vehicle_road = rng.integers(0, roads, size=vehicles)
+    vehicle_attacker = rng.random(vehicles) < attacker_ratio
+    vehicle_heading = rng.uniform(-np.pi, np.pi, size=vehicles)
+    vehicle_max_speed = rng.uniform(50.0, 70.0, size=vehicles).round()
+    vehicle_max_deceleration = rng.uniform(4.0, 9.0, size=vehicles).round()
+    road_origin = rng.uniform(0.0, 10000.0, size=(roads, 2))
+
+    produced = 0
+    while produced < count:
+        size = min(GENERATE_BLOCK_SIZE, count - produced)
+        vehicle = rng.integers(0, vehicles, size=size)
+        attack = vehicle_attacker[vehicle] & (rng.random(size) < attack_rate)
+        attack_type = rng.integers(0, len(ATTACK_TYPES), size=size)
+
+        heading = vehicle_heading[vehicle] + rng.normal(0.0, 0.05, size=size)
+        speed = rng.uniform(0.0, 1.0, size=size) * vehicle_max_speed[vehicle] / 3.6
+        travelled = rng.uniform(0.0, 2000.0, size=size)
+        pos = road_origin[vehicle_road[vehicle]] + travelled[:, None] * np.column_stack((np.cos(heading),
+                                                                                      np.sin(heading)))
+        pos_noise = np.abs(rng.normal(4.0, 0.5, size=(size, 2)))
+        spd_noise = rng.normal(0.0, 0.003, size=(size, 2))
+        hed_noise = np.abs(rng.normal(10.0, 5.0, size=(size, 2)))
+        acl = rng.normal(0.0, 0.3, size=size)
+        hed = heading.copy()
+
+        # 位置伪造：上报的位置随机跳变，定位误差显著增大
+        forged = attack & (attack_type == 0)
+        pos[forged] = rng.uniform(0.0, 20000.0, size=(int(forged.sum()), 2))
+        pos_noise[forged] *= rng.uniform(5.0, 20.0, size=(int(forged.sum()), 1))
+        # 速度伪造：上报速度超过车辆最高速度，速度误差增大
+        forged = attack & (attack_type == 1)
+        speed[forged] = vehicle_max_speed[vehicle[forged]] / 3.6 * rng.uniform(1.5, 3.0, size=int(forged.sum()))
+        spd_noise[forged] = np.abs(spd_noise[forged]) * 500.0
+        # 航向伪造：上报航向与行驶方向不一致
+        forged = attack & (attack_type == 2)
+        hed[forged] += rng.uniform(np.pi / 2, 3 * np.pi / 2, size=int(forged.sum()))
+        hed_noise[forged] *= rng.uniform(3.0, 10.0, size=(int(forged.sum()), 1))
+
+        spd = speed[:, None] * np.column_stack((np.cos(heading), np.sin(heading)))
+        hed_vector = np.column_stack((np.cos(hed), np.sin(hed)))
+        acl_vector = acl[:, None] * np.column_stack((np.cos(heading), np.sin(heading)))
+        gps = np.abs(rng.normal(5.0, 2.0, size=(size, 2)))
+        lane_index = rng.integers(0, 4, size=size)
+        lane_position = rng.uniform(0.0, 1000.0, size=size).round()
+        hazard_percentage = rng.integers(0, 101, size=size)
+        send_time = (produced + np.arange(size)) * 0.1
+
+        columns = (vehicle.tolist(), attack.tolist(), attack_type.tolist(), vehicle_road[vehicle].tolist(),
+                   pos.tolist(), pos_noise.tolist(), spd.tolist(), spd_noise.tolist(), acl_vector.tolist(),
+                   hed_vector.tolist(), hed_noise.tolist(), gps.tolist(), lane_index.tolist(),
+                   lane_position.tolist(), hazard_percentage.tolist(), vehicle_max_speed[vehicle].tolist(),
+                   vehicle_max_deceleration[vehicle].tolist(), send_time.tolist())
+        for offset, (vehicle_id, is_attack, kind, road, p, pn, s, sn, a, h, hn, g, lane, lane_pos, hazard,
+                     max_speed, max_deceleration, sent) in enumerate(zip(*columns)):
+            yield {
+                "rcvTime": sent + 0.001,
+                "sendTime": sent,
+                "sender": vehicle_id,
+                "vehicleId": vehicle_id,
+                "EventID": 0,
+                "pos": [p[0], p[1], 0.0],
+                "spd": [s[0], s[1], 0.0],
+                "acl": [a[0], a[1], 0.0],
+                "hed": [h[0], h[1], 0.0],
+                "pos_noise": [pn[0], pn[1], 0.0],
+                "spd_noise": [sn[0], sn[1], 0.0],
+                "acl_noise": [0.0, 0.0, 0.0],
+                "hed_noise": [hn[0], hn[1], 0.0],
+                "sender_GPS": [g[0], g[1], 0.0],
+                "currentDirection": [h[0], h[1], 0.0],
+                "laneIndex": lane,
+                "lanePosition": lane_pos,
+                "maxSpeed": max_speed,
+                "maxDeceleration": max_deceleration,
+                "hazardOccurrencePercentage": hazard,
+                "type": "CAM",
+                "senderPseudo": f"PSEUDO_{vehicle_id}",
+                "exchangedMessageType": "CAM",
+                "EventType": ATTACK_TYPES[kind] if is_attack else "Normal",
+                "RoadID": f"road_{road}",
+                "hazardOccurrence": False,
+                "hazardAttack": 1 if is_attack else 0,
+                "messageID": f"MSG_{produced + offset}"
+            }
+        produced += size
+
+
+def generate_synthetic_records(count: int, **kwargs) -> List[Dict]:
+    """生成合成记录列表，参数同 iter_synthetic_records"""
+    return list(iter_synthetic_records(count, **kwargs))
+
+
+def write_records(path, records) -> int:
+    """
+        把记录写入文件：扩展名为 .jsonl 时写出 JSON Lines，否则写出 JSON 数组。
+
+        path: 输出文件路径。
+        records: 记录字典的可迭代对象。
+        返回: 写出的记录数。
+    """
+    path = Path(path)
+    json_lines = path.suffix.lower() == ".jsonl"
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        if not json_lines:
+            f.write("[\n")
+        for record in records:
+            if json_lines:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+            else:
+                f.write(",\n" if written else "")
+                f.write(json.dumps(record, ensure_ascii=False))
+            written += 1
+        if not json_lines:
+            f.write("\n]\n")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成带攻击标签的合成 CAM 消息记录")
+    parser.add_argument("out", help="输出文件（.json 为 JSON 数组，.jsonl 为 JSON Lines）")
+    parser.add_argument("--records", type=int, default=100000, help="生成的记录数")
+    parser.add_argument("--vehicles", type=int, default=100, help="车辆数")
+    parser.add_argument("--roads", type=int, default=20, help="道路数")
+    parser.add_argument("--attacker-ratio", type=float, default=0.1, help="攻击车辆所占比例")
+    parser.add_argument("--attack-rate", type=float, default=0.5, help="攻击车辆每条消息被伪造的概率")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    written = write_records(args.out, iter_synthetic_records(
+        args.records, vehicles=args.vehicles, roads=args.roads, attacker_ratio=args.attacker_ratio,
+        attack_rate=args.attack_rate, seed=args.seed))
+    print(f"已生成 {written} 条记录: {args.out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import datetime
+import threading
+
+import numpy as np
+import pytest
+
+from binary_records import BinaryRecordFile, export_records, score_file
+from data_processor import DataProcessor
+from model_handler import LinearModelEngine
+
+METADATA = {"feature_columns": ["a", "b", "pos_1"], "model_sha256": "abc", "model_version": "v1"}
+
+
+def make_processor():
+    return DataProcessor(LinearModelEngine(np.array([1.0, -1.0, 0.5]), 0.0, [0, 1]), METADATA)
+
+
+def make_records(count):
+    rng = np.random.default_rng(0)
+    records = []
+    for row in range(count):
+        a, b, pos = rng.normal(size=3).tolist()
+        records.append({"a": a, "b": b, "pos": [0.0, pos, 0.0], "vehicleId": f"V{row % 7}",
+                        "hazardAttack": row % 3 == 0})
+    return records
+
+
+def test_export_and_rescore_match_record_analysis(tmp_path):
+    processor = make_processor()
+    records = make_records(500) + [{"a": "x", "vehicleId": None}]
+    path = tmp_path / "records.vrec"
+    assert export_records(records, path, processor, chunk_size=64) == len(records)
+    assert [p.name for p in tmp_path.iterdir()] == ["records.vrec"]
+
+    expected, expected_counts = processor.analyze_file_data(records)
+    results, vehicle_attack_counts = processor.analyze_binary_file(path)
+    assert results == expected
+    assert vehicle_attack_counts == expected_counts
+
+    binary_file = BinaryRecordFile(path)
+    assert binary_file.records["hazard_attack"][:3].tolist() == [1, 0, 0]
+    assert binary_file.records["hazard_attack"][-1] == -1
+
+
+def test_timestamps_accept_numbers_and_iso_strings(tmp_path):
+    saved = datetime.datetime(2025, 1, 2, 3, 4, 5)
+    records = [
+        {"sendTime": 12.5, "rcvTime": "13.5", "savedTimestamp": saved.isoformat()},
+        {"sendTime": "2025-01-02T03:04:05+00:00", "rcvTime": "not a time"},
+    ]
+    path = tmp_path / "times.vrec"
+    export_records(records, path, make_processor())
+    rows = BinaryRecordFile(path).records
+    assert rows["send_time"].tolist() == [12.5, 1735787045.0]
+    assert rows["rcv_time"][0] == 13.5 and np.isnan(rows["rcv_time"][1])
+    assert rows["saved_time"][0] == saved.timestamp() and np.isnan(rows["saved_time"][1])
+
+
+def test_vehicle_summary_from_codes_matches_summary_from_results(tmp_path):
+    processor = make_processor()
+    path = tmp_path / "records.vrec"
+    export_records(make_records(300), path, processor)
+    predictions, _, vehicles, vehicle_table, _ = processor.score_binary_file(path)
+    from_codes = processor.summarize_vehicle_codes(vehicles, predictions == 1, vehicle_table)
+    from_results = processor.summarize_by_vehicle(processor.analyze_binary_file(path)[0])
+    assert from_codes.keys() == from_results.keys()
+    for column in from_codes:
+        assert from_codes[column].tolist() == from_results[column].tolist()
+
+
+def test_cancelled_rescoring_omits_unscored_vehicles(tmp_path):
+    processor = make_processor()
+    path = tmp_path / "records.vrec"
+    records = make_records(100) + [{"a": 1.0, "vehicleId": "late"}]
+    export_records(records, path, processor)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    predictions, _, vehicles, vehicle_table, _ = score_file(processor, BinaryRecordFile(path), slice_rows=50,
+                                                            cancel_event=cancel_event)
+    assert len(predictions) == 50
+    summary = processor.summarize_vehicle_codes(vehicles, predictions == 1, vehicle_table)
+    assert "late" not in summary["vehicle_id"].tolist()
+    assert summary["total"].sum() == len(predictions)
+
+
+def test_incomplete_file_is_rejected(tmp_path):
+    path = tmp_path / "records.vrec"
+    export_records(make_records(10), path, make_processor())
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        BinaryRecordFile(path)
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import columnar_io
+from data_processor import DataProcessor
+from model_handler import LinearModelEngine
+
+METADATA = {"feature_columns": ["laneIndex", "pos_0", "pos_2", "spd_1"], "model_sha256": "abc",
+            "model_version": "v1"}
+
+
+def make_processor():
+    return DataProcessor(LinearModelEngine(np.array([0.5, 0.01, -0.02, 0.3]), -0.1, [0, 1]), METADATA)
+
+
+def make_records(count):
+    rng = np.random.default_rng(0)
+    records = []
+    for row in range(count):
+        records.append({"vehicleId": row % 9, "laneIndex": int(rng.integers(0, 4)),
+                        "pos": rng.normal(scale=100.0, size=3).tolist(), "spd": rng.normal(size=3).tolist(),
+                        "hazardAttack": bool(row % 4 == 0)})
+    # 缺失的向量字段和长度不足的向量按 0.0 处理，与逐条提取一致
+    records[3]["pos"] = None
+    records[5]["spd"] = [1.0]
+    return records
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow", ".feather"])
+def test_convert_and_analyze_match_record_analysis(tmp_path, suffix):
+    records = make_records(300)
+    path = tmp_path / f"records{suffix}"
+    assert columnar_io.convert_records(records, path, batch_rows=64) == len(records)
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+
+    processor = make_processor()
+    expected, expected_counts = processor.analyze_file_data(records)
+    results, vehicle_attack_counts = processor.analyze_columnar_file(path, batch_rows=50,
+                                                                     on_error=pytest.fail)
+    assert results == expected
+    assert vehicle_attack_counts == expected_counts
+
+
+@pytest.mark.parametrize("records", [[], [{"laneIndex": 1}, {"laneIndex": "x"}],
+                                     [{"laneIndex": 1}, {"laneIndex": 2}, {"laneIndex": "x"}]])
+def test_invalid_input_leaves_no_file(tmp_path, records):
+    with pytest.raises(ValueError):
+        columnar_io.convert_records(records, tmp_path / "records.parquet", batch_rows=2)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".arrow"])
+def test_write_table_round_trip(tmp_path, suffix):
+    columns = {"vehicle_id": ["1", "V2"], "attack_prob": [0.25, 0.75], "is_attack": [False, True]}
+    path = tmp_path / f"results{suffix}"
+    columnar_io.write_table(columns, path)
+    batches = [batch for batch, _ in columnar_io.iter_record_batches(path)]
+    assert sum(batch.num_rows for batch in batches) == 2
+    assert batches[0].to_pydict() == columns
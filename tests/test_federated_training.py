@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from federated_training import FedAvgAggregator, FederatedTrainer
+from model_handler import ModelHandler
+from synthetic_traces import generate_synthetic_records
+
+
+@pytest.fixture(scope="module")
+def records():
+    return generate_synthetic_records(2000, seed=1)
+
+
+def test_fedavg_weights_updates_by_sample_count():
+    updates = np.array([[1.0, 0.0], [4.0, 3.0]])
+    np.testing.assert_allclose(FedAvgAggregator().aggregate(updates, [1, 2]), [3.0, 2.0])
+    with pytest.raises(ValueError):
+        FedAvgAggregator().aggregate(updates, [0, 0])
+
+
+def test_all_records_held_out_is_rejected(records):
+    with pytest.raises(ValueError):
+        FederatedTrainer(records, num_clients=2, holdout_ratio=1.0)
+
+
+def test_train_and_save_round_trip(tmp_path, records):
+    trainer = FederatedTrainer(records, num_clients=2, workers=1)
+    history = trainer.train(rounds=2)
+    assert [report["round"] for report in history] == [1, 2]
+    assert sum(trainer.client_sizes()) + len(trainer.holdout[1]) == len(records)
+
+    trainer.save(tmp_path, model_version="test-1")
+    engine, metadata = ModelHandler.load_model(tmp_path)
+    assert metadata["model_version"] == "test-1"
+    np.testing.assert_allclose(engine.weights, trainer.to_engine().weights)
+
+
+def test_non_finite_weights_are_not_saved(tmp_path, records):
+    trainer = FederatedTrainer(records, num_clients=2, workers=1)
+    trainer.weights[0] = np.nan
+    with pytest.raises(ValueError):
+        trainer.save(tmp_path)
+    assert not (tmp_path / "saved_models" / "global_model.pkl").exists()
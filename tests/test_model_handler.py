@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+from model_handler import ARTIFACT_FILE, LinearModelEngine, ModelHandler, ModelMismatchError
+
+METADATA = {
+    "feature_columns": ["a", "b", "c"],
+    "label_classes": [0, 1],
+    "input_example": {"a": 1.0, "b": 2.0, "c": 3.0},
+    "model_version": "v1",
+}
+
+
+def export(path, weights, intercept):
+    engine = LinearModelEngine(np.array(weights), intercept, [0, 1])
+    ModelHandler.export_artifact(engine, METADATA, path, source_sha256="abc")
+    return engine
+
+
+def test_artifact_round_trip(tmp_path):
+    path = tmp_path / ARTIFACT_FILE
+    engine = export(path, [0.5, -1.25, 2.0], 0.75)
+    loaded, metadata = ModelHandler.load_artifact(path, source_sha256="abc")
+    np.testing.assert_array_equal(loaded.weights, engine.weights)
+    assert loaded.intercept == engine.intercept
+    assert metadata["feature_columns"] == METADATA["feature_columns"]
+    assert metadata["model_version"] == "v1"
+    assert metadata["model_sha256"] == "abc"
+    X = np.random.default_rng(0).normal(size=(16, 3))
+    np.testing.assert_array_equal(loaded.predict_proba(X), engine.predict_proba(X))
+
+
+def test_stale_or_corrupt_artifact_is_rejected(tmp_path):
+    path = tmp_path / ARTIFACT_FILE
+    export(path, [1.0, 2.0, 3.0], 0.0)
+    with pytest.raises(ValueError):
+        ModelHandler.load_artifact(path, source_sha256="other")
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        ModelHandler.load_artifact(path)
+
+
+def test_loaded_weights_do_not_keep_the_file_mapped(tmp_path):
+    path = tmp_path / ARTIFACT_FILE
+    export(path, [1.0, 2.0, 3.0], 0.5)
+    loaded, _ = ModelHandler.load_artifact(path)
+    assert loaded.weights.flags.writeable
+    # 发布新模型时替换正在使用的文件，已加载的权重不受影响
+    replacement = tmp_path / "new.vmodel"
+    export(replacement, [-1.0, -2.0, -3.0], -0.5)
+    os.replace(replacement, path)
+    np.testing.assert_array_equal(loaded.weights, [1.0, 2.0, 3.0])
+    if os.path.exists("/proc/self/maps"):
+        with open("/proc/self/maps") as maps:
+            assert str(path) not in maps.read()
+
+
+def fit_logistic_regression():
+    from sklearn.linear_model import LogisticRegression
+    rng = np.random.default_rng(0)
+    # 特征尺度差异很大，与实际记录的特征（位置与噪声）类似
+    X = rng.normal(size=(200, 3)) * [1.0, 100.0, 0.01]
+    y = (X @ [1.0, 0.02, 50.0] + rng.normal(size=200) > 0).astype(int)
+    return LogisticRegression(max_iter=1000).fit(X, y)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_engine_matches_sklearn(dtype):
+    model = fit_logistic_regression()
+    engine = ModelHandler.build_engine(model, METADATA)
+    assert isinstance(engine, LinearModelEngine)
+    X = (np.random.default_rng(1).normal(size=(500, 3)) * [1.0, 100.0, 0.01]).astype(dtype)
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+    np.testing.assert_array_equal(engine.classes_, model.classes_)
+    # 极端输入不会溢出
+    extreme = np.array([[1e308, 0.0, 0.0], [-1e308, 0.0, 0.0]])
+    assert np.all(np.isfinite(engine.predict_proba(extreme)))
+
+
+def test_unsupported_models_fall_back_to_sklearn():
+    from sklearn.linear_model import LogisticRegression
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(90, 3))
+    multiclass = LogisticRegression(max_iter=1000).fit(X, np.arange(90) % 3)
+    assert ModelHandler.build_engine(multiclass, METADATA) is multiclass
+    binary = fit_logistic_regression()
+    assert ModelHandler.build_engine(binary, {"feature_columns": ["a", "b"]}) is binary
+
+
+def test_saved_model_pair_is_checked(tmp_path):
+    engine = ModelHandler.build_engine(fit_logistic_regression(), METADATA)
+    ModelHandler.save_model(tmp_path, engine, METADATA)
+    loaded, metadata = ModelHandler.load_model(tmp_path)
+    np.testing.assert_array_equal(loaded.weights, engine.weights)
+    assert metadata["model_version"] == "v1"
+
+    # 只替换了元数据文件（发布未完成）时拒绝加载
+    import joblib
+    model_dir = tmp_path / "saved_models"
+    (model_dir / ARTIFACT_FILE).unlink()
+    other = dict(joblib.load(model_dir / "model_metadata.pkl"), weights_sha256="0" * 64)
+    joblib.dump(other, model_dir / "model_metadata.pkl")
+    with pytest.raises(ModelMismatchError):
+        ModelHandler.load_model(tmp_path)
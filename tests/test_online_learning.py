@@ -0,0 +1,74 @@
+import numpy as np
+
+from model_handler import ARTIFACT_FILE, LinearModelEngine, ModelHandler
+from online_learning import OnlineLearner
+from record_store import RecordStore
+
+METADATA = {
+    "feature_columns": ["a", "b", "c"],
+    "label_classes": [0, 1],
+    "input_example": {"a": 0.0, "b": 0.0, "c": 0.0},
+}
+
+
+def publish_global(base, weights, intercept=0.0):
+    model_dir = base / "saved_models"
+    model_dir.mkdir(exist_ok=True)
+    engine = LinearModelEngine(np.array(weights), intercept, [0, 1])
+    ModelHandler.export_artifact(engine, METADATA, model_dir / ARTIFACT_FILE)
+    return ModelHandler.load_artifact(model_dir / ARTIFACT_FILE)
+
+
+def label(store, count, start=0):
+    rng = np.random.default_rng(start)
+    for row in range(count):
+        a, b, c = rng.normal(size=3)
+        key = store.append({"a": a, "b": b, "c": c, "hazardAttack": 0})
+        store.set_hazard_attack(key, 1 if a + b > 0 else 0)
+
+
+def test_labels_since_reads_only_new_labels(tmp_path):
+    store = RecordStore(tmp_path / "records.db")
+    label(store, 5)
+    labelled = store.labels_since(0, 3)
+    assert len(labelled) == 3
+    assert store.label_count_since(labelled[-1][0]) == 2
+    assert [seq for seq, _ in store.labels_since(labelled[-1][0], 10)] == [seq + 3 for seq, _ in labelled[:2]]
+
+
+def test_update_saves_a_version_that_is_restored_after_restart(tmp_path):
+    publish_global(tmp_path, [0.1, 0.1, 0.1])
+    store = RecordStore(tmp_path / "records.db")
+    learner = OnlineLearner(tmp_path, store, batch_size=4)
+    assert learner.online_version == 0
+    assert learner.update(min_labels=100) is None
+
+    label(store, 16)
+    report = learner.update(min_labels=4)
+    assert report["version"] == 1 and report["labels"] == 16
+    assert learner.pending_labels() == 0
+    engine, metadata = learner.current()
+    assert metadata["model_version"] == "online-1"
+
+    restarted = OnlineLearner(tmp_path, store)
+    assert restarted.online_version == 1
+    restored, _ = restarted.current()
+    np.testing.assert_array_equal(restored.weights, engine.weights)
+    assert restored.intercept == engine.intercept
+
+
+def test_new_global_model_replaces_online_versions(tmp_path):
+    publish_global(tmp_path, [0.1, 0.1, 0.1])
+    store = RecordStore(tmp_path / "records.db")
+    learner = OnlineLearner(tmp_path, store)
+    label(store, 8)
+    learner.update()
+
+    engine, metadata = publish_global(tmp_path, [1.0, 2.0, 3.0])
+    learner.rebase(engine, metadata)
+    assert learner.online_version == 0
+    assert learner.base_sha256 == metadata["model_sha256"]
+    np.testing.assert_array_equal(learner.current()[0].weights, [1.0, 2.0, 3.0])
+    # 已处理的标签不会被重新使用，重启后也不会恢复基于旧全局模型的版本
+    assert learner.update() is None
+    assert OnlineLearner(tmp_path, store).online_version == 0
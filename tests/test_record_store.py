@@ -0,0 +1,121 @@
+import json
+import datetime
+
+import pytest
+
+from record_store import RecordStore, migrate_json_records
+
+
+def open_store(tmp_path):
+    return RecordStore(tmp_path / "records.db")
+
+
+def test_append_get_and_last(tmp_path):
+    store = open_store(tmp_path)
+    assert store.get_last() is None
+    first = store.append({"vehicleId": 1, "messageID": "M1"})
+    second = store.append({"vehicleId": "V2", "messageID": "M2"})
+    assert store.get(first) == {"vehicleId": 1, "messageID": "M1"}
+    assert store.get_last() == {"vehicleId": "V2", "messageID": "M2"}
+    assert store.get(second + 1) is None
+    assert store.count() == 2
+
+
+def test_set_hazard_attack_updates_in_place(tmp_path):
+    store = open_store(tmp_path)
+    key = store.append({"vehicleId": 1, "hazardAttack": False})
+    assert store.set_hazard_attack(key, 1)
+    assert store.get(key)["hazardAttack"] == 1
+    assert not store.set_hazard_attack(key + 100, 1)
+
+
+def test_unsupported_index_values_do_not_fail_the_batch(tmp_path):
+    store = open_store(tmp_path)
+    records = [
+        {"vehicleId": [1, 2], "hazardAttack": "true"},
+        {"vehicleId": {"id": 3}, "hazardAttack": "maybe"},
+        {"vehicleId": 2 ** 70, "messageID": ["x"], "hazardAttack": "0"},
+    ]
+    assert store.append_many(records) == 3
+    assert store.get(1) == {"vehicleId": [1, 2], "hazardAttack": 1}
+    # 无法识别的标签保留原值
+    assert store.get(2)["hazardAttack"] == "maybe"
+    assert store.get(3)["hazardAttack"] == 0
+
+
+def test_migration_runs_once(tmp_path):
+    legacy = tmp_path / "saved_records.json"
+    legacy.write_text(json.dumps([{"vehicleId": 1}, {"vehicleId": 2, "hazardAttack": "false"}]), encoding="utf-8")
+    store = open_store(tmp_path)
+    assert migrate_json_records(legacy, store) == 2
+    assert migrate_json_records(legacy, store) == 0
+    assert store.count() == 2
+
+
+def test_legacy_file_added_later_is_not_imported(tmp_path):
+    legacy = tmp_path / "saved_records.json"
+    store = open_store(tmp_path)
+    assert migrate_json_records(legacy, store) == 0
+    legacy.write_text(json.dumps([{"vehicleId": 1}]), encoding="utf-8")
+    assert migrate_json_records(legacy, store) == 0
+    assert store.count() == 0
+
+
+def make_history(store, count=50):
+    start = datetime.datetime(2025, 1, 1)
+    records = [{"vehicleId": f"V{row % 3}", "messageID": f"M{row}", "hazardAttack": row % 2,
+                # 保存时间与保存顺序不一致，按时间查询时必须按保存时间排序
+                "savedTimestamp": (start + datetime.timedelta(minutes=(row * 7) % count)).isoformat()}
+               for row in range(count)]
+    store.append_many(records)
+    return records
+
+
+@pytest.mark.parametrize("page_size", [1, 7, 10, 100])
+def test_keyset_pages_cover_each_match_once(tmp_path, page_size):
+    store = open_store(tmp_path)
+    records = make_history(store)
+    pages = list(store.query(vehicle_id="V1", hazard_attack=1, page_size=page_size))
+    assert all(0 < len(page) <= page_size for page in pages)
+    keys = [key for page in pages for key, _ in page]
+    expected = [row + 1 for row, record in enumerate(records)
+                if record["vehicleId"] == "V1" and record["hazardAttack"] == 1]
+    assert keys == expected
+
+
+def test_time_range_pages_are_ordered_by_saved_time(tmp_path):
+    store = open_store(tmp_path)
+    records = make_history(store)
+    since = datetime.datetime(2025, 1, 1, 0, 10)
+    until = "2025-01-01T00:40:00"
+    found = [record for page in store.query(since=since, until=until, page_size=4) for _, record in page]
+    expected = sorted((record for record in records if since.isoformat() <= record["savedTimestamp"] < until),
+                      key=lambda record: record["savedTimestamp"])
+    assert found == expected and len(found) == 30
+
+
+def test_last_page_cursor(tmp_path):
+    store = open_store(tmp_path)
+    make_history(store, count=10)
+    page, cursor = store.query_page(page_size=10)
+    assert len(page) == 10 and cursor == (10,)
+    assert store.query_page(page_size=10, after=cursor) == ([], None)
+    page, cursor = store.query_page(message_id="M3")
+    assert [record["messageID"] for _, record in page] == ["M3"] and cursor is None
+
+
+def test_no_filter_combination_needs_a_sort(tmp_path):
+    store = open_store(tmp_path)
+    make_history(store)
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    for vehicle_id in (None, "V1"):
+        for message_id in (None, "M1"):
+            for hazard_attack in (None, 1):
+                for since in (None, "2025-01-01T00:10:00"):
+                    statements.clear()
+                    store.query_page(vehicle_id, message_id, since, None, hazard_attack)
+                    store._conn.set_trace_callback(None)
+                    plan = store._conn.execute("EXPLAIN QUERY PLAN " + statements[-1]).fetchall()
+                    store._conn.set_trace_callback(statements.append)
+                    assert not any("TEMP B-TREE" in row[-1] for row in plan), (statements[-1], plan)
@@ -0,0 +1,73 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from result_cache import FileResultCache, ResultCache
+
+
+def make_results(vehicle_ids):
+    return [{"vehicle_id": vehicle_id, "prediction": row % 2, "attack_prob": row / 10}
+            for row, vehicle_id in enumerate(vehicle_ids)]
+
+
+def test_result_cache_round_trip_and_lru():
+    cache = ResultCache(max_entries=2)
+    matrix = np.array([[1.0, -0.0], [1.0, 0.0], [2.0, 3.0], [4.0, 5.0]], dtype=np.float32)
+    keys = ResultCache.row_keys(matrix, "model")
+    # -0.0 与 0.0 得到相同的键，不同模型的键不同
+    assert keys[0] == keys[1]
+    assert ResultCache.row_keys(matrix, "other")[0] != keys[0]
+
+    assert cache.get_many(keys[:1]) == [None]
+    cache.put_many(keys[:1], [(1, 0.9)])
+    cache.put_many(keys[2:4], [(0, 0.1), (1, 0.8)])
+    assert cache.get_many(keys) == [None, None, (0, 0.1), (1, 0.8)]
+    stats = cache.stats()
+    assert stats["size"] == 2 and stats["hits"] == 2 and stats["misses"] == 3
+
+
+def test_file_cache_round_trip_preserves_vehicle_id_types(tmp_path):
+    cache = FileResultCache(tmp_path)
+    for vehicle_ids in ([3, 1, 2 ** 40], [3, "V1", 2.5]):
+        results = make_results(vehicle_ids)
+        cache.store("digest", "model", results, ["bad record"])
+        predictions, attack_probs, loaded_ids, errors = cache.load("digest", "model")
+        assert predictions.tolist() == [r["prediction"] for r in results]
+        assert attack_probs.tolist() == [r["attack_prob"] for r in results]
+        assert loaded_ids == vehicle_ids
+        assert errors == ["bad record"]
+    assert cache.load("digest", "other-model") is None
+    assert cache.load("other-digest", "model") is None
+
+
+def test_file_cache_rejects_unserializable_vehicle_ids_without_leaving_files(tmp_path):
+    cache = FileResultCache(tmp_path)
+    with pytest.raises((TypeError, ValueError)):
+        cache.store("digest", "model", make_results([np.int64(1), object()]), [])
+    assert os.listdir(tmp_path) == []
+
+
+def test_file_cache_concurrent_stores_and_pruning(tmp_path):
+    cache = FileResultCache(tmp_path, max_files=3)
+    results = make_results(list(range(1000)))
+    errors = []
+
+    def store(worker):
+        try:
+            for round_number in range(5):
+                cache.store(f"digest-{(worker + round_number) % 4}", "model", results, [])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    names = os.listdir(tmp_path)
+    assert len(names) <= 3 and all(name.endswith(".npz") for name in names)
+    loaded = [cache.load(f"digest-{index}", "model") for index in range(4)]
+    assert sum(entry is not None for entry in loaded) == len(names)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from federated_training import AGGREGATORS, make_aggregator
+from robust_aggregation import (CoordinateMedianAggregator, KrumAggregator, NormClippingAggregator,
+                                TrimmedMeanAggregator, multi_krum)
+
+
+def honest_updates_with_outlier(count=7, size=5, seed=0):
+    rng = np.random.default_rng(seed)
+    updates = rng.normal(scale=0.1, size=(count, size)) + 1.0
+    updates[-1] = 1000.0
+    return updates, np.ones(count)
+
+
+def test_median_and_trimmed_mean_ignore_an_outlier():
+    updates, counts = honest_updates_with_outlier()
+    for aggregator in (CoordinateMedianAggregator(), TrimmedMeanAggregator(0.2)):
+        assert np.all(np.abs(aggregator.aggregate(updates, counts) - 1.0) < 0.5)
+    trimmed = TrimmedMeanAggregator(0.2).aggregate(updates, counts)
+    ordered = np.sort(updates, axis=0)
+    np.testing.assert_allclose(trimmed, ordered[1:-1].mean(axis=0))
+
+
+def test_trim_ratio_must_leave_updates():
+    with pytest.raises(ValueError):
+        TrimmedMeanAggregator(0.5)
+
+
+def test_krum_scores_match_pairwise_distances():
+    updates, _ = honest_updates_with_outlier()
+    aggregator = KrumAggregator(num_malicious=1)
+    neighbours = len(updates) - 1 - 2
+    expected = []
+    for i in range(len(updates)):
+        distances = sorted(np.sum((updates[i] - updates[j]) ** 2) for j in range(len(updates)) if j != i)
+        expected.append(sum(distances[:neighbours]))
+    np.testing.assert_allclose(aggregator.scores(updates), expected, rtol=1e-9)
+
+
+def test_krum_and_multi_krum_exclude_the_outlier():
+    updates, counts = honest_updates_with_outlier()
+    krum = KrumAggregator(num_malicious=1).aggregate(updates, counts)
+    assert any(np.array_equal(krum, update) for update in updates[:-1])
+    multi = multi_krum(num_malicious=1, num_clients=len(updates))
+    assert multi.num_selected == len(updates) - 1
+    np.testing.assert_allclose(multi.aggregate(updates, counts), updates[:-1].mean(axis=0))
+
+
+def test_norm_clipping_bounds_every_update():
+    updates, counts = honest_updates_with_outlier()
+    clipped = NormClippingAggregator(max_norm=1.0, inner=CoordinateMedianAggregator())
+    result = NormClippingAggregator(max_norm=1.0).aggregate(updates, counts)
+    assert np.linalg.norm(result) <= 1.0 + 1e-12
+    assert np.linalg.norm(clipped.aggregate(updates, counts)) <= 1.0 + 1e-12
+    # 默认阈值为范数中位数，少数极端更新被缩小到与多数更新相同的范数
+    median_norm = np.median(np.linalg.norm(updates, axis=1))
+    assert np.linalg.norm(NormClippingAggregator().aggregate(updates, counts)) <= median_norm + 1e-12
+
+
+def test_make_aggregator_knows_every_name():
+    for name in AGGREGATORS:
+        assert hasattr(make_aggregator(name, num_clients=4), "aggregate")
+    with pytest.raises(ValueError):
+        make_aggregator("mean")
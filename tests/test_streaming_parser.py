@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from data_persistence_manager import DataPersistenceManager
+
+RECORDS = [{"vehicleId": 1, "pos": [1.0, 2.0, 0.0], "note": "xሴy \"q\\"}, {"vehicleId": "VEH_2", "ok": True},
+           {"vehicleId": None, "value": -1.5e3, "empty": []}]
+
+
+def read_all(path, read_size):
+    return [record for record, _ in DataPersistenceManager.iter_json_records(path, read_size=read_size)]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_json_array_matches_json_load(tmp_path, read_size):
+    path = tmp_path / "records.json"
+    path.write_text(json.dumps(RECORDS, ensure_ascii=False, indent=2), encoding="utf-8")
+    assert read_all(path, read_size) == RECORDS
+
+
+@pytest.mark.parametrize("read_size", [1, 5, 1 << 20])
+def test_json_lines(tmp_path, read_size):
+    path = tmp_path / "records.jsonl"
+    path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in RECORDS) + "\n", encoding="utf-8")
+    assert read_all(path, read_size) == RECORDS
+
+
+def test_utf8_bom_and_empty_array(tmp_path):
+    path = tmp_path / "bom.json"
+    path.write_bytes(b"\xef\xbb\xbf" + json.dumps(RECORDS).encode("utf-8"))
+    assert read_all(path, 4) == RECORDS
+    path.write_text("[ ]", encoding="utf-8")
+    assert read_all(path, 1) == []
+
+
+def test_progress_reports_bytes_consumed(tmp_path):
+    path = tmp_path / "records.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in RECORDS * 100) + "\n", encoding="utf-8")
+    consumed = [c for _, c in DataPersistenceManager.iter_json_records(path, read_size=256)]
+    assert consumed == sorted(consumed)
+    assert consumed[-1] == path.stat().st_size
+
+
+@pytest.mark.parametrize("text", [
+    '[{"a": 1} {"a": 2}]',
+    '[{"a": 1},,,{"a": 2},]',
+    '[,{"a": 1}]',
+    '[{"a": 1},]',
+    '[{"a": 1}] extra',
+    '[{"a": 1}',
+    '[{"a": tru x}]',
+])
+@pytest.mark.parametrize("read_size", [1, 1 << 20])
+def test_malformed_arrays_are_rejected_like_json_load(tmp_path, text, read_size):
+    path = tmp_path / "bad.json"
+    path.write_text(text, encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    with pytest.raises(json.JSONDecodeError):
+        read_all(path, read_size)
+
+
+def test_malformed_record_fails_without_reading_rest_of_file(tmp_path):
+    path = tmp_path / "bad.jsonl"
+    good = json.dumps({"vehicleId": 1, "padding": "x" * 1000})
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(good + "\n" + '{"a": 1, "b": tru x}\n')
+        for _ in range(4000):
+            f.write(good + "\n")
+    records = []
+    with pytest.raises(json.JSONDecodeError) as excinfo:
+        for record, consumed in DataPersistenceManager.iter_json_records(path, read_size=4096):
+            records.append(record)
+    assert len(records) == 1
+    # 错误信息给出记录在文件中的字节偏移
+    assert f"文件偏移 {len(good) + 1} 字节" in excinfo.value.msg
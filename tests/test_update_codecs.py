@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from update_codecs import CODECS, TopKCodec, make_codec
+
+
+def sample(seed=0, size=31):
+    rng = np.random.default_rng(seed)
+    reference = rng.normal(size=size)
+    return reference + rng.normal(scale=0.01, size=size), reference
+
+
+@pytest.mark.parametrize("name", ["float64", "delta"])
+def test_lossless_codecs_round_trip_exactly(name):
+    weights, reference = sample()
+    codec = make_codec(name)
+    decoded = codec.decode(codec.encode(weights, reference), reference)
+    assert decoded.dtype == np.float64
+    np.testing.assert_array_equal(decoded, weights)
+
+
+def test_delta_codec_compresses_close_parameters():
+    weights, reference = sample(size=1000)
+    assert len(make_codec("delta").encode(weights, reference)) < weights.nbytes
+
+
+@pytest.mark.parametrize("name, tolerance", [("float16", 1e-5), ("int8", 0.01 * 4 / 127)])
+def test_quantizing_codecs_stay_within_tolerance(name, tolerance):
+    weights, reference = sample()
+    codec = make_codec(name)
+    payload = codec.encode(weights, reference)
+    assert len(payload) < weights.nbytes
+    np.testing.assert_allclose(codec.decode(payload, reference), weights, rtol=0, atol=tolerance)
+
+
+def test_int8_codec_handles_unchanged_parameters():
+    _, reference = sample()
+    codec = make_codec("int8")
+    np.testing.assert_array_equal(codec.decode(codec.encode(reference, reference), reference), reference)
+
+
+def test_topk_sends_largest_updates():
+    reference = np.zeros(10)
+    weights = np.array([0.0, 5.0, 0.1, -7.0, 0.2, 0.0, 0.0, 0.3, 0.0, 0.0])
+    codec = TopKCodec(ratio=0.2, error_feedback=False)
+    decoded = codec.decode(codec.encode(weights, reference), reference)
+    np.testing.assert_array_equal(decoded, [0.0, 5.0, 0.0, -7.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+    assert codec.residual is None
+    # 至少发送一个参数
+    assert TopKCodec(ratio=0.0).encode(weights, reference)[:4] == b"\x01\x00\x00\x00"
+
+
+def test_topk_error_feedback_eventually_sends_every_update():
+    rng = np.random.default_rng(1)
+    reference = np.zeros(20)
+    codec = TopKCodec(ratio=0.1)
+    sent = np.zeros(20)
+    total = np.zeros(20)
+    for _ in range(50):
+        delta = rng.normal(size=20)
+        total += delta
+        sent += codec.decode(codec.encode(reference + delta, reference), reference)
+    # 已发送的更新加上残差等于全部真实更新，未发送的部分不会丢失
+    np.testing.assert_allclose(sent + codec.residual, total, atol=1e-5)
+
+
+def test_unknown_codec_is_rejected():
+    assert set(CODECS) == {"float64", "float16", "int8", "topk", "delta"}
+    with pytest.raises(ValueError):
+        make_codec("gzip")
@@ -8,12 +8,20 @@ import json
 import random
 import tkinter.font
 from utils import create_color_transition, scaled_font, scaled_dimension
+from data_processor import MALICIOUS_RATIO, SUSPICIOUS_RATIO, RATING_LABELS
+from metrics import metrics
 
 base_path = Path(__file__).parent
 
+# 界面使用的全部音效文件
+SOUND_FILES = ("click.mp3", "error.mp3", "safe.mp3", "suspicious.wav")
+
+# 分析结果中最多列出的车辆数
+VEHICLE_TABLE_ROWS = 20
+
 
 class UIManager:
-    def __init__(self, root, app_instance, pygame_module=None, scale_factor=1.0):
+    def __init__(self, root, app_instance, pygame_module=None, scale_factor=1.0, sounds=None):
         """
             初始化用户界面管理器
 
@@ -21,11 +29,13 @@ class UIManager:
             app_instance: 应用程序主实例
             pygame_module: Pygame模块，用于音效播放
             scale_factor: 界面元素的缩放因子
+            sounds: preload_sounds 预加载的音效字典
         """
         self.root = root
         self.app = app_instance
         self.style = root.style
         self.pygame = pygame_module
+        self.sounds = dict(sounds or {})
         self.scale_factor = scale_factor  # 存储缩放因子
 
         # 定义字体大小的基准值
@@ -71,6 +81,7 @@ class UIManager:
         self.results = []
         self.vehicle_attack_counts = defaultdict(int)
         self.last_saved_record = None
+        self.last_saved_key = None  # 最近保存记录在记录存储中的记录键
         self.last_analysis_result = None
         self.string_vars = {}
         self.manual_input_entries = self.entries.copy()
@@ -220,6 +231,19 @@ class UIManager:
         # 为“开始分析”按钮创建鼠标悬停时的颜色渐变效果
         self.create_hover_effect(analyze_file_btn, self.button_colors)
 
+        # 创建一个“取消分析”按钮，用于停止正在后台进行的文件分析
+        cancel_btn = tk.Button(
+            file_frame, text="取消分析", command=self.app.cancel_analysis,
+            bg=self.button_colors["normal_bg"], fg=self.button_colors["normal_fg"],
+            font=scaled_font(self.button_font_size, self.scale_factor),
+            relief="flat", borderwidth=0,
+            activebackground=self.button_colors["hover_bg"], activeforeground=self.button_colors["hover_fg"]
+        )
+        # 将“取消分析”按钮打包到文件选择框架中，靠左对齐，并设置水平外边距
+        cancel_btn.pack(side=tk.LEFT, padx=scaled_dimension(15, self.scale_factor))
+        # 为“取消分析”按钮创建鼠标悬停时的颜色渐变效果
+        self.create_hover_effect(cancel_btn, self.button_colors)
+
         # 创建一个LabelFrame，用于包含实时数据输入相关的控件
         # 设置其样式为"info"，并自定义标签文本、字体、前景色、背景色和内边距
         input_frame = LabelFrame(
@@ -273,14 +297,46 @@ class UIManager:
             return
 
         try:
-            sound_path = base_path / "sounds" / "click.mp3"
-            if sound_path.exists():
-                self.pygame.mixer.Sound(str(sound_path)).play()
+            sound = self.get_sound("click.mp3")
+            if sound:
+                sound.play()
             else:
-                messagebox.showerror("错误", f"音效文件 {sound_path} 不存在")
+                messagebox.showerror("错误", f"音效文件 {base_path / 'sounds' / 'click.mp3'} 不存在")
         except Exception as e:
             messagebox.showerror("错误", f"音效播放失败: {str(e)}")
 
+    @staticmethod
+    def preload_sounds(pygame_module):
+        """
+            预先解码所有音效文件，可在后台线程中调用。
+
+            pygame_module: Pygame模块，为 None 时不加载任何音效
+            返回: 音效文件名到 pygame Sound 对象的字典，不存在的文件会被跳过
+        """
+        sounds = {}
+        if not pygame_module:
+            return sounds
+        for filename in SOUND_FILES:
+            sound_path = base_path / "sounds" / filename
+            if sound_path.exists():
+                sounds[filename] = pygame_module.mixer.Sound(str(sound_path))
+        return sounds
+
+    def get_sound(self, filename):
+        """
+            获取音效对象，优先使用已预加载的缓存，否则现场加载并缓存
+
+            filename: sounds 目录下的音效文件名
+            返回: pygame Sound 对象，文件不存在时返回 None
+        """
+        sound = self.sounds.get(filename)
+        if sound is None:
+            sound_path = base_path / "sounds" / filename
+            if not sound_path.exists():
+                return None
+            sound = self.sounds[filename] = self.pygame.mixer.Sound(str(sound_path))
+        return sound
+
     def clear_previous_results(self):
         """清除结果和输入框"""
         self.clear_results_only()
@@ -472,9 +528,9 @@ class UIManager:
         try:
             input_data = self.get_manual_input_data()
             record = self.app.data_persistence_manager.generate_complete_record(input_data)
-            self.app.data_persistence_manager.save_record(record)
+            self.last_saved_key = self.app.data_persistence_manager.save_record(record)
             self.last_saved_record = record
-            messagebox.showinfo("成功", "记录已成功保存到 saved_records.json")
+            messagebox.showinfo("成功", f"记录已成功保存到 {self.app.data_persistence_manager.data_file.name}")
         except ValueError as e:
             messagebox.showerror("错误", str(e))
         except Exception as e:
@@ -490,36 +546,29 @@ class UIManager:
 
             is_attack: 布尔值，指示是否为攻击行为
         """
-        if self.last_saved_record is None:
-            return
-
-        file_path = base_path / "saved_records.json"
-        if not file_path.exists():
+        if self.last_saved_record is None or self.last_saved_key is None:
             return
 
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            for record in reversed(data):
-                if (record.get('savedTimestamp') == self.last_saved_record.get('savedTimestamp') and
-                        record.get('vehicleId') == self.last_saved_record.get('vehicleId')):
-                    record['hazardAttack'] = 1 if is_attack else 0
-                    break
-
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-
+            updated = self.app.data_persistence_manager.update_attack_status(self.last_saved_key, is_attack)
         except Exception as e:
             messagebox.showerror("错误", f"更新攻击状态失败: {str(e)}")
+            return
+        if updated:
+            self.app.schedule_online_update()
 
     def browse_file_dialog(self):
         """
-            打开文件浏览对话框，允许用户选择JSON文件
+            打开文件浏览对话框，允许用户选择记录文件（JSON、JSON Lines、Parquet、Arrow/Feather、二进制记录）
 
             返回: 所选文件的路径字符串，如果用户取消则返回空字符串
         """
-        filepath = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
+        filepath = filedialog.askopenfilename(filetypes=[
+            ("记录文件", "*.json *.jsonl *.parquet *.arrow *.feather *.vrec"),
+            ("JSON files", "*.json"), ("JSON Lines files", "*.jsonl"),
+            ("Parquet files", "*.parquet"), ("Arrow/Feather files", "*.arrow *.feather"),
+            ("二进制记录文件", "*.vrec")
+        ])
         return filepath
 
     def set_file_path(self, path):
@@ -573,60 +622,56 @@ class UIManager:
 
         return input_data
 
-    def show_analysis_result(self, results, vehicle_attack_counts, filepath):
+    @metrics.timed("render_analysis_result")
+    def show_analysis_result(self, results, vehicle_attack_counts, vehicle_summary):
         """
             在界面上显示文件分析结果
 
             results: 分析结果列表
             vehicle_attack_counts: 车辆攻击次数统计字典
-            filepath: 被分析文件的路径
+            vehicle_summary: DataProcessor.aggregate_by_vehicle 返回的按车辆统计表
         """
         self.results = results
         self.vehicle_attack_counts = vehicle_attack_counts
 
         total = len(self.results)
-        attack_count = sum(1 for r in self.results if r["prediction"] == 1)
+        attack_count = int(vehicle_summary["attacks"].sum())
         attack_ratio = attack_count / total if total > 0 else 0
 
-        vehicle_id = "未知车辆"
-        if self.vehicle_attack_counts:
-            # Get the first vehicle ID, assuming a single vehicle ID for file analysis context
-            vehicle_id = next(iter(self.vehicle_attack_counts.keys()))
-        elif self.results:
-            # Fallback to try to get vehicleId from the first record if available
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f: # Added encoding
-                    first_record = json.load(f)[0]
-                    vehicle_id = first_record.get("vehicleId", "未知车辆")
-            except Exception:
-                pass  # If file cannot be read or is empty, vehicle_id remains "未知车辆"
-
         result_text = ''
         result_text += f"总数据量：{total} 条\n"
         result_text += f"攻击次数：{attack_count} 次\n"
         result_text += f"攻击比例：{attack_ratio * 100:.1f}%\n"
 
-        if attack_ratio >= 0.1:
-            result_text += "❌ 车辆安全评级：恶意车辆"
-            style = "danger"
-        elif attack_ratio >= 0.05:
-            result_text += "⚠️ 车辆安全评级：嫌疑车辆"
-            style = "warning"
+        if len(vehicle_summary) > 1:
+            result_text += self.format_vehicle_summary(vehicle_summary)
+            # 以评级最差的车辆决定结果颜色和提示音
+            ratings = set(vehicle_summary["rating"])
+            style = "danger" if "malicious" in ratings else "warning" if "suspicious" in ratings else "success"
         else:
-            result_text += "✅ 车辆安全评级：正常车辆"
-            style = "success"
+            if len(vehicle_summary) == 1:
+                result_text += f"车辆ID：{vehicle_summary['vehicle_id'].iloc[0]}\n"
+            if attack_ratio >= MALICIOUS_RATIO:
+                result_text += "❌ 车辆安全评级：恶意车辆"
+                style = "danger"
+            elif attack_ratio >= SUSPICIOUS_RATIO:
+                result_text += "⚠️ 车辆安全评级：嫌疑车辆"
+                style = "warning"
+            else:
+                result_text += "✅ 车辆安全评级：正常车辆"
+                style = "success"
 
-        result_text += "\n 诊断说明："
-        if attack_count == 0:
-            result_text += "未检测到恶意攻击行为，车辆行为完全符合安全规范"
-        else:
-            result_text += f"该车辆共计检测到异常行为{attack_count}次，占比{attack_ratio * 100:.1f}%，属于"
-            if attack_ratio >= 0.1:
-                result_text += "持续性的恶意活动特征，建议立即采取处理措施"
-            elif attack_ratio >= 0.05:
-                result_text += "间歇性异常行为，建议加强监控并记录日志"
+            result_text += "\n 诊断说明："
+            if attack_count == 0:
+                result_text += "未检测到恶意攻击行为，车辆行为完全符合安全规范"
             else:
-                result_text += "偶发性异常数据，建议进行人工复核"
+                result_text += f"该车辆共计检测到异常行为{attack_count}次，占比{attack_ratio * 100:.1f}%，属于"
+                if attack_ratio >= MALICIOUS_RATIO:
+                    result_text += "持续性的恶意活动特征，建议立即采取处理措施"
+                elif attack_ratio >= SUSPICIOUS_RATIO:
+                    result_text += "间歇性异常行为，建议加强监控并记录日志"
+                else:
+                    result_text += "偶发性异常数据，建议进行人工复核"
 
         self.result_text.config(state=tk.NORMAL)
         self.result_text.delete(1.0, tk.END)
@@ -642,6 +687,28 @@ class UIManager:
         self.result_text.config(state=tk.DISABLED)
         self.play_result_sound(style)
 
+    @metrics.timed("render_vehicle_summary")
+    def format_vehicle_summary(self, vehicle_summary, limit=VEHICLE_TABLE_ROWS):
+        """
+            将按车辆统计表格式化为文本
+
+            vehicle_summary: 已按攻击比例排序的按车辆统计表
+            limit: 最多显示的车辆数
+            返回: 包含各评级车辆数和车辆评级明细的文本
+        """
+        rating_counts = vehicle_summary["rating"].value_counts()
+        text = (f"车辆总数：{len(vehicle_summary)} 辆"
+                f"（{RATING_LABELS['malicious']} {rating_counts.get('malicious', 0)} 辆，"
+                f"{RATING_LABELS['suspicious']} {rating_counts.get('suspicious', 0)} 辆，"
+                f"{RATING_LABELS['normal']} {rating_counts.get('normal', 0)} 辆）\n")
+        text += f"车辆评级明细（按攻击比例排序，显示前 {min(limit, len(vehicle_summary))} 辆）：\n"
+        text += "车辆ID\t消息数\t攻击次数\t攻击比例\t评级\n"
+        for row in vehicle_summary.head(limit).itertuples(index=False):
+            text += (f"{row.vehicle_id}\t{row.total}\t{row.attacks}\t"
+                     f"{row.attack_ratio * 100:.1f}%\t{RATING_LABELS[row.rating]}\n")
+        return text
+
+    @metrics.timed("render_single_result")
     def show_single_result(self, result):
         """
             在界面上显示单条实时数据的分析结果
@@ -651,7 +718,10 @@ class UIManager:
         self.last_analysis_result = result
 
         result_text = "实时分析结果：\n\n"
-        result_text += f"攻击概率: {result['attack_prob'] * 100:.1f}%\n\n"
+        result_text += f"攻击概率: {result['attack_prob'] * 100:.1f}%\n"
+        if result.get('model_version'):
+            result_text += f"模型版本: {result['model_version']}\n"
+        result_text += "\n"
 
         if result['prediction'] == 1:
             result_text += "❌ 当前状态：检测到攻击行为"
@@ -684,11 +754,11 @@ class UIManager:
                 "success": "safe.mp3"
             }
             if result_style in sound_map:
-                sound_path = base_path / "sounds" / sound_map[result_style]
-                if sound_path.exists():
-                    self.pygame.mixer.Sound(str(sound_path)).play()
+                sound = self.get_sound(sound_map[result_style])
+                if sound:
+                    sound.play()
                 else:
-                    messagebox.showerror("错误", f"音效文件 {sound_path} 不存在")
+                    messagebox.showerror("错误", f"音效文件 {base_path / 'sounds' / sound_map[result_style]} 不存在")
         except Exception as e:
             messagebox.showerror("错误", f"音效播放失败: {str(e)}")
 
@@ -696,8 +766,8 @@ class UIManager:
         self.progress['maximum'] = value
 
     def update_progress_value(self, value):
+        # 进度由后台分析线程节流后经主循环更新，无需强制重绘
         self.progress['value'] = value
-        self.root.update_idletasks()
 
     def get_canvas(self):
         return self._animation_canvas
@@ -714,7 +784,8 @@ class UIManager:
         try:
             input_data = self.get_manual_input_data()
             record = self.app.data_persistence_manager.generate_complete_record(input_data)
-            self.app.data_persistence_manager.save_record(record)
+            self.last_saved_key = self.app.data_persistence_manager.save_record(record)
+            self.last_saved_record = record
             last_record = self.app.data_persistence_manager.get_last_record()
             self.app.analyze_manual(last_record)
             messagebox.showinfo("成功", "记录已保存并分析完成")
@@ -0,0 +1,118 @@
+import zlib
+import struct
+import numpy as np
+
+
+class UpdateCodec:
+    """
+        客户端参数更新的编码器基类。客户端用 encode 把本地参数编码为字节串发给聚合方，
+        聚合方用 decode 还原。reference 为本轮下发的全局参数，双方都持有，不需要传输。
+        有状态的编码器（如带误差反馈的 top-k）每个客户端使用独立的实例。
+    """
+    name = "float64"
+
+    def encode(self, weights: np.ndarray, reference: np.ndarray) -> bytes:
+        return np.asarray(weights, dtype="<f8").tobytes()
+
+    def decode(self, payload: bytes, reference: np.ndarray) -> np.ndarray:
+        return np.frombuffer(payload, dtype="<f8").astype(np.float64)
+
+
+class Float16Codec(UpdateCodec):
+    """把参数更新（本地参数减去全局参数）量化为 float16"""
+    name = "float16"
+
+    def encode(self, weights, reference):
+        return (np.asarray(weights) - reference).astype("<f2").tobytes()
+
+    def decode(self, payload, reference):
+        return reference + np.frombuffer(payload, dtype="<f2").astype(np.float64)
+
+
+class Int8Codec(UpdateCodec):
+    """把参数更新按最大绝对值对称量化为 int8，附带一个 float32 缩放系数"""
+    name = "int8"
+
+    def encode(self, weights, reference):
+        delta = np.asarray(weights) - reference
+        scale = float(np.max(np.abs(delta))) / 127.0 if len(delta) else 0.0
+        quantized = np.zeros(len(delta), dtype=np.int8) if scale == 0.0 else \
+            np.clip(np.rint(delta / scale), -127, 127).astype(np.int8)
+        return struct.pack("<f", scale) + quantized.tobytes()
+
+    def decode(self, payload, reference):
+        scale = struct.unpack("<f", payload[:4])[0]
+        return reference + np.frombuffer(payload, dtype=np.int8, offset=4).astype(np.float64) * scale
+
+
+class TopKCodec(UpdateCodec):
+    name = "topk"
+
+    def __init__(self, ratio=0.1, error_feedback=True):
+        """
+            top-k 稀疏化：只发送绝对值最大的 k 个参数更新（uint32 下标 + float32 数值）。
+            启用误差反馈时，未发送的部分累积到残差中，在下一轮与新的更新一起参与选择。
+
+            ratio: 发送的参数比例，至少发送一个。
+            error_feedback: 是否启用误差反馈。
+        """
+        self.ratio = ratio
+        self.error_feedback = error_feedback
+        self.residual = None
+
+    def encode(self, weights, reference):
+        delta = np.asarray(weights) - reference
+        if self.error_feedback and self.residual is not None:
+            delta = delta + self.residual
+        k = max(1, int(round(len(delta) * self.ratio)))
+        indices = np.sort(np.argpartition(np.abs(delta), len(delta) - k)[len(delta) - k:]).astype("<u4")
+        values = delta[indices].astype("<f4")
+        if self.error_feedback:
+            self.residual = delta
+            self.residual[indices] -= values
+        return struct.pack("<I", k) + indices.tobytes() + values.tobytes()
+
+    def decode(self, payload, reference):
+        k = struct.unpack("<I", payload[:4])[0]
+        indices = np.frombuffer(payload, dtype="<u4", count=k, offset=4)
+        values = np.frombuffer(payload, dtype="<f4", count=k, offset=4 + 4 * k)
+        weights = reference.astype(np.float64)
+        weights[indices] += values
+        return weights
+
+
+class DeltaCodec(UpdateCodec):
+    """
+        无损差分编码：把本地参数与全局参数的 float64 位模式按位异或，再按字节重排后用 zlib 压缩。
+        两者越接近，异或结果的高位字节越多为零，压缩率越高；解码结果与本地参数逐位一致。
+    """
+    name = "delta"
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def encode(self, weights, reference):
+        xor = np.asarray(weights, dtype="<f8").view("<u8") ^ np.asarray(reference, dtype="<f8").view("<u8")
+        shuffled = xor.view(np.uint8).reshape(-1, 8).T.tobytes()
+        return zlib.compress(shuffled, self.level)
+
+    def decode(self, payload, reference):
+        shuffled = np.frombuffer(zlib.decompress(payload), dtype=np.uint8).reshape(8, -1)
+        xor = np.ascontiguousarray(shuffled.T).view("<u8").ravel()
+        return (np.asarray(reference, dtype="<f8").view("<u8") ^ xor).view("<f8").astype(np.float64)
+
+
+CODECS = {codec.name: codec for codec in (UpdateCodec, Float16Codec, Int8Codec, TopKCodec, DeltaCodec)}
+
+
+def make_codec(name: str, **kwargs) -> UpdateCodec:
+    """
+        按名称创建编码器实例。
+
+        name: "float64"、"float16"、"int8"、"topk" 或 "delta"。
+        kwargs: 传给编码器构造函数的参数，例如 topk 的 ratio。
+    """
+    try:
+        return CODECS[name](**kwargs)
+    except KeyError:
+        raise ValueError(f"不支持的编码方式: {name}（支持 {', '.join(CODECS)}）")